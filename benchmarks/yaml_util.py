@@ -0,0 +1,52 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+"""Compare dumping and loading provenance with libyaml and pure Python.
+
+Run with ``python benchmarks/yaml_util.py [number of actions]``. The
+actions are the same as the ones `qiime2.core.tests.test_yaml_util` checks
+for byte-identical output.
+
+"""
+
+import sys
+import time
+
+import yaml
+
+import qiime2.core.yaml_util as yaml_util
+from qiime2.core.tests.test_yaml_util import PureLoader, make_action
+
+
+def benchmark(actions, dumper, loader, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for action in actions:
+            yaml.load(yaml.dump(action, Dumper=dumper), Loader=loader)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(count=40):
+    if not yaml.__with_libyaml__:
+        sys.exit("libyaml is not available, there is nothing to compare.")
+
+    actions = [make_action(i) for i in range(count)]
+    pure = benchmark(actions, yaml.Dumper, PureLoader)
+    fast = benchmark(actions, yaml_util.Dumper, yaml_util.Loader)
+
+    print("%d actions, dump and load (best of 5)" % count)
+    print("pure Python: %.3fs" % pure)
+    print("libyaml:     %.3fs" % fast)
+    print("speedup:     %.1fx" % (pure / fast))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
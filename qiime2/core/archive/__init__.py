@@ -6,8 +6,17 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
-from .provenance import ImportProvenanceCapture, ActionProvenanceCapture
+from .provenance import (ImportProvenanceCapture, ActionProvenanceCapture,
+                         ProvenancePolicy)
 from .archiver import Archiver
+from .compression import CompressionPolicy
+from .store import ArtifactStore
+from .bundle import ArtifactBundle
+from .source import ByteSource, FileByteSource, HTTPByteSource
+from .lineage import LineageIndex
 
 
-__all__ = ['Archiver', 'ImportProvenanceCapture', 'ActionProvenanceCapture']
+__all__ = ['Archiver', 'ArtifactBundle', 'ArtifactStore', 'ByteSource',
+           'CompressionPolicy', 'FileByteSource', 'HTTPByteSource',
+           'LineageIndex', 'ProvenancePolicy', 'ImportProvenanceCapture',
+           'ActionProvenanceCapture']
@@ -6,15 +6,29 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import atexit
 import collections
+import concurrent.futures
+import contextlib
 import uuid as _uuid
 import pathlib
 import zipfile
 import importlib
 import os
 import io
+import mmap
+import re
+import sys
+import shutil
+import struct
+import threading
+import weakref
 
 import qiime2
+from .compression import DECODE_ERRORS, ZIP_ZSTANDARD, ZstdMemberReader
+from .provenance import ProvenanceCapture
+from .source import FileByteSource, as_byte_source
+from .zipwriter import ZipWriter
 
 _VERSION_TEMPLATE = """\
 QIIME 2
@@ -22,10 +36,108 @@ archive: %s
 framework: %s
 """
 
+# Headers start with the contents of the VERSION file.
+_HEADER_VERSION = re.compile(r'\AQIIME 2\narchive: (\S+)\n')
+
 ArchiveRecord = collections.namedtuple(
     'ArchiveRecord', ['root', 'version_fp', 'uuid', 'version',
                       'framework_version'])
 
+# The archive file an archiver was loaded from, `signature` identifies the
+# exact file (and its contents) at the time it was loaded.
+ArchiveSource = collections.namedtuple(
+    'ArchiveSource', ['archive_type', 'path', 'signature'])
+
+# ioctl which makes a file share the blocks of another (a "reflink") on Linux
+# filesystems with copy-on-write support (e.g. btrfs, XFS).
+_FICLONE = 0x40049409
+
+
+def _is_stream(obj):
+    return hasattr(obj, 'write')
+
+
+def _file_signature(path):
+    st = os.stat(str(path))
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+# Lazily loaded archivers by the path they are mounted at, so that files in
+# the mount can be found in their archive (see `Archiver.map_file`).
+_LAZY_MOUNTS = weakref.WeakValueDictionary()
+
+
+def _map_file(filepath, offset=0, size=None):
+    """Memory map part of a file, returning a read-only memoryview."""
+    with open(str(filepath), mode='rb') as fh:
+        if size is None:
+            size = os.fstat(fh.fileno()).st_size - offset
+        if size == 0:
+            # Empty mappings aren't allowed.
+            return memoryview(b'')
+        # Mappings must start at a multiple of the allocation granularity.
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        mapped = mmap.mmap(fh.fileno(), offset - start + size,
+                           access=mmap.ACCESS_READ, offset=start)
+    # The view keeps the mapping alive, it is unmapped once released.
+    return memoryview(mapped)[offset - start:]
+
+
+class _IndexDirectory(dict):
+    """A directory of a ZIP file's member index, mapping names to children.
+
+    Children are either an `_IndexDirectory` or the ZipInfo of a file. `info`
+    is the directory's own ZipInfo, when the ZIP file has an entry for it.
+
+    """
+    def __init__(self):
+        super().__init__()
+        self.info = None
+
+    def iter_infos(self):
+        """Yield the ZipInfo of every member at or below this directory."""
+        if self.info is not None:
+            yield self.info
+        for child in self.values():
+            if isinstance(child, _IndexDirectory):
+                yield from child.iter_infos()
+            else:
+                yield child
+
+
+class _SourceZipFile(zipfile.ZipFile):
+    """A ZipFile reading from (and owning a file object of) a ByteSource."""
+
+    def __init__(self, source):
+        self.source = source
+        self._source_fh = source.open()
+        try:
+            super().__init__(self._source_fh, mode='r')
+        except Exception:
+            self._source_fh.close()
+            raise
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._source_fh.close()
+
+
+def _clone_file(source, destination):
+    """Copy a file, sharing its blocks instead when the filesystem can."""
+    with open(str(source), mode='rb') as src, \
+            open(str(destination), mode='wb') as dst:
+        if sys.platform.startswith('linux'):
+            import fcntl
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                return
+            except OSError:
+                # Unsupported by the filesystem, or not the same filesystem.
+                pass
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
 
 class _Archive:
     """Abstraction layer over the archive filesystem.
@@ -59,6 +171,9 @@ class _Archive:
 
     """
     VERSION_FILE = 'VERSION'
+    # Archives which can be used without being mounted into a temporary
+    # directory, `mount` will return a record for the archive itself.
+    IN_PLACE = False
 
     @classmethod
     def is_archive_type(cls, filepath):
@@ -91,7 +206,8 @@ class _Archive:
                              framework_version)
 
     @classmethod
-    def save(cls, source, destination):
+    def save(cls, source, destination, workers=None, compression=None,
+             header=None, deterministic=False):
         raise NotImplementedError
 
     def __init__(self, path):
@@ -100,6 +216,29 @@ class _Archive:
         self.uuid = self._get_uuid()
         self.version, self.framework_version = self._get_versions()
 
+        # Relative paths (within the archive root) which have already been
+        # extracted by `materialize` into a lazy mount.
+        self._materialized = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
     def _get_uuid(self):
         if not self.path.exists():
             raise TypeError("%s does not exist or is not a filepath."
@@ -137,79 +276,499 @@ class _Archive:
             raise ValueError("Archive does not contain a correctly formatted"
                              " VERSION file.")
 
+    # NOTE: `relative_iterdir`, `exists`, and `size` take paths relative to
+    # the top of the archive (which contains the archive root), everything
+    # else is relative to the archive root.
     def relative_iterdir(self, relpath='.'):
         raise NotImplementedError
 
-    def open(self, relpath):
+    def exists(self, relpath):
+        raise NotImplementedError
+
+    def size(self, relpath):
+        """Uncompressed size of a file, or of every file in a directory."""
+        raise NotImplementedError
+
+    def open(self, relpath, mode='r'):
+        raise NotImplementedError
+
+    def mount(self, filepath, lazy=False, workers=None):
         raise NotImplementedError
 
-    def mount(self, filepath):
+    def extract(self, filepath, workers=None):
+        raise NotImplementedError
+
+    def verify(self, workers=None):
+        """Check the integrity of every member, raising ValueError if any fail.
+
+        Structural problems (such as a missing root or VERSION file) are
+        already found when the archive is opened.
+
+        """
+        raise NotImplementedError
+
+    def is_canonical(self):
+        """Whether saving the extracted archive reproduces the same members.
+
+        Archives created elsewhere (e.g. rezipped by a command-line tool) may
+        contain extra entries which `save` would drop.
+
+        """
+        return False
+
+    def is_local(self):
+        """Whether the archive is a file (or directory) on this machine."""
+        return True
+
+    def materialize(self, filepath, relpath='.'):
+        """Extract everything under `relpath` into a lazy mount.
+
+        `filepath` is the same path that was provided to `mount`. This is a
+        no-op when `relpath` (or one of its parents) was already materialized.
+
+        """
+        relpath = pathlib.PurePosixPath(relpath)
+        with self._lock:
+            if self._is_materialized(relpath):
+                return
+            self._extract_prefix(filepath, relpath)
+            self._materialized.add(relpath)
+
+    def is_materialized(self, relpath):
+        """Whether `relpath` (or one of its parents) was materialized."""
+        with self._lock:
+            return self._is_materialized(pathlib.PurePosixPath(relpath))
+
+    def _is_materialized(self, relpath):
+        return any(done == relpath or done in relpath.parents
+                   for done in self._materialized)
+
+    def _extract_prefix(self, filepath, relpath):
         raise NotImplementedError
 
 
 class _ZipArchive(_Archive):
-    """A specific variant of Archive which deals with ZIP64 files."""
+    """A specific variant of Archive which deals with ZIP64 files.
+
+    The ZIP file is opened (and its central directory parsed) once, the handle
+    is kept until `close` is called or the archive is used as a context
+    manager. Members may be stored, deflated, or compressed with Zstandard.
+
+    """
+    _LOCAL_HEADER = struct.Struct('<4s22xHH')
+    _LOCAL_HEADER_SIG = b'PK\x03\x04'
+    _END_RECORD = struct.Struct('<4s16xH')
+    _END_RECORD_SIG = b'PK\x05\x06'
+    _CENTRAL_RECORD = struct.Struct('<4s24xH16x')
+    _CENTRAL_RECORD_SIG = b'PK\x01\x02'
+    # How much of the end of a file is searched for a header.
+    HEADER_TAIL_SIZE = 4096
+    VERIFY_READ_SIZE = 1024 * 1024
+    # Members are only read on several threads when there is at least this
+    # much (uncompressed) data in total.
+    PARALLEL_MIN_SIZE = 16 * 1024 * 1024
 
     @classmethod
     def is_archive_type(cls, path):
         return zipfile.is_zipfile(str(path))
 
     @classmethod
-    def save(cls, source, destination):
-        with zipfile.ZipFile(str(destination), mode='w',
-                             compression=zipfile.ZIP_DEFLATED,
-                             allowZip64=True) as zf:
-            for root, dirs, files in os.walk(str(source)):
-                # Prune hidden directories from traversal. Strategy modified
-                # from http://stackoverflow.com/a/13454267/3776794
-                dirs[:] = [d for d in dirs if not d.startswith('.')]
+    def save(cls, source, destination, workers=None, compression=None,
+             header=None, deterministic=False):
+        """Compress `source` into a ZIP file at `destination`.
 
-                for file in files:
-                    if file.startswith('.'):
-                        continue
+        Members are compressed on `workers` threads (defaulting to the number
+        of CPUs), the resulting archive does not depend on this value.
+        `compression` is a CompressionPolicy deciding how each member is
+        compressed.
 
-                    abspath = pathlib.Path(root) / file
-                    relpath = abspath.relative_to(source)
+        `destination` may also be a writable binary file object, which is
+        written to sequentially (it doesn't need to be seekable) and left open.
 
-                    zf.write(str(abspath), arcname=cls._as_zip_path(relpath))
+        `header` is stored as the ZIP file's comment, see `read_header`.
+
+        When `deterministic` is True, the ZIP file only depends on the contents
+        of `source` (and `compression`), see `ZipWriter`.
+
+        """
+        args = (source, workers, compression, header, deterministic)
+        if _is_stream(destination):
+            cls._write(destination, *args)
+        else:
+            with open(str(destination), mode='wb') as fh:
+                cls._write(fh, *args)
+
+    @classmethod
+    def _write(cls, fh, source, workers, compression, header, deterministic):
+        comment = b''
+        if header is not None:
+            comment = header.encode('utf-8')
+        with ZipWriter(fh, workers=workers, comment=comment,
+                       deterministic=deterministic) as writer:
+            writer.write_files(cls._iter_source(source),
+                               compression=compression)
+
+    @classmethod
+    def read_header(cls, filepath):
+        """Read the header of the ZIP file at `filepath`, or None.
+
+        `filepath` may also be a ByteSource. Only the end of the file is read,
+        neither the central directory nor any of the members are.
+
+        """
+        return cls._read_tail(filepath)[0]
+
+    @classmethod
+    def _read_tail(cls, filepath):
+        # The header and the name of the last member in the central directory
+        # (which immediately precedes the end record), either may be None.
+        tail = as_byte_source(filepath).read_tail(cls.HEADER_TAIL_SIZE)
+
+        index = tail.rfind(cls._END_RECORD_SIG)
+        if index == -1 or len(tail) - index < cls._END_RECORD.size:
+            return None, None
+        _, comment_length = cls._END_RECORD.unpack_from(tail, index)
+        comment = tail[index + cls._END_RECORD.size:]
+
+        last_member = None
+        start = tail.rfind(cls._CENTRAL_RECORD_SIG, 0, index)
+        if start != -1 and index - start >= cls._CENTRAL_RECORD.size:
+            _, name_length = cls._CENTRAL_RECORD.unpack_from(tail, start)
+            name = tail[start + cls._CENTRAL_RECORD.size:][:name_length]
+            try:
+                last_member = name.decode('utf-8')
+            except UnicodeDecodeError:
+                pass
+
+        if not comment or len(comment) != comment_length:
+            return None, last_member
+        try:
+            return comment.decode('utf-8'), last_member
+        except UnicodeDecodeError:
+            return None, last_member
+
+    @classmethod
+    def _iter_source(cls, source):
+        for root, dirs, files in os.walk(str(source)):
+            # Prune hidden directories from traversal. Strategy modified
+            # from http://stackoverflow.com/a/13454267/3776794
+            # Sorted so that members are always written in the same order.
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+
+            for file in sorted(files):
+                if file.startswith('.'):
+                    continue
+
+                abspath = pathlib.Path(root) / file
+                relpath = abspath.relative_to(source)
+
+                yield abspath, cls._as_zip_path(relpath)
+
+    def __init__(self, path):
+        # Everything is read through the source, so the ZIP file may also be
+        # somewhere other than the local filesystem (see `ByteSource`). The
+        # path of a local ZIP file is still its filepath.
+        self._source = as_byte_source(path)
+        if self.is_local():
+            path = self._source.path
+        else:
+            path = self._source
+
+        self._zf = _SourceZipFile(self._source)
+        # The central directory is only read once, this is the index used by
+        # every other lookup.
+        self._index = self._build_index(self._zf.infolist())
+        try:
+            super().__init__(path)
+        except Exception:
+            self.close()
+            raise
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state['_zf']
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._zf = _SourceZipFile(self._source)
+
+    def close(self):
+        self._zf.close()
+
+    @classmethod
+    def _build_index(cls, infos):
+        # A tree of the members, so that listing a directory (or finding every
+        # member below it) doesn't need to look at the rest of the archive.
+        index = _IndexDirectory()
+        for info in infos:
+            parts = [part for part in info.filename.split('/')
+                     if part not in ('', '.')]
+            if not parts:
+                continue
+            node = index
+            for part in parts[:-1]:
+                child = node.get(part)
+                if not isinstance(child, _IndexDirectory):
+                    child = node[part] = _IndexDirectory()
+                node = child
+
+            name = parts[-1]
+            if info.filename.endswith('/'):
+                child = node.get(name)
+                if not isinstance(child, _IndexDirectory):
+                    child = node[name] = _IndexDirectory()
+                child.info = info
+            elif not isinstance(node.get(name), _IndexDirectory):
+                node[name] = info
+        return index
+
+    def _lookup(self, relpath):
+        node = self._index
+        for part in pathlib.PurePosixPath(self._as_zip_path(relpath)).parts:
+            if not isinstance(node, _IndexDirectory) or part not in node:
+                return None
+            node = node[part]
+        return node
 
     def relative_iterdir(self, relpath=''):
-        relpath = self._as_zip_path(relpath)
-        seen = set()
-        with zipfile.ZipFile(str(self.path), mode='r') as zf:
-            for name in zf.namelist():
-                if name.startswith(relpath):
-                    parts = pathlib.PurePosixPath(name).parts
-                    if len(parts) > 0:
-                        result = parts[0]
-                        if result not in seen:
-                            seen.add(result)
-                            yield result
-
-    def open(self, relpath):
+        node = self._lookup(relpath)
+        if isinstance(node, _IndexDirectory):
+            yield from node
+
+    def exists(self, relpath):
+        return self._lookup(relpath) is not None
+
+    def size(self, relpath):
+        node = self._lookup(relpath)
+        if node is None:
+            raise FileNotFoundError("%r is not in %s." % (str(relpath),
+                                                          self.path))
+        if isinstance(node, _IndexDirectory):
+            return sum(info.file_size for info in node.iter_infos())
+        return node.file_size
+
+    def is_canonical(self):
+        for name in self._zf.namelist():
+            if name.endswith('/'):
+                return False
+            if any(part.startswith('.')
+                   for part in pathlib.PurePosixPath(name).parts):
+                return False
+        return True
+
+    def is_local(self):
+        return isinstance(self._source, FileByteSource)
+
+    def open(self, relpath, mode='r'):
         relpath = pathlib.Path(str(self.uuid)) / relpath
-        with zipfile.ZipFile(str(self.path), mode='r') as zf:
-            # The filehandle will still work even when `zf` is "closed"
-            return io.TextIOWrapper(zf.open(self._as_zip_path(relpath)))
+        info = self._zf.getinfo(self._as_zip_path(relpath))
+        fh = self._open_member(self._zf, info)
+        if mode == 'rb':
+            return fh
+        return io.TextIOWrapper(fh)
+
+    def _lookup_root(self, relpath):
+        # Same as `_lookup`, relative to the archive root.
+        return self._lookup(pathlib.PurePosixPath(str(self.uuid)) / relpath)
 
-    def mount(self, filepath):
+    @classmethod
+    def _open_member(cls, zf, info):
+        if info.compress_type != ZIP_ZSTANDARD:
+            return zf.open(info)
+
+        # `zipfile` understands the central directory entry of a Zstandard
+        # member, but can't decompress it, so the data is read directly.
+        if isinstance(zf, _SourceZipFile):
+            fh = zf.source.open()
+        else:
+            fh = open(zf.filename, mode='rb')
+        try:
+            fh.seek(cls._data_offset(fh, info))
+        except Exception:
+            fh.close()
+            raise
+        return io.BufferedReader(ZstdMemberReader(fh, info))
+
+    @classmethod
+    def _read_member(cls, fh, info):
+        # Read a member through `fh` (a file object of the whole ZIP file,
+        # which isn't closed along with the member) without going through a
+        # ZipFile, so the central directory parsed once is enough.
+        fh.seek(cls._data_offset(fh, info))
+        if info.compress_type == ZIP_ZSTANDARD:
+            return io.BufferedReader(ZstdMemberReader(fh, info, closefd=False))
+        return zipfile.ZipExtFile(fh, 'r', info, None, False)
+
+    @classmethod
+    def _data_offset(cls, fh, info):
+        # The local header's name and extra field may differ from the central
+        # directory's, so its lengths must be read to find the data.
+        fh.seek(info.header_offset)
+        signature, name_length, extra_length = cls._LOCAL_HEADER.unpack(
+            fh.read(cls._LOCAL_HEADER.size))
+        if signature != cls._LOCAL_HEADER_SIG:
+            raise zipfile.BadZipFile("Bad magic number for file header of %r"
+                                     % info.filename)
+        return (info.header_offset + cls._LOCAL_HEADER.size + name_length +
+                extra_length)
+
+    def map_member(self, relpath):
+        """Memory map a member stored without compression.
+
+        Returns a read-only memoryview directly over the archive's bytes, which
+        remains valid after the archive is closed. Raises ValueError when the
+        member is compressed or the archive isn't local.
+
+        """
+        relpath = pathlib.Path(str(self.uuid)) / relpath
+        info = self._zf.getinfo(self._as_zip_path(relpath))
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError("%r is compressed, only members stored without"
+                             " compression can be mapped." % info.filename)
+        if not self.is_local():
+            raise ValueError("%s is not a local file, its members can't be"
+                             " mapped." % self.path)
+
+        with open(str(self.path), mode='rb') as fh:
+            offset = self._data_offset(fh, info)
+        return _map_file(self.path, offset, info.file_size)
+
+    def mount(self, filepath, lazy=False, workers=None):
         # TODO: use FUSE/MacFUSE/Dokany bindings (many Python bindings are
         # outdated, we may need to take up maintenance/fork)
-        root = self.extract(filepath)
+        if lazy:
+            # Only the files at the top of the root are needed to construct a
+            # format (e.g. VERSION and metadata.yaml), everything else waits
+            # for `materialize`.
+            root = self._extract_members(
+                filepath, [child for child in self._root_index().values()
+                           if not isinstance(child, _IndexDirectory)],
+                workers=1)
+        else:
+            root = self.extract(filepath, workers=workers)
         return ArchiveRecord(root, root / self.VERSION_FILE,
                              self.uuid, self.version, self.framework_version)
 
-    def extract(self, filepath):
+    def extract(self, filepath, workers=None):
+        """Extract the archive root into `filepath` using `workers` threads.
+
+        Each thread reads from its own handle on the ZIP file. `workers`
+        defaults to the number of CPUs.
+
+        """
+        return self._extract_members(
+            filepath, self._root_index().iter_infos(), workers=workers)
+
+    def _extract_prefix(self, filepath, relpath):
+        node = self._lookup(pathlib.PurePosixPath(str(self.uuid)) / relpath)
+        if node is None:
+            infos = []
+        elif isinstance(node, _IndexDirectory):
+            infos = node.iter_infos()
+        else:
+            infos = [node]
+        self._extract_members(filepath, infos)
+
+    def _root_index(self):
+        return self._index[str(self.uuid)]
+
+    def _extract_members(self, filepath, infos, workers=None):
         filepath = pathlib.Path(filepath)
-        with zipfile.ZipFile(str(self.path), mode='r') as zf:
-            for name in zf.namelist():
-                if name.startswith(str(self.uuid)):
-                    # extract removes `..` components, so as long as we extract
-                    # into `filepath`, the path won't go backwards.
-                    zf.extract(name, path=str(filepath))
 
+        # Every directory is created up front, so extracting a member is only
+        # a matter of copying bytes.
+        targets = {}
+        directories = set()
+        for info in infos:
+            target = self._member_target(filepath, info.filename)
+            if info.filename.endswith('/'):
+                directories.add(target)
+            else:
+                directories.add(target.parent)
+                targets[info] = target
+        for directory in sorted(directories):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self._run_batches(self._extract_batch, list(targets.items()),
+                          lambda item: item[0].file_size, workers)
         return filepath / str(self.uuid)
 
+    def _run_batches(self, function, items, size, workers):
+        """Call `function(fh, batch)` on batches of `items` in parallel.
+
+        `fh` is a file object of the ZIP file for `_read_member`. Items are
+        dealt out by `size` so that the batches are balanced, each extra
+        thread reads from its own file object. Archives which aren't local,
+        or which have less than `PARALLEL_MIN_SIZE` of data, are read on one
+        thread. Returns the results of every batch.
+
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(items))
+        if (not self.is_local() or
+                sum(map(size, items)) < self.PARALLEL_MIN_SIZE):
+            workers = 1
+        if workers <= 1:
+            # The file object the central directory was read from is reused
+            # (along with anything it has buffered), under the lock `zipfile`
+            # itself reads from it with.
+            with self._zf._lock:
+                return [function(self._zf.fp, items)]
+
+        ordered = sorted(items, key=size, reverse=True)
+        batches = [ordered[i::workers] for i in range(workers)]
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            futures = [pool.submit(self._run_handle_batch, function, batch)
+                       for batch in batches]
+            return [future.result() for future in futures]
+
+    def _run_handle_batch(self, function, batch):
+        with self._source.open() as fh:
+            return function(fh, batch)
+
+    @classmethod
+    def _extract_batch(cls, fh, batch):
+        for info, target in batch:
+            with cls._read_member(fh, info) as src, \
+                    target.open(mode='wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+    def verify(self, workers=None):
+        """Decompress every member, checking its CRC, using `workers` threads.
+
+        Raises ValueError naming every corrupt member.
+
+        """
+        infos = [info for info in self._zf.infolist()
+                 if not info.filename.endswith('/')]
+        results = self._run_batches(self._verify_batch, infos,
+                                    lambda info: info.file_size, workers)
+        corrupt = sorted(name for batch in results for name in batch)
+        if corrupt:
+            raise ValueError("%s has corrupt members: %s"
+                             % (self.path, ', '.join(corrupt)))
+
+    def _verify_batch(self, fh, batch):
+        corrupt = []
+        for info in batch:
+            try:
+                with self._read_member(fh, info) as member:
+                    while member.read(self.VERIFY_READ_SIZE):
+                        pass
+            except DECODE_ERRORS:
+                corrupt.append(info.filename)
+        return corrupt
+
+    @classmethod
+    def _member_target(cls, filepath, name):
+        # Same as `ZipFile.extract`, remove any component which could leave
+        # `filepath` (such as `..` or a leading `/`).
+        parts = [part for part in pathlib.PurePosixPath(name).parts
+                 if part not in ('/', '.', '..')]
+        return filepath.joinpath(*parts)
+
     @classmethod
     def _as_zip_path(self, path):
         path = str(pathlib.PurePosixPath(path))
@@ -221,13 +780,101 @@ class _ZipArchive(_Archive):
         return path
 
 
+class _DirectoryArchive(_Archive):
+    """An "exploded" archive, the archive root is a plain directory on disk.
+
+    Saving hardlinks every file into the destination (copying only when a link
+    is impossible, e.g. across filesystems) and loading uses the directory in
+    place, so neither compresses nor extracts anything.
+
+    """
+    IN_PLACE = True
+
+    @classmethod
+    def is_archive_type(cls, path):
+        return pathlib.Path(path).is_dir()
+
+    @classmethod
+    def save(cls, source, destination, workers=None, compression=None,
+             header=None, deterministic=False):
+        # The header is redundant, directories don't need one to be peeked
+        # cheaply.
+        if _is_stream(destination):
+            raise TypeError("Directory archives can't be written to a file"
+                            " object, provide a path instead.")
+        source = pathlib.Path(source)
+        destination = pathlib.Path(destination)
+        if destination.exists():
+            raise FileExistsError("%s already exists." % destination)
+
+        for abspath, relpath in _ZipArchive._iter_source(source):
+            target = destination / relpath
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(str(abspath), str(target))
+            except OSError:
+                shutil.copy2(str(abspath), str(target))
+
+    def relative_iterdir(self, relpath=''):
+        path = self.path / relpath
+        if path.is_dir():
+            yield from os.listdir(str(path))
+
+    def exists(self, relpath):
+        return (self.path / relpath).exists()
+
+    def size(self, relpath):
+        path = self.path / relpath
+        if not path.is_dir():
+            return path.stat().st_size
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, files in os.walk(str(path))
+                   for name in files)
+
+    def open(self, relpath, mode='r'):
+        return (self.path / str(self.uuid) / relpath).open(mode=mode)
+
+    def mount(self, filepath, lazy=False, workers=None):
+        root = self.path / str(self.uuid)
+        return ArchiveRecord(root, root / self.VERSION_FILE,
+                             self.uuid, self.version, self.framework_version)
+
+    def materialize(self, filepath, relpath='.'):
+        pass
+
+    def verify(self, workers=None):
+        # Files on disk have no checksums to verify.
+        pass
+
+    def extract(self, filepath, workers=None):
+        root = pathlib.Path(filepath) / str(self.uuid)
+        shutil.copytree(str(self.path / str(self.uuid)), str(root))
+        return root
+
+
 class Archiver:
+    # How many `save_async` calls may be compressing at once, further calls
+    # wait for one of them to finish.
+    MAX_PENDING_SAVES = 2
+    _save_lock = threading.Lock()
+    _save_pool = None
+    _save_slots = None
+    _save_thread = threading.local()
+
+    # Format 2 only adds a header (see `peek`), but no released framework can
+    # read it, so it is only written when opted into (e.g. with
+    # `qiime2.core.archive.format.util.artifact_version(2)`).
     CURRENT_FORMAT_VERSION = '1'
     CURRENT_ARCHIVE = _ZipArchive
+    _ARCHIVE_REGISTRY = {
+        'zip': _ZipArchive,
+        'directory': _DirectoryArchive
+    }
     _FORMAT_REGISTRY = {
         # NOTE: add more archive formats as things change
         '0': 'qiime2.core.archive.format.v0:ArchiveFormat',
-        '1': 'qiime2.core.archive.format.v1:ArchiveFormat'
+        '1': 'qiime2.core.archive.format.v1:ArchiveFormat',
+        '2': 'qiime2.core.archive.format.v2:ArchiveFormat'
     }
 
     @classmethod
@@ -244,19 +891,59 @@ class Archiver:
 
     @classmethod
     def get_archive(cls, filepath):
-        filepath = pathlib.Path(filepath)
-        if not filepath.exists():
-            raise ValueError("%s does not exist." % filepath)
+        """Open the archive at `filepath`.
 
-        if _ZipArchive.is_archive_type(filepath):
-            archive = _ZipArchive(filepath)
-        else:
-            raise ValueError("%s is not a QIIME archive." % filepath)
+        The result should be closed (or used as a context manager) when it is
+        no longer needed. It may be passed to `peek`, `extract`, and `load` in
+        place of a filepath so that the archive is only opened once.
+
+        `filepath` may also be an HTTP(S) URL or any other ByteSource, in
+        which case only the parts of the ZIP file which are used are read.
+
+        """
+        if isinstance(filepath, _Archive):
+            return filepath
+
+        # ZIP files which aren't local (e.g. HTTP URLs) are read as needed.
+        source = as_byte_source(filepath)
+        if not source.exists():
+            raise ValueError("%s does not exist." % source)
+
+        if (isinstance(source, FileByteSource) and
+                _DirectoryArchive.is_archive_type(source.path)):
+            return _DirectoryArchive(source.path)
+
+        try:
+            # Opening the archive is what checks its type, so there is no need
+            # to read the end of the file an extra time with `is_archive_type`
+            archive = _ZipArchive(source)
+        except zipfile.BadZipFile:
+            raise ValueError("%s is not a QIIME archive." % source)
 
         return archive
 
     @classmethod
-    def _futuristic_archive_error(filepath, archive):
+    def get_archive_type(cls, archive_type=None):
+        if archive_type is None:
+            return cls.CURRENT_ARCHIVE
+        try:
+            return cls._ARCHIVE_REGISTRY[archive_type]
+        except KeyError:
+            raise ValueError("Archive type must be one of %r, not %r."
+                             % (sorted(cls._ARCHIVE_REGISTRY), archive_type))
+
+    @classmethod
+    @contextlib.contextmanager
+    def _open_archive(cls, filepath):
+        # Archives provided by the caller are theirs to close.
+        if isinstance(filepath, _Archive):
+            yield filepath
+        else:
+            with cls.get_archive(filepath) as archive:
+                yield archive
+
+    @classmethod
+    def _futuristic_archive_error(cls, filepath, archive):
         raise ValueError("%s was created by 'QIIME %s'. The currently"
                          " installed framework cannot interpret archive"
                          " version %r."
@@ -265,36 +952,161 @@ class Archiver:
 
     @classmethod
     def peek(cls, filepath):
-        archive = cls.get_archive(filepath)
-        Format = cls.get_format_class(archive.version)
-        if Format is None:
-            cls._futuristic_archive_error(filepath, archive)
-        # NOTE: in the future, we may want to manipulate the results so that
-        # older formats provide the "new" API even if they don't support it.
-        # e.g. a new format has a new property that peek should describe. We
-        # add some compatability code here to return a default for that
-        # property on older formats.
-        return Format.load_metadata(archive)
-
-    @classmethod
-    def extract(cls, filepath, dest):
-        archive = cls.get_archive(filepath)
-        # Format really doesn't matter, the archive knows how to extract so
-        # that is sufficient, furthermore it would suck if something was wrong
-        # with an archive's format and extract failed to actually extract.
-        return str(archive.extract(dest))
-
-    @classmethod
-    def load(cls, filepath):
-        archive = cls.get_archive(filepath)
-        Format = cls.get_format_class(archive.version)
-        if Format is None:
-            cls._futuristic_archive_error(filepath, archive)
+        if not isinstance(filepath, _Archive):
+            metadata = cls._peek_header(filepath)
+            if metadata is not None:
+                return metadata
+
+        with cls._open_archive(filepath) as archive:
+            Format = cls.get_format_class(archive.version)
+            if Format is None:
+                cls._futuristic_archive_error(filepath, archive)
+            # NOTE: in the future, we may want to manipulate the results so
+            # that older formats provide the "new" API even if they don't
+            # support it. e.g. a new format has a new property that peek
+            # should describe. We add some compatability code here to return a
+            # default for that property on older formats.
+            return Format.load_metadata(archive)
 
-        path = cls._make_temp_path()
-        rec = archive.mount(path)
+    @classmethod
+    def verify(cls, filepath, workers=None):
+        """Check that `filepath` is an intact archive which could be loaded.
+
+        The archive's structure and metadata are checked, then every member is
+        read on `workers` threads (defaults to the number of CPUs) to check
+        its CRC. Raises ValueError describing the problem when it isn't.
+
+        """
+        with cls._open_archive(filepath) as archive:
+            Format = cls.get_format_class(archive.version)
+            if Format is None:
+                cls._futuristic_archive_error(filepath, archive)
+            try:
+                Format.load_metadata(archive)
+            except ValueError:
+                raise
+            except Exception as e:
+                raise ValueError("%s has invalid metadata: %s"
+                                 % (filepath, e))
+            archive.verify(workers=workers)
 
-        return cls(path, Format(rec))
+    @classmethod
+    def verify_all(cls, filepaths, workers=None):
+        """Verify many archives at once using `workers` threads.
+
+        Returns an OrderedDict mapping each filepath to None when it is
+        intact, otherwise to the exception describing the problem.
+
+        """
+        filepaths = list(filepaths)
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        def verify(filepath):
+            # The archives are already verified in parallel.
+            try:
+                cls.verify(filepath, workers=1)
+            except Exception as e:
+                return e
+            return None
+
+        with concurrent.futures.ThreadPoolExecutor(max(workers, 1)) as pool:
+            results = pool.map(verify, filepaths)
+            return collections.OrderedDict(zip(filepaths, results))
+
+    @classmethod
+    def _peek_header(cls, filepath):
+        # Archives with a header can be peeked without opening them, anything
+        # unexpected falls back to the slow path which reports it properly.
+        try:
+            source = as_byte_source(filepath)
+            if (isinstance(source, FileByteSource) and
+                    not source.path.is_file()):
+                return None
+            header, last_member = _ZipArchive._read_tail(source)
+        except OSError:
+            return None
+        if header is None:
+            return None
+
+        match = _HEADER_VERSION.match(header)
+        if match is None:
+            return None
+        Format = cls.get_format_class(match.group(1))
+        if Format is None or not hasattr(Format, 'parse_header'):
+            return None
+        try:
+            uuid, type, format = Format.parse_header(header)
+        except ValueError:
+            return None
+
+        # The comment is only trusted when it describes this ZIP file, i.e.
+        # the members are in the root directory it names (a comment survives
+        # tools which rewrite the rest of the file).
+        if not _Archive._is_uuid4(uuid) or not type:
+            return None
+        if last_member is None or not last_member.startswith(uuid + '/'):
+            return None
+        return uuid, type, format
+
+    @classmethod
+    def extract(cls, filepath, dest, workers=None):
+        with cls._open_archive(filepath) as archive:
+            # Format really doesn't matter, the archive knows how to extract so
+            # that is sufficient, furthermore it would suck if something was
+            # wrong with an archive's format and extract failed to actually
+            # extract.
+            return str(archive.extract(dest, workers=workers))
+
+    @classmethod
+    def load(cls, filepath, lazy=False, workers=None):
+        with contextlib.ExitStack() as stack:
+            archive = cls.get_archive(filepath)
+            if archive is not filepath:
+                stack.callback(archive.close)
+            Format = cls.get_format_class(archive.version)
+            if Format is None:
+                cls._futuristic_archive_error(filepath, archive)
+
+            if archive.IN_PLACE:
+                # Nothing will be extracted, so there is no need for a
+                # temporary directory. This path is not the archiver's to
+                # delete.
+                path = archive.path
+            else:
+                path = cls._make_temp_path()
+            rec = archive.mount(path, lazy=lazy, workers=workers)
+
+            source = None
+            if (not archive.IN_PLACE and archive.is_local() and
+                    archive.is_canonical()):
+                source = ArchiveSource(type(archive), archive.path,
+                                       _file_signature(archive.path))
+
+            if lazy and not archive.IN_PLACE:
+                # Members are read for as long as the archiver exists, so the
+                # archive must stay open (and is closed along with it, unless
+                # it belongs to the caller).
+                archiver = cls(path, Format(rec), archive=archive,
+                               source=source)
+                if archive is not filepath:
+                    stack.pop_all()
+                    weakref.finalize(archiver, archive.close)
+                return archiver
+            return cls(path, Format(rec), source=source)
+
+    @classmethod
+    def convert(cls, filepath, destination, archive_type=None, **kwargs):
+        """Save the archive at `filepath` as a different type of archive.
+
+        For example, an exploded directory archive can be converted into a
+        .qza by using `archive_type='zip'` (the default). Extra keyword
+        arguments are passed on to `save`.
+
+        """
+        with cls.get_archive(filepath) as archive:
+            archiver = cls.load(archive, lazy=True)
+            archiver.save(destination, archive_type=archive_type, **kwargs)
 
     @classmethod
     def from_data(cls, type, format, data_initializer, provenance_capture):
@@ -307,9 +1119,147 @@ class Archiver:
 
         return cls(path, Format(rec))
 
-    def __init__(self, path, fmt):
+    def __init__(self, path, fmt, archive=None, source=None):
         self.path = path
         self._fmt = fmt
+        # Only present when lazily loaded, members are extracted from this
+        # archive the first time a directory which contains them is requested.
+        self._archive = archive
+        # Only present when loaded from an archive file. Archives are
+        # immutable, so as long as that file is unchanged it can be copied
+        # instead of compressing everything all over again.
+        self._source = source
+
+        if archive is not None:
+            _LAZY_MOUNTS[str(path)] = self
+
+    def __getstate__(self):
+        # Another process (e.g. running an action asynchronously) has its own
+        # store of ancestors, so they are written out before the archiver
+        # leaves this one.
+        provenance_dir = getattr(self._fmt, 'provenance_dir', None)
+        if provenance_dir is not None:
+            ProvenanceCapture.ancestor_store.write(provenance_dir)
+        return self.__dict__
+
+    def _materialize(self, path):
+        if self._archive is not None:
+            self._archive.materialize(self.path,
+                                      path.relative_to(self._fmt.path))
+
+        # The provenance of a result created in this process only refers to
+        # its ancestors until it is needed.
+        provenance_dir = getattr(self._fmt, 'provenance_dir', None)
+        if provenance_dir is not None and (
+                path == self._fmt.path or path == provenance_dir or
+                provenance_dir in path.parents):
+            ProvenanceCapture.ancestor_store.write(provenance_dir)
+        return path
+
+    # NOTE: the following classmethods take any path, those which are within
+    # the root of a lazily loaded archive are answered from the archive
+    # without extracting anything (unless stated otherwise). This is what
+    # allows formats to extract only the members they use.
+    @classmethod
+    def _find_lazy_mount(cls, path):
+        # The archiver and path relative to its root, when `path` is in the
+        # mount of a lazily loaded archive.
+        if _LAZY_MOUNTS:
+            path = pathlib.Path(path)
+            for parent in path.parents:
+                archiver = _LAZY_MOUNTS.get(str(parent))
+                if archiver is not None:
+                    try:
+                        return archiver, path.relative_to(archiver._fmt.path)
+                    except ValueError:
+                        break
+        return None, None
+
+    @classmethod
+    def map_file(cls, filepath):
+        """Memory map `filepath`, returning a read-only memoryview.
+
+        When `filepath` is in the mount of a lazily loaded archive and its
+        member is stored without compression, it is mapped directly from the
+        archive instead of being extracted.
+
+        """
+        archiver, _ = cls._find_lazy_mount(filepath)
+        if archiver is not None:
+            return archiver.map(filepath)
+        return _map_file(filepath)
+
+    @classmethod
+    def materialize_path(cls, path):
+        """Extract `path` (and everything below it) from its archive."""
+        archiver, relpath = cls._find_lazy_mount(path)
+        if archiver is not None:
+            archiver._archive.materialize(archiver.path, relpath)
+        return path
+
+    @classmethod
+    def open_path(cls, path, seekable=False):
+        """Open `path` to read bytes.
+
+        Members which haven't been extracted are decompressed as they are
+        read. When `seekable` is True and that stream can't seek, the member is
+        extracted and opened instead.
+
+        """
+        archiver, relpath = cls._find_lazy_mount(path)
+        if (archiver is not None and
+                not archiver._archive.is_materialized(relpath) and
+                cls.is_file(path)):
+            fh = archiver._archive.open(relpath, mode='rb')
+            if not seekable or fh.seekable():
+                return fh
+            fh.close()
+            cls.materialize_path(path)
+        return open(str(path), mode='rb')
+
+    @classmethod
+    def is_file(cls, path):
+        archiver, relpath = cls._find_lazy_mount(path)
+        if archiver is None:
+            return pathlib.Path(path).is_file()
+        return isinstance(archiver._archive._lookup_root(relpath),
+                          zipfile.ZipInfo)
+
+    @classmethod
+    def is_dir(cls, path):
+        archiver, relpath = cls._find_lazy_mount(path)
+        if archiver is None:
+            return pathlib.Path(path).is_dir()
+        return isinstance(archiver._archive._lookup_root(relpath),
+                          _IndexDirectory)
+
+    @classmethod
+    def iter_files(cls, directory):
+        """Yield the path of every file below `directory`, recursively."""
+        archiver, relpath = cls._find_lazy_mount(directory)
+        if archiver is None:
+            for path in pathlib.Path(directory).glob('**/*'):
+                if path.is_file():
+                    yield path
+            return
+
+        node = archiver._archive._lookup_root(relpath)
+        if isinstance(node, _IndexDirectory):
+            for info in node.iter_infos():
+                if not info.filename.endswith('/'):
+                    yield archiver._archive._member_target(
+                        pathlib.Path(archiver.path), info.filename)
+
+    def map(self, filepath):
+        """Memory map `filepath` (within this archiver's root directory)."""
+        relpath = pathlib.Path(filepath).relative_to(self._fmt.path)
+        if self._archive is not None:
+            try:
+                return self._archive.map_member(relpath)
+            except (KeyError, ValueError):
+                # Compressed or not a member, it must be on disk.
+                pass
+        return _map_file(self._materialize(self._fmt.path / relpath))
 
     @property
     def uuid(self):
@@ -325,18 +1275,176 @@ class Archiver:
 
     @property
     def data_dir(self):
+        return self._materialize(self._fmt.data_dir)
+
+    @property
+    def sparse_data_dir(self):
+        """The data directory, without extracting it from a lazy archive.
+
+        Formats read from it only extract the members which they use.
+
+        """
         return self._fmt.data_dir
 
     @property
     def root_dir(self):
-        return self._fmt.path
+        return self._materialize(self._fmt.path)
 
     @property
-    def provenance_dir(self):
+    def sparse_provenance_dir(self):
+        """The provenance directory, without extracting or resolving it.
+
+        Only the provenance of the result itself is guaranteed to be there,
+        not that of its ancestors.
+
+        """
         return getattr(self._fmt, 'provenance_dir', None)
 
-    def save(self, filepath):
-        self.CURRENT_ARCHIVE.save(self.path, filepath)
+    @property
+    def provenance_dir(self):
+        provenance_dir = getattr(self._fmt, 'provenance_dir', None)
+        if provenance_dir is None:
+            return None
+        return self._materialize(provenance_dir)
+
+    def save(self, filepath, workers=None, compression=None,
+             archive_type=None, deterministic=False, header=None):
+        """Save the archive, `archive_type` is a key of `_ARCHIVE_REGISTRY`.
+
+        By default a ZIP file is written, 'directory' writes an exploded
+        archive instead. ZIP files may also be written to a binary file
+        object (e.g. a pipe or an in-memory buffer) in a single pass.
+
+        When `deterministic` is True, saving the same archive always produces
+        the same bytes (no timestamps or permissions are recorded).
+
+        When `header` is True, a ZIP file gets a header (its comment) which
+        `peek` reads without opening the archive. The archive is otherwise
+        unchanged, so every version of the framework can still load it.
+        By default only archives of format 2 have one, False omits it.
+
+        """
+        Archive = self.get_archive_type(archive_type)
+        if header is None:
+            header = self._fmt.header()
+        elif header:
+            if not hasattr(self._fmt, 'make_header'):
+                raise ValueError("Version 0 archives can't have a header.")
+            header = self._fmt.make_header()
+        else:
+            header = None
+
+        # The source archive may not have been saved deterministically, or
+        # have a different header.
+        if (compression is None and not deterministic and
+                header == self._fmt.header() and
+                self._copy_source(filepath, Archive)):
+            return
+        self._materialize(self._fmt.path)
+        Archive.save(self.path, filepath, workers=workers,
+                     compression=compression, header=header,
+                     deterministic=deterministic)
+
+    def save_async(self, filepath, **kwargs):
+        """Save in a background thread, returning a concurrent.futures.Future.
+
+        Takes the same arguments as `save` and the future's result is
+        `filepath`. The archiver (and its temporary directory) is kept alive
+        until the save is done. When `MAX_PENDING_SAVES` are already in
+        progress this blocks until one of them finishes, so that saves can't
+        pile up faster than they are written.
+
+        Archives are written under a temporary name next to `filepath` and
+        renamed once complete, so a failed or interrupted save never leaves a
+        partial archive behind. Saves which are still pending when the
+        interpreter exits are waited for.
+
+        Called from a save which is itself running in the background, the
+        save is done synchronously (the returned future is already done), as
+        the slot it would wait for may be held by its caller.
+
+        """
+        if getattr(Archiver._save_thread, 'active', False):
+            future = concurrent.futures.Future()
+            try:
+                future.set_result(self._save_returning(filepath, kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        pool, slots = self._get_save_pool()
+        slots.acquire()
+        try:
+            future = pool.submit(self._save_in_pool, filepath, kwargs)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def _save_returning(self, filepath, kwargs):
+        if not isinstance(filepath, (str, pathlib.PurePath)):
+            # Streams are written in place.
+            self.save(filepath, **kwargs)
+            return filepath
+
+        target = pathlib.Path(filepath)
+        temp = target.parent / ('.%s-%s' % (target.name, _uuid.uuid4().hex))
+        try:
+            self.save(str(temp), **kwargs)
+            os.replace(str(temp), str(target))
+        except BaseException:
+            if temp.is_dir():
+                shutil.rmtree(str(temp), ignore_errors=True)
+            elif temp.exists():
+                os.remove(str(temp))
+            raise
+        return filepath
+
+    def _save_in_pool(self, filepath, kwargs):
+        Archiver._save_thread.active = True
+        try:
+            return self._save_returning(filepath, kwargs)
+        finally:
+            Archiver._save_thread.active = False
+
+    @classmethod
+    def _get_save_pool(cls):
+        # Created on first use, by which time an archiver's temporary
+        # directory has registered `weakref.finalize`'s exit hook. Exit hooks
+        # run in reverse order, so pending saves are waited for before those
+        # directories are removed.
+        with cls._save_lock:
+            if Archiver._save_pool is None:
+                Archiver._save_pool = concurrent.futures.ThreadPoolExecutor(
+                    cls.MAX_PENDING_SAVES)
+                Archiver._save_slots = threading.BoundedSemaphore(
+                    cls.MAX_PENDING_SAVES)
+                atexit.register(Archiver._save_pool.shutdown, wait=True)
+            return Archiver._save_pool, Archiver._save_slots
+
+    def _copy_source(self, filepath, Archive):
+        if self._source is None or self._source.archive_type is not Archive:
+            return False
+        try:
+            if _file_signature(self._source.path) != self._source.signature:
+                return False
+            if _is_stream(filepath):
+                with open(str(self._source.path), mode='rb') as fh:
+                    shutil.copyfileobj(fh, filepath, 1024 * 1024)
+                return True
+            if (os.path.exists(str(filepath)) and
+                    os.path.samefile(str(self._source.path), str(filepath))):
+                # Saving over the source, it already has the right bytes.
+                return True
+        except OSError:
+            return False
+
+        _clone_file(self._source.path, filepath)
+        return True
 
     def orphan(self):
-        self.path.orphan()
+        # Archives used in place (e.g. exploded directories) are not owned by
+        # the archiver, so there is nothing to orphan.
+        if isinstance(self.path, qiime2.core.path.InternalDirectory):
+            self.path.orphan()
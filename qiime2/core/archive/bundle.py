@@ -0,0 +1,217 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import pathlib
+import tempfile
+import zipfile
+
+import yaml
+
+import qiime2
+import qiime2.core.yaml_util as yaml_util
+from qiime2.core.util import md5sum
+from .archiver import Archiver, _DirectoryArchive, _ZipArchive
+from .zipwriter import ZipWriter
+
+_BUNDLE_VERSION_TEMPLATE = """\
+QIIME 2 bundle
+bundle: %s
+framework: %s
+"""
+
+
+class ArtifactBundle:
+    """A single ZIP file holding many archives which share provenance.
+
+    Every archive's provenance, and the provenance of each of its ancestors,
+    is stored once under the ancestor's UUID no matter how many archives in
+    the bundle descend from it (saving fails if two copies differ). Any one
+    archive can be loaded without reading the data of the others.
+
+    The layout of the bundle is::
+
+        VERSION
+        index.yaml
+        artifacts/<uuid>/...      (the archive root, without provenance/)
+        provenance/<uuid>/...     (provenance/, without provenance/artifacts/)
+
+    where index.yaml maps the UUID of each archive in the bundle to the UUIDs
+    of its ancestors.
+
+    """
+    BUNDLE_VERSION = '1'
+    VERSION_FILE = 'VERSION'
+    INDEX_FILE = 'index.yaml'
+    ARTIFACTS_DIR = 'artifacts'
+    PROVENANCE_DIR = 'provenance'
+    ANCESTOR_DIR = 'artifacts'
+
+    @classmethod
+    def save(cls, sources, destination, workers=None, compression=None,
+             deterministic=False):
+        """Write a bundle of `sources` (filepaths or `Archiver`s).
+
+        The bundle is written to the file at `destination`, the remaining
+        arguments are the same as `Archiver.save`.
+
+        """
+        # Archives loaded here must outlive the loop, their files are only
+        # read once everything is written.
+        archivers = [source if isinstance(source, Archiver)
+                     else Archiver.load(source) for source in sources]
+
+        index = {}
+        shared = {}
+        checksums = {}
+        members = []
+        with tempfile.TemporaryDirectory(prefix='qiime2-bundle-') as temp:
+            for source in archivers:
+                uuid = str(source.uuid)
+                if uuid in index:
+                    continue
+                ancestors = set()
+
+                for abspath, relpath in _ZipArchive._iter_source(
+                        source.root_dir):
+                    parts = pathlib.PurePosixPath(relpath).parts
+                    if parts[0] != cls.PROVENANCE_DIR:
+                        members.append((abspath, '/'.join(
+                            (cls.ARTIFACTS_DIR, uuid) + parts)))
+                        continue
+
+                    node, rest = uuid, parts[1:]
+                    if len(parts) > 3 and parts[1] == cls.ANCESTOR_DIR:
+                        node, rest = parts[2], parts[3:]
+                        ancestors.add(node)
+                    arcname = '/'.join((cls.PROVENANCE_DIR, node) + rest)
+                    # Provenance should be identical everywhere it is
+                    # copied, so the first copy is kept once that is checked.
+                    if arcname not in shared:
+                        shared[arcname] = abspath
+                        continue
+                    if arcname not in checksums:
+                        checksums[arcname] = md5sum(shared[arcname])
+                    if md5sum(abspath) != checksums[arcname]:
+                        raise ValueError(
+                            "The provenance of %s differs between archives"
+                            " (%s does not match %s), it can't be shared in"
+                            " a bundle." % (node, abspath, shared[arcname]))
+
+                index[uuid] = sorted(ancestors)
+
+            temp = pathlib.Path(temp)
+            version_fp = temp / cls.VERSION_FILE
+            version_fp.write_text(_BUNDLE_VERSION_TEMPLATE
+                                  % (cls.BUNDLE_VERSION, qiime2.__version__))
+            index_fp = temp / cls.INDEX_FILE
+            with index_fp.open(mode='w') as fh:
+                fh.write(yaml_util.dump(index, default_flow_style=False))
+
+            members.extend((abspath, arcname)
+                           for arcname, abspath in shared.items())
+            members.sort(key=lambda member: member[1])
+            members = ([(version_fp, cls.VERSION_FILE),
+                        (index_fp, cls.INDEX_FILE)] + members)
+
+            with open(str(destination), mode='wb') as fh:
+                with ZipWriter(fh, workers=workers,
+                               deterministic=deterministic) as writer:
+                    writer.write_files(members, compression=compression)
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._zf = zipfile.ZipFile(str(self.path), mode='r')
+        try:
+            self._tree = _ZipArchive._build_index(self._zf.infolist())
+            self._index = self._read_index()
+        except Exception:
+            self.close()
+            raise
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, str(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._zf.close()
+
+    def __contains__(self, uuid):
+        return str(uuid) in self._index
+
+    def __iter__(self):
+        """Yield the UUID (as a string) of every archive in the bundle."""
+        yield from sorted(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def load(self, uuid):
+        """Load an archive from the bundle, returning an `Archiver`.
+
+        Only the members of that archive and of its ancestors' provenance are
+        extracted, into a temporary directory which is deleted along with the
+        archiver.
+
+        """
+        uuid = str(uuid)
+        if uuid not in self._index:
+            raise ValueError("%s is not in the bundle at %s."
+                             % (uuid, self.path))
+
+        path = Archiver._make_temp_path()
+        root = path / uuid
+        provenance = root / self.PROVENANCE_DIR
+        targets = [((self.ARTIFACTS_DIR, uuid), root),
+                   ((self.PROVENANCE_DIR, uuid), provenance)]
+        for ancestor in self._index[uuid]:
+            targets.append(((self.PROVENANCE_DIR, ancestor),
+                            provenance / self.ANCESTOR_DIR / ancestor))
+
+        members = []
+        directories = set()
+        for (top, name), target in targets:
+            node = self._tree.get(top, {}).get(name)
+            if node is None:
+                continue
+            prefix = len('%s/%s/' % (top, name))
+            for info in node.iter_infos():
+                if info.filename.endswith('/'):
+                    continue
+                member_target = _ZipArchive._member_target(
+                    target, info.filename[prefix:])
+                directories.add(member_target.parent)
+                members.append((info, member_target))
+        for directory in sorted(directories):
+            directory.mkdir(parents=True, exist_ok=True)
+        with open(str(self.path), mode='rb') as fh:
+            _ZipArchive._extract_batch(fh, members)
+
+        # The archive is used in place and keeps the temporary directory
+        # alive as the archiver's path.
+        return Archiver.load(_DirectoryArchive(path))
+
+    def _read_index(self):
+        try:
+            with self._zf.open(self.VERSION_FILE) as fh:
+                header = fh.read().decode('utf-8').split('\n')[0]
+            if header != 'QIIME 2 bundle':
+                raise ValueError()
+            with self._zf.open(self.INDEX_FILE) as fh:
+                index = yaml_util.load(fh)
+            if not isinstance(index, dict):
+                raise ValueError()
+        except (KeyError, ValueError, UnicodeDecodeError, yaml.YAMLError):
+            raise ValueError("%s is not a correctly formatted bundle."
+                             % self.path)
+        return {str(uuid): [str(ancestor) for ancestor in ancestors]
+                for uuid, ancestors in index.items()}
@@ -0,0 +1,173 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import collections
+import io
+import math
+import os
+import zipfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression method assigned to Zstandard by the ZIP specification (APPNOTE
+# 6.3.7). Not every ZIP reader supports it.
+ZIP_ZSTANDARD = 93
+ZSTD_DEFAULT_LEVEL = 3
+
+# Errors raised while reading a corrupt member, whichever codec it uses.
+DECODE_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError)
+if zstandard is not None:
+    DECODE_ERRORS += (zstandard.ZstdError,)
+
+
+class CompressionPolicy:
+    """Decide how (and whether) each member of an archive is compressed.
+
+    Parameters
+    ----------
+    level : int, optional
+        Compression level, 0 stores every member without compression. For
+        'deflate' the maximum is 9 (defaults to zlib's default level), for
+        'zstd' it is 22 (defaults to 3).
+    method : {'deflate', 'zstd'}, optional
+        Codec used for members which are compressed. 'zstd' is much faster to
+        compress and decompress, but requires the `zstandard` package and is
+        only understood by newer ZIP readers.
+    stored_extensions : iterable of str, optional
+        File extensions (e.g. '.gz') which are stored without compression
+        because their contents are already compressed. Defaults to
+        `INCOMPRESSIBLE_EXTENSIONS`.
+    sample_entropy : bool, optional
+        When True, a sample from the start of every other file is measured
+        and files which look random are stored without compression.
+    entropy_threshold : float, optional
+        Shannon entropy (bits per byte) at or above which a sampled file is
+        considered incompressible.
+
+    """
+    INCOMPRESSIBLE_EXTENSIONS = frozenset([
+        '.gz', '.gzip', '.bz2', '.xz', '.lzma', '.zst', '.zip', '.7z',
+        '.bam', '.cram', '.qza', '.qzv', '.png', '.jpg', '.jpeg', '.gif',
+        '.webp', '.mp4', '.woff', '.woff2'])
+    SAMPLE_SIZE = 64 * 1024
+
+    METHODS = {'deflate': (zipfile.ZIP_DEFLATED, 9),
+               'zstd': (ZIP_ZSTANDARD, 22)}
+
+    def __init__(self, level=None, method='deflate', stored_extensions=None,
+                 sample_entropy=False, entropy_threshold=7.5):
+        if method not in self.METHODS:
+            raise ValueError("Compression method must be one of %r, not %r."
+                             % (sorted(self.METHODS), method))
+        if method == 'zstd' and zstandard is None:
+            raise RuntimeError("Zstandard compression requires the"
+                               " `zstandard` package to be installed.")
+        compress_type, max_level = self.METHODS[method]
+
+        if level is None:
+            if method == 'zstd':
+                level = ZSTD_DEFAULT_LEVEL
+            else:
+                level = zlib.Z_DEFAULT_COMPRESSION
+        elif not 0 <= level <= max_level:
+            raise ValueError("Compression level must be between 0 and %d, not"
+                             " %r." % (max_level, level))
+        if stored_extensions is None:
+            stored_extensions = self.INCOMPRESSIBLE_EXTENSIONS
+
+        self.level = level
+        self.method = method
+        self.compress_type = compress_type
+        self.stored_extensions = frozenset(ext.lower()
+                                           for ext in stored_extensions)
+        self.sample_entropy = sample_entropy
+        self.entropy_threshold = entropy_threshold
+
+    def __repr__(self):
+        return ('%s(level=%r, method=%r, sample_entropy=%r)'
+                % (self.__class__.__name__, self.level, self.method,
+                   self.sample_entropy))
+
+    def should_compress(self, filepath):
+        if self.level == 0:
+            return False
+
+        _, ext = os.path.splitext(str(filepath))
+        if ext.lower() in self.stored_extensions:
+            return False
+
+        if self.sample_entropy:
+            with open(str(filepath), mode='rb') as fh:
+                sample = fh.read(self.SAMPLE_SIZE)
+            return entropy(sample) < self.entropy_threshold
+
+        return True
+
+
+def entropy(data):
+    """Shannon entropy of `data` in bits per byte (0 to 8)."""
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total)
+                for count in collections.Counter(data).values())
+
+
+class ZstdMemberReader(io.RawIOBase):
+    """Decompress a Zstandard ZIP member, checking its CRC at the end.
+
+    `fh` must be positioned at the start of the member's compressed data, it
+    is closed along with the reader unless `closefd` is False.
+
+    """
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, fh, info, closefd=True):
+        if zstandard is None:
+            raise RuntimeError("%r is compressed with Zstandard which requires"
+                               " the `zstandard` package to be installed."
+                               % info.filename)
+        super().__init__()
+        self._fh = fh
+        self._closefd = closefd
+        self._info = info
+        self._remaining = info.compress_size
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        self._buffer = memoryview(b'')
+        self._crc = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and self._remaining:
+            raw = self._fh.read(min(self._remaining, self.READ_SIZE))
+            if not raw:
+                raise zipfile.BadZipFile("Truncated data for file %r"
+                                         % self._info.filename)
+            self._remaining -= len(raw)
+            self._buffer = memoryview(self._decompressor.decompress(raw))
+
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._crc = zlib.crc32(self._buffer[:size], self._crc)
+        self._buffer = self._buffer[size:]
+
+        if not size and self._crc != self._info.CRC:
+            raise zipfile.BadZipFile("Bad CRC-32 for file %r"
+                                     % self._info.filename)
+        return size
+
+    def close(self):
+        if self._closefd:
+            self._fh.close()
+        super().close()
@@ -77,3 +77,32 @@ class TestArtifactVersion(unittest.TestCase, ArchiveTestingMixin):
         with zipfile.ZipFile(fp, mode='r') as zf:
             version = zf.read(os.path.join(root_dir, 'VERSION'))
         self.assertRegex(str(version), '^.*archive: 1.*$')
+
+    def test_write_v2_archive(self):
+        fp = os.path.join(self.temp_dir.name, 'artifact_v2.qza')
+
+        with artifact_version(2):
+            artifact = Artifact._from_view(FourInts, [-1, 42, 0, 43], list,
+                                           self.provenance_capture)
+            artifact.save(fp)
+
+        root_dir = str(artifact.uuid)
+        expected = {
+            'VERSION',
+            'metadata.yaml',
+            'data/file1.txt',
+            'data/file2.txt',
+            'data/nested/file3.txt',
+            'data/nested/file4.txt',
+            'provenance/metadata.yaml',
+            'provenance/VERSION',
+            'provenance/action/action.yaml',
+        }
+        self.assertArchiveMembers(fp, root_dir, expected)
+
+        with zipfile.ZipFile(fp, mode='r') as zf:
+            version = zf.read(os.path.join(root_dir, 'VERSION'))
+            comment = zf.comment
+        self.assertRegex(str(version), '^.*archive: 2.*$')
+        self.assertTrue(comment.startswith(version))
+        self.assertIn(('uuid: %s' % root_dir).encode('utf-8'), comment)
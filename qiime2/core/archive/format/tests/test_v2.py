@@ -0,0 +1,68 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import unittest
+import tempfile
+import pathlib
+
+from qiime2.core.testing.type import IntSequence1
+from qiime2.core.testing.format import IntSequenceDirectoryFormat
+from qiime2.core.archive.archiver import _ZipArchive
+from qiime2.core.archive.format.v2 import ArchiveFormat
+from qiime2.core.archive.provenance import ImportProvenanceCapture
+
+
+class TestArchiveFormat(unittest.TestCase):
+    def setUp(self):
+        prefix = "qiime2-test-temp-"
+        self.temp_dir = tempfile.TemporaryDirectory(prefix=prefix)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_format(self, format):
+        path = pathlib.Path(self.temp_dir.name)
+        rec = _ZipArchive.setup(path, '2', '2017.2.0')
+        ArchiveFormat.write(rec, IntSequence1, format, lambda x: None,
+                            ImportProvenanceCapture())
+        return ArchiveFormat(rec)
+
+    def test_header(self):
+        fmt = self.make_format(IntSequenceDirectoryFormat)
+
+        header = fmt.header()
+
+        self.assertEqual(header,
+                         "QIIME 2\narchive: 2\nframework: 2017.2.0\n"
+                         "uuid: %s\ntype: IntSequence1\n"
+                         "format: IntSequenceDirectoryFormat\n" % fmt.uuid)
+        self.assertEqual(ArchiveFormat.parse_header(header),
+                         (str(fmt.uuid), 'IntSequence1',
+                          'IntSequenceDirectoryFormat'))
+
+    def test_header_no_format(self):
+        fmt = self.make_format(None)
+
+        header = fmt.header()
+
+        self.assertTrue(header.endswith("format: \n"))
+        self.assertEqual(ArchiveFormat.parse_header(header),
+                         (str(fmt.uuid), 'IntSequence1', None))
+
+    def test_parse_header_invalid(self):
+        with self.assertRaisesRegex(ValueError, 'Not a QIIME 2'):
+            ArchiveFormat.parse_header('foo\n')
+
+        with self.assertRaisesRegex(ValueError, 'Malformed.*bar'):
+            ArchiveFormat.parse_header('QIIME 2\narchive: 2\nbar\n')
+
+        with self.assertRaisesRegex(ValueError, 'must have fields'):
+            ArchiveFormat.parse_header('QIIME 2\narchive: 2\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,13 +9,12 @@
 import collections
 import uuid as _uuid
 
-import yaml
-
 import qiime2.sdk as sdk
+import qiime2.core.yaml_util as yaml_util
 
 # Allow OrderedDict to be serialized for YAML representation
-yaml.add_representer(collections.OrderedDict, lambda dumper, data:
-                     dumper.represent_dict(data.items()))
+yaml_util.add_representer(collections.OrderedDict, lambda dumper, data:
+                          dumper.represent_dict(data.items()))
 
 
 class ArchiveFormat:
@@ -24,7 +23,7 @@ class ArchiveFormat:
 
     @classmethod
     def _parse_metadata(self, fh, expected_uuid):
-        metadata = yaml.safe_load(fh)
+        metadata = yaml_util.load(fh)
         if metadata['uuid'] != str(expected_uuid):
             raise ValueError(
                 "Archive root directory must match UUID present in archive's"
@@ -41,7 +40,7 @@ class ArchiveFormat:
         if format is not None:
             metadata['format'] = format.__name__
 
-        fh.write(yaml.dump(metadata, default_flow_style=False))
+        fh.write(yaml_util.dump(metadata, default_flow_style=False))
 
     @classmethod
     def load_metadata(self, archive):
@@ -74,3 +73,7 @@ class ArchiveFormat:
 
         self.path = path
         self.data_dir = path / self.DATA_DIR
+
+    def header(self):
+        """Summary stored outside of the archive's members, if any."""
+        return None
@@ -12,6 +12,40 @@ import qiime2.core.archive.format.v0 as v0
 class ArchiveFormat(v0.ArchiveFormat):
     PROVENANCE_DIR = 'provenance'
 
+    # An optional summary of the archive which is written outside of its
+    # members (see version 2), starting with the contents of VERSION.
+    HEADER_TEMPLATE = (
+        "QIIME 2\n"
+        "archive: %s\n"
+        "framework: %s\n"
+        "uuid: %s\n"
+        "type: %s\n"
+        "format: %s\n")
+    HEADER_FIELDS = ('archive', 'framework', 'uuid', 'type', 'format')
+
+    @classmethod
+    def parse_header(cls, header):
+        """Parse a header into the same (uuid, type, format) as metadata."""
+        lines = header.split('\n')
+        if lines[0] != 'QIIME 2' or lines[-1] != '':
+            raise ValueError("Not a QIIME 2 archive header: %r" % header)
+
+        fields = {}
+        for line in lines[1:-1]:
+            key, sep, value = line.partition(': ')
+            if not sep:
+                # Only possible for an empty value, i.e. a missing format.
+                key, sep, value = line.partition(':')
+            if not sep or key not in cls.HEADER_FIELDS:
+                raise ValueError("Malformed archive header line: %r" % line)
+            fields[key] = value
+
+        if set(fields) != set(cls.HEADER_FIELDS):
+            raise ValueError("Archive header must have fields %r, not %r."
+                             % (cls.HEADER_FIELDS, tuple(fields)))
+
+        return fields['uuid'], fields['type'], fields['format'] or None
+
     @classmethod
     def write(cls, archive_record, type, format, data_initializer,
               provenance_capture):
@@ -29,3 +63,13 @@ class ArchiveFormat(v0.ArchiveFormat):
         super().__init__(archive_record)
 
         self.provenance_dir = archive_record.root / self.PROVENANCE_DIR
+        self.version = archive_record.version
+        self.framework_version = archive_record.framework_version
+
+    def make_header(self):
+        """The header of this archive, whether or not it is written."""
+        format = ''
+        if self.format is not None:
+            format = self.format.__name__
+        return self.HEADER_TEMPLATE % (self.version, self.framework_version,
+                                       self.uuid, repr(self.type), format)
@@ -0,0 +1,23 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import qiime2.core.archive.format.v1 as v1
+
+
+class ArchiveFormat(v1.ArchiveFormat):
+    """Version 1 which always has a header summarizing the archive.
+
+    The header is stored outside of the archive's members (the comment of a
+    ZIP file), where it can be read without locating or parsing any of them.
+    It is entirely redundant with VERSION and metadata.yaml, which remain the
+    source of truth when loading. Version 1 archives only have one when it is
+    asked for while saving (see `Archiver.save`).
+
+    """
+    def header(self):
+        return self.make_header()
@@ -0,0 +1,378 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import collections
+import concurrent.futures
+import json
+import os
+import pathlib
+import sqlite3
+
+import qiime2.core.yaml_util as yaml_util
+from .archiver import Archiver, _file_signature
+from .provenance import (ColorPrimitive, ForwardRef, MetadataPath,
+                         NoProvenance, ProvenanceCapture)
+
+LineageNode = collections.namedtuple(
+    'LineageNode', ['uuid', 'type', 'format', 'action_type', 'plugin',
+                    'action', 'execution', 'digest'])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    filepath TEXT PRIMARY KEY,
+    signature TEXT,
+    uuid TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    uuid TEXT PRIMARY KEY,
+    type TEXT,
+    format TEXT,
+    execution TEXT,
+    digest TEXT
+);
+CREATE TABLE IF NOT EXISTS actions (
+    execution TEXT PRIMARY KEY,
+    type TEXT,
+    plugin TEXT,
+    action TEXT,
+    started TEXT,
+    finished TEXT,
+    framework TEXT
+);
+CREATE TABLE IF NOT EXISTS edges (
+    parent TEXT NOT NULL,
+    child TEXT NOT NULL,
+    input TEXT NOT NULL,
+    PRIMARY KEY (parent, child, input)
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    execution TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (execution, name)
+);
+CREATE TABLE IF NOT EXISTS plugins (
+    execution TEXT NOT NULL,
+    name TEXT NOT NULL,
+    version TEXT,
+    PRIMARY KEY (execution, name)
+);
+CREATE INDEX IF NOT EXISTS archives_uuid ON archives (uuid);
+CREATE INDEX IF NOT EXISTS nodes_execution ON nodes (execution);
+CREATE INDEX IF NOT EXISTS edges_child ON edges (child);
+CREATE INDEX IF NOT EXISTS parameters_value ON parameters (name, value);
+CREATE INDEX IF NOT EXISTS plugins_name ON plugins (name, version);
+"""
+
+
+class LineageIndex:
+    """A SQLite database of the provenance of many archives.
+
+    Indexing an archive only reads the metadata and action.yaml of each node
+    in its provenance, nothing is extracted. Every node is stored once, no
+    matter how many archives it appears in, along with the action which
+    created it, its parameters, and the versions of the plugins involved.
+    Lineage questions (e.g. every descendant of an import) are then answered
+    with queries instead of loading archives.
+
+    Ancestors which an archive's provenance only summarizes are indexed by
+    their UUID and digest alone, until an archive with their full provenance
+    is indexed.
+
+    """
+    # The same as version 1 of the archive format (which imports the SDK).
+    PROVENANCE_DIR = 'provenance'
+    METADATA_FILE = 'metadata.yaml'
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.executescript(_SCHEMA)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, str(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def __contains__(self, uuid):
+        return self._query_one('SELECT 1 FROM nodes WHERE uuid = ?',
+                               str(uuid)) is not None
+
+    def __len__(self):
+        return self._query_one('SELECT COUNT(*) FROM nodes')[0]
+
+    def add(self, filepath):
+        """Index the archive at `filepath`, returning its UUID."""
+        self.add_all([filepath])
+        return self._query_one('SELECT uuid FROM archives WHERE filepath = ?',
+                               self._key(filepath))[0]
+
+    def add_all(self, filepaths, workers=None):
+        """Index many archives, reading them on `workers` threads.
+
+        Archives which were already indexed (and haven't changed since) are
+        skipped. Returns the number of archives which were read.
+
+        """
+        pending = []
+        for filepath in filepaths:
+            row = self._query_one(
+                'SELECT signature FROM archives WHERE filepath = ?',
+                self._key(filepath))
+            if row is None or row[0] is None or \
+                    row[0] != self._signature(filepath):
+                pending.append(filepath)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        with concurrent.futures.ThreadPoolExecutor(max(workers, 1)) as pool:
+            records = pool.map(self._read_archive, pending)
+            with self._db:
+                for record in records:
+                    self._insert(*record)
+        return len(pending)
+
+    def get(self, uuid):
+        """Return the LineageNode of `uuid`, or None."""
+        row = self._query_one(
+            'SELECT nodes.uuid, nodes.type, nodes.format, actions.type,'
+            ' actions.plugin, actions.action, nodes.execution, nodes.digest'
+            ' FROM nodes'
+            ' LEFT JOIN actions ON nodes.execution = actions.execution'
+            ' WHERE nodes.uuid = ?', str(uuid))
+        if row is None:
+            return None
+        return LineageNode(*row)
+
+    def filepaths(self, uuid):
+        """Return the indexed archives which are `uuid` (not an ancestor)."""
+        return [row[0] for row in self._db.execute(
+            'SELECT filepath FROM archives WHERE uuid = ? ORDER BY filepath',
+            (str(uuid),))]
+
+    def parents(self, uuid):
+        """Return a dict of each input (by name) of `uuid` to its UUID."""
+        return {name: parent for parent, name in self._db.execute(
+            'SELECT parent, input FROM edges WHERE child = ?', (str(uuid),))}
+
+    def ancestors(self, uuid):
+        """Return the set of UUIDs from which `uuid` descends."""
+        return self._walk(uuid, 'parent', 'child')
+
+    def descendants(self, uuid):
+        """Return the set of UUIDs which descend from `uuid`."""
+        return self._walk(uuid, 'child', 'parent')
+
+    def find(self, action=None, plugin=None, plugin_version=None,
+             **parameters):
+        """Return the set of UUIDs created by a matching action.
+
+        Every argument is optional, `parameters` are the values the action
+        was called with (e.g. ``find(action='split_ints', num=3)``). Metadata
+        parameters match on the filename they were recorded with.
+
+        """
+        clauses = []
+        args = []
+        if action is not None:
+            clauses.append('actions.action = ?')
+            args.append(action)
+        if plugin is not None:
+            clauses.append('actions.plugin = ?')
+            args.append(plugin)
+        if plugin_version is not None:
+            clauses.append('EXISTS (SELECT 1 FROM plugins WHERE'
+                           ' plugins.execution = nodes.execution AND'
+                           ' plugins.name = actions.plugin AND'
+                           ' plugins.version = ?)')
+            args.append(plugin_version)
+        for name, value in sorted(parameters.items()):
+            clauses.append('EXISTS (SELECT 1 FROM parameters WHERE'
+                           ' parameters.execution = nodes.execution AND'
+                           ' parameters.name = ? AND parameters.value = ?)')
+            args.extend([name, self._encode(value)])
+
+        query = ('SELECT nodes.uuid FROM nodes JOIN actions'
+                 ' ON nodes.execution = actions.execution')
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        return {row[0] for row in self._db.execute(query, args)}
+
+    def _walk(self, uuid, to, by):
+        query = ('WITH RECURSIVE lineage(uuid) AS ('
+                 ' SELECT {to} FROM edges WHERE {by} = ?'
+                 ' UNION SELECT edges.{to} FROM edges'
+                 ' JOIN lineage ON edges.{by} = lineage.uuid)'
+                 ' SELECT uuid FROM lineage').format(to=to, by=by)
+        return {row[0] for row in self._db.execute(query, (str(uuid),))}
+
+    def _query_one(self, query, *args):
+        return self._db.execute(query, args).fetchone()
+
+    @classmethod
+    def _key(cls, filepath):
+        # URLs and other byte sources are recorded as they were given.
+        if isinstance(filepath, str) and '://' in filepath:
+            return filepath
+        try:
+            return str(pathlib.Path(filepath).resolve())
+        except TypeError:
+            return str(filepath)
+
+    @classmethod
+    def _signature(cls, filepath):
+        # Only local archives can be recognized as unchanged.
+        try:
+            return repr(_file_signature(filepath))
+        except (OSError, TypeError):
+            return None
+
+    def _read_archive(self, filepath):
+        nodes = []
+        summary = {}
+        with Archiver.get_archive(filepath) as archive:
+            root = str(archive.uuid)
+            provenance = pathlib.PurePosixPath(self.PROVENANCE_DIR)
+            if self._exists(archive, provenance):
+                nodes.append(self._read_node(archive, provenance))
+                ancestors = provenance / ProvenanceCapture.ANCESTOR_DIR
+                for name in sorted(archive.relative_iterdir(
+                        pathlib.PurePosixPath(root) / ancestors)):
+                    if not name.startswith('.'):
+                        nodes.append(
+                            self._read_node(archive, ancestors / name))
+
+                summary_fp = provenance / ProvenanceCapture.SUMMARY_FILE
+                if self._exists(archive, summary_fp):
+                    with archive.open(str(summary_fp)) as fh:
+                        summary = yaml_util.load(fh)
+            else:
+                # Version 0 archives have no provenance.
+                nodes.append(self._read_node(archive,
+                                             pathlib.PurePosixPath('.')))
+        return (self._key(filepath), self._signature(filepath), root, nodes,
+                summary)
+
+    @classmethod
+    def _exists(cls, archive, relpath):
+        return archive.exists(pathlib.PurePosixPath(str(archive.uuid)) /
+                              relpath)
+
+    @classmethod
+    def _read_node(cls, archive, relpath):
+        # The digest is the same one a summary would record for the node.
+        with archive.open(str(relpath / cls.METADATA_FILE),
+                          mode='rb') as fh:
+            metadata = fh.read()
+
+        action_fp = (relpath / ProvenanceCapture.ACTION_DIR /
+                     ProvenanceCapture.ACTION_FILE)
+        if not cls._exists(archive, action_fp):
+            return (yaml_util.load(metadata), None,
+                    ProvenanceCapture.node_digest(metadata))
+        with archive.open(str(action_fp), mode='rb') as fh:
+            action = fh.read()
+        return (yaml_util.load(metadata), yaml_util.load(action),
+                ProvenanceCapture.node_digest(metadata, action))
+
+    def _insert(self, filepath, signature, root, nodes, summary):
+        db = self._db
+        db.execute('INSERT OR REPLACE INTO archives VALUES (?, ?, ?)',
+                   (filepath, signature, root))
+
+        # Summarized nodes never replace a node with its full provenance,
+        # which in turn replaces them.
+        for uuid, digest in summary.items():
+            db.execute('INSERT OR IGNORE INTO nodes (uuid, digest)'
+                       ' VALUES (?, ?)', (str(uuid), str(digest)))
+
+        for metadata, action_yaml, digest in nodes:
+            uuid = str(metadata['uuid'])
+            if action_yaml is None:
+                db.execute(
+                    'INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?)',
+                    (uuid, metadata['type'], metadata['format'], None,
+                     digest))
+                continue
+
+            execution = action_yaml['execution']
+            action = action_yaml['action']
+            environment = action_yaml.get('environment', {})
+            execution_uuid = str(execution['uuid'])
+            runtime = execution.get('runtime', {})
+
+            db.execute('INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?)',
+                       (uuid, metadata['type'], metadata['format'],
+                        execution_uuid, digest))
+
+            plugin = action.get('plugin')
+            if isinstance(plugin, ForwardRef):
+                plugin = plugin.reference.split(':')[-1]
+            db.execute(
+                'INSERT OR IGNORE INTO actions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (execution_uuid, action['type'], plugin, action.get('action'),
+                 self._timestamp(runtime.get('start')),
+                 self._timestamp(runtime.get('end')),
+                 environment.get('framework')))
+
+            for name, version in (environment.get('plugins') or {}).items():
+                db.execute('INSERT OR IGNORE INTO plugins VALUES (?, ?, ?)',
+                           (execution_uuid, name, str(version['version'])))
+
+            for name, value in self._items(action.get('parameters')):
+                db.execute(
+                    'INSERT OR IGNORE INTO parameters VALUES (?, ?, ?)',
+                    (execution_uuid, name, self._encode(value)))
+                if isinstance(value, MetadataPath):
+                    # Metadata from artifacts names them before the colon.
+                    parents, _, _ = value.path.rpartition(':')
+                    for parent in filter(None, parents.split(',')):
+                        db.execute(
+                            'INSERT OR IGNORE INTO edges VALUES (?, ?, ?)',
+                            (parent, uuid, name))
+
+            for name, parent in self._items(action.get('inputs')):
+                if isinstance(parent, NoProvenance):
+                    parent = parent.uuid
+                if parent is not None:
+                    db.execute('INSERT OR IGNORE INTO edges VALUES (?, ?, ?)',
+                               (str(parent), uuid, name))
+
+    @classmethod
+    def _items(cls, section):
+        # Inputs and parameters are a list of single item mappings.
+        for item in section or []:
+            yield from item.items()
+
+    @classmethod
+    def _timestamp(cls, value):
+        if value is None:
+            return None
+        return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+    @classmethod
+    def _encode(cls, value):
+        # Parameters are stored (and compared) as JSON, with the tagged types
+        # as their string.
+        def plain(value):
+            if isinstance(value, (MetadataPath, ColorPrimitive, ForwardRef,
+                                  NoProvenance)):
+                return str(value[0])
+            if isinstance(value, dict):
+                return {str(k): plain(v) for k, v in value.items()}
+            if isinstance(value, (list, tuple)):
+                return [plain(v) for v in value]
+            return value
+        return json.dumps(plain(value), sort_keys=True, default=str)
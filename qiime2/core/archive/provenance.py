@@ -8,21 +8,24 @@
 
 import time
 import collections
+import hashlib
 import pkg_resources
 import uuid
 import copy
 import importlib
+import os
 import shutil
 import sys
+import threading
 from datetime import datetime
 
 import distutils
-import yaml
 import tzlocal
 import dateutil.relativedelta as relativedelta
 
 import qiime2
 import qiime2.core.util as util
+import qiime2.core.yaml_util as yaml_util
 
 
 # Used to give PyYAML something to recognize for custom tags
@@ -40,55 +43,437 @@ class OrderedKeyValue(collections.OrderedDict):
 # Used for yaml that looks like:
 #   - key1: value1
 #   - key2: value2
-yaml.add_representer(OrderedKeyValue, lambda dumper, data:
-                     dumper.represent_list([
-                        {k: v} for k, v in data.items()]))
+yaml_util.add_representer(OrderedKeyValue, lambda dumper, data:
+                          dumper.represent_list([
+                             {k: v} for k, v in data.items()]))
 
 
 # Controlling the order of dictionaries (even if semantically irrelevant) is
 # important to making it look nice.
-yaml.add_representer(collections.OrderedDict, lambda dumper, data:
-                     dumper.represent_dict(data.items()))
+yaml_util.add_representer(collections.OrderedDict, lambda dumper, data:
+                          dumper.represent_dict(data.items()))
 
 
 # LiteralString uses the | character and has literal newlines
-yaml.add_representer(LiteralString, lambda dumper, data:
-                     dumper.represent_scalar('tag:yaml.org,2002:str',
-                                             data.string, style='|'))
+yaml_util.add_representer(LiteralString, lambda dumper, data:
+                          dumper.represent_scalar('tag:yaml.org,2002:str',
+                                                  data.string, style='|'))
 
 
 # Make our timestamps pretty (unquoted).
-yaml.add_representer(datetime, lambda dumper, data:
-                     dumper.represent_scalar('tag:yaml.org,2002:timestamp',
-                                             data.isoformat()))
+yaml_util.add_representer(datetime, lambda dumper, data:
+                          dumper.represent_scalar(
+                              'tag:yaml.org,2002:timestamp',
+                              data.isoformat()))
 
 
+# Scalars with these tags are always single quoted, as PyYAML's emitter has
+# always written them. libyaml would write them plain when it can.
+
 # Forward reference to something else in the document, namespaces are
 # delimited by colons (:).
-yaml.add_representer(ForwardRef, lambda dumper, data:
-                     dumper.represent_scalar('!ref', data.reference))
+yaml_util.add_representer(ForwardRef, lambda dumper, data:
+                          dumper.represent_scalar('!ref', data.reference,
+                                                  style="'"))
 
 
 # This tag represents an artifact without provenance, this is to support
 # archive format v0. Ideally this won't be seen in the wild in practice.
-yaml.add_representer(NoProvenance, lambda dumper, data:
-                     dumper.represent_scalar('!no-provenance', str(data.uuid)))
+yaml_util.add_representer(NoProvenance, lambda dumper, data:
+                          dumper.represent_scalar('!no-provenance',
+                                                  str(data.uuid), style="'"))
 
 
 # A reference to Metadata and MetadataCategory who's data can be found at the
 # relative path indicated as its value
-yaml.add_representer(MetadataPath, lambda dumper, data:
-                     dumper.represent_scalar('!metadata', data.path))
+yaml_util.add_representer(MetadataPath, lambda dumper, data:
+                          dumper.represent_scalar('!metadata', data.path,
+                                                  style="'"))
 
 # A color primitive.
-yaml.add_representer(ColorPrimitive, lambda dumper, data:
-                     dumper.represent_scalar('!color', data.hex))
+yaml_util.add_representer(ColorPrimitive, lambda dumper, data:
+                          dumper.represent_scalar('!color', data.hex,
+                                                  style="'"))
+
+
+# The tags above are read back as the same types.
+yaml_util.add_constructor('!ref', lambda loader, node:
+                          ForwardRef(loader.construct_scalar(node)))
+yaml_util.add_constructor('!no-provenance', lambda loader, node:
+                          NoProvenance(loader.construct_scalar(node)))
+yaml_util.add_constructor('!metadata', lambda loader, node:
+                          MetadataPath(loader.construct_scalar(node)))
+yaml_util.add_constructor('!color', lambda loader, node:
+                          ColorPrimitive(loader.construct_scalar(node)))
+
+
+class ProvenancePolicy:
+    """Decide how much of the ancestry of a result is kept in its provenance.
+
+    Parameters
+    ----------
+    mode : {'full', 'depth', 'summary'}, optional
+        'full' keeps the provenance of every ancestor. 'depth' only keeps the
+        ancestors within `depth` actions of the result. 'summary' does the
+        same, and also records the UUID and a SHA-256 digest of the provenance
+        of each ancestor just beyond `depth` (in summary.yaml), so that the
+        omitted history can still be matched against the full provenance.
+    depth : int, optional
+        Required by 'depth' and 'summary', 1 only keeps the inputs.
+
+    A policy is used for every action called while it is active (as a
+    context manager) in the same thread, or in a whole process with
+    `set_default`. Long chains
+    of actions have a constant amount of provenance per action with either
+    'depth' or 'summary'.
+
+    """
+    MODES = ('full', 'depth', 'summary')
+
+    _default = None
+    _local = threading.local()
+
+    @classmethod
+    def current(cls):
+        """Return the policy active in this thread, or the default."""
+        active = cls._active()
+        if active:
+            return active[-1]
+        if cls._default is not None:
+            return cls._default
+        return cls()
+
+    @classmethod
+    def set_default(cls, policy):
+        """Use `policy` when no other policy is active, None resets it."""
+        cls._default = policy
+
+    def __init__(self, mode='full', depth=None):
+        if mode not in self.MODES:
+            raise ValueError("Provenance mode must be one of %r, not %r."
+                             % (self.MODES, mode))
+        if mode == 'full':
+            if depth is not None:
+                raise ValueError("Full provenance does not have a depth.")
+        elif not isinstance(depth, int) or depth < 1:
+            raise ValueError("Provenance depth must be a positive integer,"
+                             " not %r." % (depth,))
+        self.mode = mode
+        self.depth = depth
+
+    def __repr__(self):
+        if self.depth is None:
+            return '%s(%r)' % (self.__class__.__name__, self.mode)
+        return '%s(%r, depth=%d)' % (self.__class__.__name__, self.mode,
+                                     self.depth)
+
+    def __enter__(self):
+        self._active().append(self)
+        return self
+
+    def __exit__(self, *args):
+        self._active().pop()
+
+    @classmethod
+    def _active(cls):
+        # Every thread has its own stack of active policies.
+        try:
+            return cls._local.active
+        except AttributeError:
+            cls._local.active = []
+            return cls._local.active
+
+
+class _AncestorNode:
+    # The provenance of a single result (without its own ancestors) in the
+    # `AncestorStore`. `parents` are the keys of the results it was created
+    # from. Its ancestry is either decided by the `policy` it was created
+    # with, or already known (`resolved`) when it was loaded from an archive.
+    # Otherwise it is only known as the ancestor of a loaded archive.
+    __slots__ = ('path', 'parents', 'policy', 'resolved')
+
+    def __init__(self, path, parents, policy=None, resolved=None):
+        self.path = path
+        self.parents = parents
+        self.policy = policy
+        self.resolved = resolved
+
+
+class AncestorStore:
+    """The provenance of every ancestor used in this process, stored once.
+
+    Each result's own provenance (its metadata.yaml, VERSION and action
+    directory) is copied into a temporary directory which only the framework
+    writes to, keyed by its UUID and SHA-256 digest (see
+    `ProvenanceCapture.node_digest`). A result created in this process only
+    refers to its key (in a hidden file of its provenance directory), and its
+    node refers to the keys of its inputs. Its ancestors are written out when
+    its provenance directory is needed in full, e.g. when it is saved.
+
+    So an action never copies the provenance of its inputs' ancestors, no
+    matter how long the chain which created them.
+
+    """
+    # The key of a result created in this process, hidden so that it is never
+    # written to an archive.
+    REFERENCE_FILE = '.reference'
+
+    def __init__(self):
+        self._path = None
+        self._nodes = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        return tuple(key) in self._nodes
+
+    def __len__(self):
+        return len(self._nodes)
+
+    @property
+    def path(self):
+        """The directory of the store, created when it is first used."""
+        with self._lock:
+            if self._path is None:
+                self._path = qiime2.core.path.ProvenancePath()
+            return self._path
+
+    def add(self, archiver):
+        """Store the provenance of the result in `archiver`, return its key.
+
+        The provenance of a loaded archive (and of each of its ancestors) is
+        only stored the first time it is used.
+
+        """
+        reference = archiver.sparse_provenance_dir / self.REFERENCE_FILE
+        if reference.exists():
+            key = self.read_reference(reference)
+            if key in self:
+                return key
+            # Created in another process, which wrote out its ancestors
+            # before handing it over (see `Archiver.__getstate__`).
+
+        path = archiver.provenance_dir
+        key = (str(archiver.uuid), self._digest(path))
+        with self._lock:
+            node = self._nodes.get(key)
+            if node is None or (node.policy is None and
+                                node.resolved is None):
+                self._add_archive(key, path)
+        return key
+
+    def put(self, path, parents, policy):
+        """Store the provenance in `path` of a result created by an action.
+
+        `parents` are the keys of its inputs, `policy` the ProvenancePolicy
+        which decides its ancestors. The key is written to `path` and
+        returned.
+
+        """
+        with (path / 'metadata.yaml').open() as fh:
+            uuid_ = str(yaml_util.load(fh)['uuid'])
+        key = (uuid_, self._digest(path))
+        with self._lock:
+            if key not in self._nodes:
+                self._nodes[key] = _AncestorNode(
+                    self._copy_node(key, path), tuple(parents), policy)
+        with (path / self.REFERENCE_FILE).open(mode='w') as fh:
+            fh.write('%s %s\n' % key)
+        return key
+
+    @classmethod
+    def read_reference(cls, path):
+        with path.open() as fh:
+            return tuple(fh.read().split())
+
+    def write(self, provenance_dir):
+        """Write the ancestors of the result in `provenance_dir`.
+
+        Only results created in this process have any to write, and only the
+        first time.
+
+        """
+        reference = provenance_dir / self.REFERENCE_FILE
+        ancestor_dir = provenance_dir / ProvenanceCapture.ANCESTOR_DIR
+        if not reference.exists() or ancestor_dir.exists():
+            return
+
+        with self._lock:
+            if ancestor_dir.exists():
+                return
+            ancestors, summary = self.resolve(self.read_reference(reference))
+
+            # Renamed once complete, so that a failure never leaves a partial
+            # set of ancestors behind.
+            temp = provenance_dir / ('.%s-%s' % (ancestor_dir.name,
+                                                 uuid.uuid4().hex))
+            temp.mkdir()
+            for ancestor, key in ancestors.items():
+                shutil.copytree(str(self._nodes[key].path),
+                                str(temp / ancestor))
+            if summary:
+                with (provenance_dir /
+                      ProvenanceCapture.SUMMARY_FILE).open(mode='w') as fh:
+                    fh.write(yaml_util.dump(
+                        summary, **ProvenanceCapture.YAML_SETTINGS))
+            temp.rename(ancestor_dir)
+
+    def resolve(self, key):
+        """Return the ancestors and the summary of the result `key`.
+
+        The ancestors are an OrderedDict of UUID to key, the summary an
+        OrderedDict of UUID to digest (see `ProvenancePolicy`).
+
+        """
+        with self._lock:
+            node = self._nodes[tuple(key)]
+            if node.resolved is not None:
+                return node.resolved
+
+            ancestors, summary = self._closure(node.parents)
+            if node.policy is None or node.policy.depth is None:
+                # Ancestors which were summarized in the provenance of an
+                # input are still summarized. The full ancestry of a long
+                # chain isn't kept around, it is only needed to be saved.
+                return ancestors, collections.OrderedDict(
+                    (ancestor, digest) for ancestor, digest in summary.items()
+                    if ancestor not in ancestors)
+
+            node.resolved = self._select(node, ancestors, summary)
+            return node.resolved
+
+    def _closure(self, parents):
+        # Every ancestor which the provenance of `parents` includes, and the
+        # ancestors they summarize.
+        ancestors = collections.OrderedDict()
+        summary = collections.OrderedDict()
+        pending = collections.deque(parents)
+        expanded = set()
+        while pending:
+            key = pending.popleft()
+            node = self._nodes.get(key)
+            if node is None:
+                continue
+            ancestors.setdefault(key[0], key)
+            if key in expanded:
+                continue
+            expanded.add(key)
+
+            if node.resolved is None and node.policy is not None and \
+                    node.policy.depth is None:
+                pending.extend(node.parents)
+            elif node.resolved is not None or node.policy is not None:
+                selected, summarized = self.resolve(key)
+                for ancestor, ancestor_key in selected.items():
+                    ancestors.setdefault(ancestor, ancestor_key)
+                for ancestor, digest in summarized.items():
+                    summary.setdefault(ancestor, digest)
+        return ancestors, summary
+
+    def _select(self, node, ancestors, summary):
+        # The ancestors within the depth of `node`'s policy, and the summary
+        # of those just beyond it.
+        summarize = node.policy.mode == 'summary'
+        selected = collections.OrderedDict()
+        summarized = collections.OrderedDict()
+        level = node.parents
+        for _ in range(node.policy.depth):
+            next_level = []
+            for ancestor, _ in level:
+                if ancestor in selected:
+                    continue
+                if ancestor not in ancestors:
+                    if summarize and ancestor in summary:
+                        summarized[ancestor] = summary[ancestor]
+                    continue
+                key = ancestors[ancestor]
+                selected[ancestor] = key
+                next_level.extend(self._nodes[key].parents)
+            level = next_level
+
+        if summarize:
+            for ancestor, _ in level:
+                if ancestor in selected or ancestor in summarized:
+                    continue
+                if ancestor in ancestors:
+                    digest = ancestors[ancestor][1]
+                else:
+                    digest = summary.get(ancestor)
+                if digest is not None:
+                    summarized[ancestor] = digest
+        return selected, summarized
+
+    def _add_archive(self, key, path):
+        # The provenance of a loaded archive already has its ancestors and
+        # summary, which are what its ancestry is when it is used.
+        nodes = collections.OrderedDict([(key[0], path)])
+        ancestor_dir = path / ProvenanceCapture.ANCESTOR_DIR
+        if ancestor_dir.exists():
+            for ancestor in sorted(os.listdir(str(ancestor_dir))):
+                if not ancestor.startswith('.'):
+                    nodes[ancestor] = ancestor_dir / ancestor
+
+        summary = collections.OrderedDict()
+        summary_fp = path / ProvenanceCapture.SUMMARY_FILE
+        if summary_fp.exists():
+            with summary_fp.open() as fh:
+                summary.update(yaml_util.load(fh))
+
+        digests = {key[0]: key[1]}
+        for ancestor, ancestor_path in nodes.items():
+            digests.setdefault(ancestor, self._digest(ancestor_path))
+
+        def key_of(ancestor):
+            return (ancestor, digests.get(ancestor, summary.get(ancestor)))
+
+        for ancestor, ancestor_path in nodes.items():
+            ancestor_key = key_of(ancestor)
+            if ancestor_key not in self._nodes:
+                parents = tuple(key_of(parent) for parent in
+                                ProvenanceCapture._read_parents(ancestor_path))
+                self._nodes[ancestor_key] = _AncestorNode(
+                    self._copy_node(ancestor_key, ancestor_path), parents)
+
+        self._nodes[key].resolved = (
+            collections.OrderedDict((ancestor, key_of(ancestor))
+                                    for ancestor in list(nodes)[1:]),
+            summary)
+
+    def _copy_node(self, key, path):
+        # Copies, so that nothing is shared with a directory which the user
+        # (or an ArtifactStore) owns.
+        target = self.path / ('%s-%s' % key)
+        shutil.copytree(str(path), str(target), ignore=shutil.ignore_patterns(
+            ProvenanceCapture.ANCESTOR_DIR, ProvenanceCapture.SUMMARY_FILE,
+            '.*'))
+        return target
+
+    @classmethod
+    def _digest(cls, path):
+        with (path / 'metadata.yaml').open(mode='rb') as fh:
+            metadata = fh.read()
+        action_fp = (path / ProvenanceCapture.ACTION_DIR /
+                     ProvenanceCapture.ACTION_FILE)
+        if not action_fp.exists():
+            return ProvenanceCapture.node_digest(metadata)
+        with action_fp.open(mode='rb') as fh:
+            return ProvenanceCapture.node_digest(metadata, fh.read())
 
 
 class ProvenanceCapture:
     ANCESTOR_DIR = 'artifacts'
     ACTION_DIR = 'action'
     ACTION_FILE = 'action.yaml'
+    SUMMARY_FILE = 'summary.yaml'
+    YAML_SETTINGS = dict(default_flow_style=False, indent=4)
+
+    ancestor_store = AncestorStore()
+
+    # Everything in the environment section except for the plugins is the
+    # same for every action in a process (until packages are installed or
+    # removed), so it is only computed and dumped once, see `_cached_env`.
+    _env_cache = None
+    _env_lock = threading.Lock()
+    _timezone = None
 
     def __init__(self):
         self.start = time.time()
@@ -101,6 +486,11 @@ class ProvenanceCapture:
         # us treat all transformations uniformly.
         self.transformers = collections.OrderedDict()
 
+        # The keys (in `ancestor_store`) of the ancestors which were added
+        # directly (i.e. inputs), by UUID.
+        self.parents = collections.OrderedDict()
+        self.policy = ProvenancePolicy.current()
+
         self._build_paths()
 
     def _destructor(self):
@@ -109,15 +499,12 @@ class ProvenanceCapture:
     def _build_paths(self):
         self.path = qiime2.core.path.ProvenancePath()
 
-        self.ancestor_dir = self.path / self.ANCESTOR_DIR
-        self.ancestor_dir.mkdir()
-
         self.action_dir = self.path / self.ACTION_DIR
         self.action_dir.mkdir()
 
     def add_ancestor(self, artifact):
-        other_path = artifact._archiver.provenance_dir
-        if other_path is None:
+        archiver = artifact._archiver
+        if archiver.sparse_provenance_dir is None:
             # The artifact doesn't have provenance (e.g. version 0)
             # it would be possible to invent a metadata.yaml, but we won't know
             # the framework version for the VERSION file. Even if we did
@@ -127,40 +514,113 @@ class ProvenanceCapture:
             # contain an artifact UUID that is not in the artifacts/ directory.
             return NotImplemented
 
-        destination = self.ancestor_dir / str(artifact.uuid)
-        if destination.exists():
+        ancestor = str(artifact.uuid)
+        if ancestor in self.parents:
             # This artifact is already in the provenance (and so are its
             # ancestors)
             return
-
-        # Handle root node of ancestor
-        shutil.copytree(
-            str(other_path), str(destination),
-            ignore=shutil.ignore_patterns(self.ANCESTOR_DIR + '*'))
-
-        # Handle ancestral nodes of ancestor
-        grandcestor_path = other_path / self.ANCESTOR_DIR
-        if grandcestor_path.exists():
-            for grandcestor in grandcestor_path.iterdir():
-                destination = self.ancestor_dir / grandcestor.name
-                if not destination.exists():
-                    shutil.copytree(str(grandcestor), str(destination))
+        # Only the ancestor's key is kept, its provenance (and that of its
+        # own ancestors) is in the store, see `AncestorStore`.
+        self.parents[ancestor] = self.ancestor_store.add(archiver)
+
+    @classmethod
+    def node_digest(cls, metadata, action=None):
+        """The digest of a node in a summary, from the bytes of its files.
+
+        That is its metadata.yaml and action.yaml (which an import from a
+        version 0 archive doesn't have).
+
+        """
+        sha256 = hashlib.sha256(metadata)
+        if action is not None:
+            sha256.update(action)
+        return sha256.hexdigest()
+
+    @classmethod
+    def _read_parents(cls, path):
+        # The UUIDs of the inputs (and metadata artifacts) of the action which
+        # created the ancestor in `path`.
+        action_fp = path / cls.ACTION_DIR / cls.ACTION_FILE
+        if not action_fp.exists():
+            return []
+        with action_fp.open() as fh:
+            action = yaml_util.load(fh)['action']
+
+        parents = []
+        for item in action.get('inputs') or []:
+            for value in item.values():
+                if isinstance(value, str):
+                    parents.append(value)
+        for item in action.get('parameters') or []:
+            for value in item.values():
+                if isinstance(value, MetadataPath):
+                    uuids = value.path.rpartition(':')[0]
+                    parents.extend(filter(None, uuids.split(',')))
+        return parents
 
     def reference_plugin(self, plugin):
         self.plugins[plugin.name] = plugin
         return ForwardRef('environment:plugins:' + plugin.name)
 
-    def capture_env(self):
+    @classmethod
+    def capture_env(cls):
         return collections.OrderedDict(
             (d.project_name, d.version) for d in pkg_resources.working_set)
 
+    @classmethod
+    def _working_set_key(cls):
+        # Much cheaper than capturing (and dumping) the environment, and
+        # changes whenever a distribution is added, removed or replaced by
+        # another version, or the path of the working set changes.
+        working_set = pkg_resources.working_set
+        return (id(working_set), tuple(working_set.entries),
+                tuple(sorted((key, dist.version)
+                             for key, dist in working_set.by_key.items())))
+
+    @classmethod
+    def _cached_env(cls):
+        """Return (head, tail, head YAML, tail YAML), the environment section
+        before and after the plugins.
+
+        """
+        key = cls._working_set_key()
+        with cls._env_lock:
+            cache = ProvenanceCapture._env_cache
+            if cache is None or cache[0] != key:
+                head = collections.OrderedDict()
+                head['platform'] = pkg_resources.get_build_platform()
+                # There is a trailing whitespace in sys.version, strip so that
+                # YAML can use literal formatting.
+                head['python'] = LiteralString('\n'.join(
+                    line.strip() for line in sys.version.split('\n')))
+                head['framework'] = qiime2.__version__
+                tail = collections.OrderedDict()
+                tail['python-packages'] = cls.capture_env()
+
+                cache = ProvenanceCapture._env_cache = (
+                    key, head, tail, cls._dump_env_items(head),
+                    cls._dump_env_items(tail))
+            return cache[1:]
+
+    @classmethod
+    def _dump_env_items(cls, items):
+        # Dumped inside of the environment section (so the indentation and
+        # line wrapping are the same as dumping it whole), without its first
+        # line. The pieces can be concatenated to make the section.
+        text = yaml_util.dump(
+            {'environment': collections.OrderedDict(items)},
+            **cls.YAML_SETTINGS)
+        return text.split('\n', 1)[1]
+
     def transformation_recorder(self, name):
         # TODO: this is currently stubbed, but not used.
         record = self.transformers[name] = []
         return record.append
 
     def _ts_to_date(self, ts):
-        return datetime.fromtimestamp(ts, tzlocal.get_localzone())
+        if ProvenanceCapture._timezone is None:
+            ProvenanceCapture._timezone = tzlocal.get_localzone()
+        return datetime.fromtimestamp(ts, ProvenanceCapture._timezone)
 
     def make_execution_section(self):
         execution = collections.OrderedDict()
@@ -174,29 +634,33 @@ class ProvenanceCapture:
         return execution
 
     def make_env_section(self):
-        env = collections.OrderedDict()
-        env['platform'] = pkg_resources.get_build_platform()
-        # There is a trailing whitespace in sys.version, strip so that YAML can
-        # use literal formatting.
-        env['python'] = LiteralString('\n'.join(line.strip() for line in
-                                      sys.version.split('\n')))
-        env['framework'] = qiime2.__version__
+        head, tail, _, _ = self._cached_env()
+        env = collections.OrderedDict(head)
         env['plugins'] = self.plugins
-        env['python-packages'] = self.capture_env()
+        for key, value in tail.items():
+            env[key] = value.copy()
 
         return env
 
+    def write_env_section(self, fh):
+        # Same as dumping `make_env_section`, but only the plugins need to be
+        # dumped each time.
+        _, _, head, tail = self._cached_env()
+        fh.write('environment:\n')
+        fh.write(head)
+        fh.write(self._dump_env_items([('plugins', self.plugins)]))
+        fh.write(tail)
+
     def write_action_yaml(self):
-        settings = dict(default_flow_style=False, indent=4)
+        settings = self.YAML_SETTINGS
         with (self.action_dir / self.ACTION_FILE).open(mode='w') as fh:
-            fh.write(yaml.dump({'execution': self.make_execution_section()},
-                               **settings))
+            fh.write(yaml_util.dump(
+                {'execution': self.make_execution_section()}, **settings))
             fh.write('\n')
-            fh.write(yaml.dump({'action': self.make_action_section()},
-                               **settings))
+            fh.write(yaml_util.dump(
+                {'action': self.make_action_section()}, **settings))
             fh.write('\n')
-            fh.write(yaml.dump({'environment': self.make_env_section()},
-                               **settings))
+            self.write_env_section(fh)
 
     def finalize(self, final_path, node_members):
         self.end = time.time()
@@ -205,6 +669,9 @@ class ProvenanceCapture:
             shutil.copy(str(member), str(self.path))
 
         self.write_action_yaml()
+        # The ancestors (and summary) are written when they are needed, see
+        # `AncestorStore.write`.
+        self.ancestor_store.put(self.path, self.parents.values(), self.policy)
 
         self.path.rename(final_path)
 
@@ -212,6 +679,7 @@ class ProvenanceCapture:
         forked = copy.copy(self)
         # Unique `result` key for each output of an action
         forked.transformers = forked.transformers.copy()
+        forked.parents = forked.parents.copy()
         # create a copy of the backing dir so factory (the hard stuff is
         # mostly done by this point)
         forked._build_paths()
@@ -293,6 +761,31 @@ class ActionProvenanceCapture(ProvenanceCapture):
             else:
                 self.inputs[name] = str(artifact.uuid)
 
+    def fingerprint(self):
+        """A digest of everything which determines the action's results.
+
+        That is the action and the versions of its plugin and the framework,
+        the UUIDs of the inputs, the parameters, and the contents of any
+        metadata (which is recorded by its filename).
+
+        """
+        identity = collections.OrderedDict([
+            ('framework', qiime2.__version__),
+            ('plugin', self._plugin.name),
+            ('version', self._plugin.version),
+            ('type', self.action_type),
+            ('action', self.action.id),
+            ('inputs', self.inputs),
+            ('parameters', self.parameters)])
+
+        sha256 = hashlib.sha256(yaml_util.dump(identity).encode('utf-8'))
+        for value in self.parameters.values():
+            if isinstance(value, MetadataPath):
+                relpath = value.path.rpartition(':')[2]
+                with (self.action_dir / relpath).open(mode='rb') as fh:
+                    sha256.update(fh.read())
+        return sha256.hexdigest()
+
     def make_action_section(self):
         action = collections.OrderedDict()
         action['type'] = self.action_type
@@ -0,0 +1,189 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import io
+import os
+import pathlib
+import re
+import urllib.request
+
+_URL = re.compile(r'\Ahttps?://', re.IGNORECASE)
+_CONTENT_RANGE = re.compile(r'\Abytes (\d+)-(\d+)/(\d+)\Z')
+
+
+def as_byte_source(filepath):
+    """Return `filepath` as a ByteSource.
+
+    HTTP(S) URLs are read with range requests, anything else that isn't
+    already a ByteSource is a local filepath.
+
+    """
+    if isinstance(filepath, ByteSource):
+        return filepath
+    if isinstance(filepath, str) and _URL.match(filepath):
+        return HTTPByteSource(filepath)
+    return FileByteSource(filepath)
+
+
+class ByteSource:
+    """Random access to the bytes of an archive, wherever they are stored.
+
+    Subclasses implement `size` and `read_range`. File objects returned by
+    `open` read through `read_range`, `BUFFER_SIZE` bytes at a time, so that
+    anything which can seek in a file (such as `zipfile`) only fetches the
+    parts of the archive it actually reads.
+
+    """
+    BUFFER_SIZE = io.DEFAULT_BUFFER_SIZE
+
+    @property
+    def size(self):
+        raise NotImplementedError
+
+    def read_range(self, offset, size):
+        """Read `size` bytes starting at `offset` (fewer at the end)."""
+        raise NotImplementedError
+
+    def read_tail(self, size):
+        """Read the last `size` bytes (or all of them when there are fewer)."""
+        offset = max(self.size - size, 0)
+        return self.read_range(offset, self.size - offset)
+
+    def exists(self):
+        try:
+            self.size
+        except OSError:
+            return False
+        return True
+
+    def open(self):
+        """Open a seekable, read-only binary file object."""
+        return io.BufferedReader(_ByteSourceReader(self), self.BUFFER_SIZE)
+
+
+class FileByteSource(ByteSource):
+    """The bytes of a local file."""
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, str(self.path))
+
+    def __str__(self):
+        return str(self.path)
+
+    @property
+    def size(self):
+        return os.path.getsize(str(self.path))
+
+    def read_range(self, offset, size):
+        with self.open() as fh:
+            fh.seek(offset)
+            return fh.read(size)
+
+    def exists(self):
+        return self.path.exists()
+
+    def open(self):
+        # The operating system does this better than `read_range` would.
+        return open(str(self.path), mode='rb')
+
+
+class HTTPByteSource(ByteSource):
+    """The bytes of a file served over HTTP(S), read with range requests.
+
+    The server must support `Range` headers, as object stores do. `headers`
+    are added to every request (e.g. for authorization).
+
+    """
+    # Every read is a round trip, so reads are much larger than for a file.
+    BUFFER_SIZE = 256 * 1024
+
+    def __init__(self, url, headers=None, timeout=60):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self._size = None
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.url)
+
+    def __str__(self):
+        return self.url
+
+    @property
+    def size(self):
+        if self._size is None:
+            with self._request(method='HEAD') as response:
+                length = response.headers.get('Content-Length')
+            if length is None:
+                raise OSError("%s did not report its size." % self.url)
+            self._size = int(length)
+        return self._size
+
+    def read_range(self, offset, size):
+        if size <= 0:
+            return b''
+        return self._read('%d-%d' % (offset, offset + size - 1))
+
+    def read_tail(self, size):
+        if self._size is not None:
+            return super().read_tail(size)
+        # A suffix range reports the size too, which saves a request.
+        return self._read('-%d' % size)
+
+    def _read(self, byte_range):
+        with self._request(byte_range) as response:
+            match = _CONTENT_RANGE.match(
+                response.headers.get('Content-Range', ''))
+            if response.status != 206 or match is None:
+                raise OSError("%s does not support range requests." % self.url)
+            self._size = int(match.group(3))
+            return response.read()
+
+    def _request(self, byte_range=None, method='GET'):
+        headers = dict(self.headers)
+        if byte_range is not None:
+            headers['Range'] = 'bytes=%s' % byte_range
+        request = urllib.request.Request(self.url, headers=headers,
+                                         method=method)
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+
+class _ByteSourceReader(io.RawIOBase):
+    def __init__(self, source):
+        super().__init__()
+        self._source = source
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._source.size
+        if offset < 0:
+            raise ValueError("Negative seek position %d" % offset)
+        self._position = offset
+        return offset
+
+    def readinto(self, b):
+        size = min(len(b), max(self._source.size - self._position, 0))
+        data = self._source.read_range(self._position, size)
+        b[:len(data)] = data
+        self._position += len(data)
+        return len(data)
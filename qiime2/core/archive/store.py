@@ -0,0 +1,181 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import hashlib
+import io
+import os
+import pathlib
+import shutil
+import uuid as _uuid
+
+from .archiver import Archiver, _DirectoryArchive, _ZipArchive
+
+
+class ArtifactStore:
+    """A directory which stores the files of many archives once each.
+
+    Every file of an added archive (data and provenance alike) is stored as an
+    object named by the SHA-256 of its contents, and a manifest lists the
+    objects which make up the archive. Files shared by several archives, such
+    as the provenance of common ancestors or data which was imported twice,
+    only take up space once.
+
+    Objects are read-only, so they are hardlinked (rather than copied) when an
+    archive is loaded from the store or saved as a directory archive.
+
+    The layout of the store is::
+
+        objects/<first 2 digits of the hash>/<remaining 62 digits>
+        manifests/<uuid>
+
+    where each line of a manifest is an object's hash and the path of the
+    file relative to the archive root.
+
+    """
+    OBJECTS_DIR = 'objects'
+    MANIFESTS_DIR = 'manifests'
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._objects = self.path / self.OBJECTS_DIR
+        self._manifests = self.path / self.MANIFESTS_DIR
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._manifests.mkdir(exist_ok=True)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, str(self.path))
+
+    def __contains__(self, uuid):
+        return (self._manifests / str(uuid)).is_file()
+
+    def __iter__(self):
+        """Yield the UUID (as a string) of every archive in the store."""
+        for name in sorted(os.listdir(str(self._manifests))):
+            # Manifests which are still being written are hidden.
+            if not name.startswith('.'):
+                yield name
+
+    def add(self, source):
+        """Add an archive (a filepath or an `Archiver`), returning its UUID.
+
+        Files already in the store are not stored again, adding an archive
+        which is already in the store changes nothing.
+
+        """
+        if not isinstance(source, Archiver):
+            source = Archiver.load(source)
+        root = source.root_dir
+
+        entries = []
+        for abspath, relpath in _ZipArchive._iter_source(root):
+            entries.append((self._add_object(abspath), relpath))
+
+        manifest = ''.join('%s %s\n' % entry for entry in sorted(
+            entries, key=lambda entry: entry[1]))
+        self._write_atomic(self._manifests / str(source.uuid),
+                           manifest.encode('utf-8'))
+        return source.uuid
+
+    def load(self, uuid):
+        """Load an archive from the store, returning an `Archiver`.
+
+        The archive's files are hardlinked into a temporary directory (which
+        is deleted along with the archiver), so nothing is copied.
+
+        """
+        path = Archiver._make_temp_path()
+        root = path / str(uuid)
+        for digest, relpath in self._read_manifest(uuid):
+            target = root / relpath
+            target.parent.mkdir(parents=True, exist_ok=True)
+            self._link(self._object_path(digest), target)
+
+        # The archive is used in place and keeps the temporary directory
+        # alive as the archiver's path.
+        return Archiver.load(_DirectoryArchive(path))
+
+    def save(self, uuid, destination, archive_type=None, **kwargs):
+        """Save an archive from the store to `destination`.
+
+        By default a ZIP file is written, other keyword arguments are the same
+        as `Archiver.save`.
+
+        """
+        self.load(uuid).save(destination, archive_type=archive_type, **kwargs)
+
+    def remove(self, uuid):
+        """Remove an archive, and every object no other archive refers to."""
+        digests = {digest for digest, _ in self._read_manifest(uuid)}
+        os.remove(str(self._manifests / str(uuid)))
+
+        for other in self:
+            digests.difference_update(
+                digest for digest, _ in self._read_manifest(other))
+        for digest in digests:
+            try:
+                os.remove(str(self._object_path(digest)))
+            except FileNotFoundError:
+                pass
+
+    def size(self):
+        """Total size in bytes of the objects in the store."""
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, files in os.walk(str(self._objects))
+                   for name in files if not name.startswith('.'))
+
+    def _read_manifest(self, uuid):
+        try:
+            with (self._manifests / str(uuid)).open(encoding='utf-8') as fh:
+                lines = fh.read().splitlines()
+        except FileNotFoundError:
+            raise ValueError("%s is not in the artifact store at %s."
+                             % (uuid, self.path))
+
+        entries = []
+        for line in lines:
+            digest, _, relpath = line.partition(' ')
+            parts = pathlib.PurePosixPath(relpath).parts
+            if not relpath or any(part in ('/', '.', '..') for part in parts):
+                raise ValueError("Manifest for %s has an invalid path: %r"
+                                 % (uuid, relpath))
+            entries.append((digest, pathlib.Path(*parts)))
+        return entries
+
+    def _object_path(self, digest):
+        return self._objects / digest[:2] / digest[2:]
+
+    def _add_object(self, filepath):
+        sha256 = hashlib.sha256()
+        with open(str(filepath), mode='rb') as fh:
+            for chunk in iter(lambda: fh.read(io.DEFAULT_BUFFER_SIZE), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+
+        path = self._object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            temp = path.parent / ('.%s-%s' % (path.name, _uuid.uuid4().hex))
+            shutil.copyfile(str(filepath), str(temp))
+            os.chmod(str(temp), 0o444)
+            # Another process may have stored the same object meanwhile, the
+            # contents are identical either way.
+            os.replace(str(temp), str(path))
+        return digest
+
+    def _write_atomic(self, path, data):
+        temp = path.parent / ('.%s-%s' % (path.name, _uuid.uuid4().hex))
+        with temp.open(mode='wb') as fh:
+            fh.write(data)
+        os.replace(str(temp), str(path))
+
+    @classmethod
+    def _link(cls, source, target):
+        try:
+            os.link(str(source), str(target))
+        except OSError:
+            shutil.copyfile(str(source), str(target))
@@ -6,21 +6,42 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import io
 import os
+import pickle
+import re
+import subprocess
+import sys
 import tempfile
+import textwrap
+import threading
 import unittest
 import uuid
 import zipfile
 import pathlib
+from unittest import mock
 
-from qiime2.core.archive import Archiver
+from qiime2.core.archive import Archiver, CompressionPolicy
 from qiime2.core.archive import ImportProvenanceCapture
 from qiime2.core.archive.archiver import _ZipArchive
+from qiime2.core.archive.compression import ZIP_ZSTANDARD, zstandard
+from qiime2.core.archive.format.util import artifact_version
 from qiime2.core.testing.format import IntSequenceDirectoryFormat
 from qiime2.core.testing.type import IntSequence1
 from qiime2.core.testing.util import ArchiveTestingMixin
 
 
+class NonSeekableBuffer(io.BytesIO):
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation('seek')
+
+    def tell(self):
+        raise io.UnsupportedOperation('tell')
+
+
 class TestArchiver(unittest.TestCase, ArchiveTestingMixin):
     def setUp(self):
         prefix = "qiime2-test-temp-"
@@ -112,6 +133,151 @@ class TestArchiver(unittest.TestCase, ArchiveTestingMixin):
 
         self.assertArchiveMembers(fp, root_dir, expected)
 
+    def test_save_compression_policy(self):
+        def data_initializer(data_dir):
+            with open(os.path.join(str(data_dir), 'ints.txt'), 'w') as fh:
+                fh.write('1\n2\n3\n' * 100)
+            with open(os.path.join(str(data_dir), 'ints.txt.gz'), 'w') as fh:
+                fh.write('1\n2\n3\n' * 100)
+
+        archiver = Archiver.from_data(
+            IntSequence1, IntSequenceDirectoryFormat,
+            data_initializer=data_initializer,
+            provenance_capture=ImportProvenanceCapture())
+        root_dir = str(archiver.uuid)
+
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        archiver.save(fp)
+        with zipfile.ZipFile(fp) as zf:
+            self.assertEqual(
+                zf.getinfo(root_dir + '/data/ints.txt').compress_type,
+                zipfile.ZIP_DEFLATED)
+            self.assertEqual(
+                zf.getinfo(root_dir + '/data/ints.txt.gz').compress_type,
+                zipfile.ZIP_STORED)
+
+        archiver.save(fp, compression=CompressionPolicy(level=0))
+        with zipfile.ZipFile(fp) as zf:
+            self.assertEqual({i.compress_type for i in zf.infolist()},
+                             {zipfile.ZIP_STORED})
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_save_and_load_zstd(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp, compression=CompressionPolicy(method='zstd'))
+
+        root_dir = str(self.archiver.uuid)
+        with zipfile.ZipFile(fp) as zf:
+            self.assertEqual(
+                zf.getinfo(root_dir + '/data/ints.txt').compress_type,
+                ZIP_ZSTANDARD)
+
+        self.assertEqual(Archiver.peek(fp)[0], root_dir)
+        for lazy in False, True:
+            archiver = Archiver.load(fp, lazy=lazy)
+            self.assertEqual(archiver.uuid, self.archiver.uuid)
+            self.assertEqual(archiver.type, IntSequence1)
+            with (archiver.data_dir / 'ints.txt').open() as fh:
+                self.assertEqual(fh.read(), '1\n2\n3\n')
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_load_zstd_bad_crc(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp, compression=CompressionPolicy(method='zstd'))
+
+        # Such a small file is stored as a raw block in the Zstandard frame,
+        # so changing the contents leaves a valid frame with the wrong CRC.
+        with zipfile.ZipFile(fp) as zf:
+            info = zf.getinfo('%s/data/ints.txt' % self.archiver.uuid)
+            self.assertEqual(info.compress_type, ZIP_ZSTANDARD)
+        with open(fp, 'r+b') as fh:
+            start = info.header_offset + 30 + len(info.filename)
+            fh.seek(start)
+            member = fh.read(len(info.extra) + info.compress_size)
+            fh.seek(start + member.index(b'1\n2\n3\n'))
+            fh.write(b'4')
+
+        with self.assertRaisesRegex(zipfile.BadZipFile,
+                                    'Bad CRC-32.*data/ints.txt'):
+            Archiver.load(fp)
+
+    def corrupt_member(self, fp, name):
+        with zipfile.ZipFile(fp) as zf:
+            info = zf.getinfo('%s/%s' % (self.archiver.uuid, name))
+        with open(fp, 'r+b') as fh:
+            fh.seek(info.header_offset + 30 + len(info.filename))
+            fh.write(b'X')
+
+    def test_verify(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        directory = os.path.join(self.temp_dir.name, 'archive')
+        self.archiver.save(fp)
+        self.archiver.save(directory, archive_type='directory')
+
+        Archiver.verify(fp, workers=1)
+        Archiver.verify(fp, workers=3)
+        Archiver.verify(directory)
+
+    def test_verify_corrupt_members(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp, compression=CompressionPolicy(level=0))
+        self.corrupt_member(fp, 'data/ints.txt')
+        self.corrupt_member(fp, 'provenance/VERSION')
+
+        for workers in 1, 3:
+            with self.assertRaisesRegex(
+                    ValueError, 'corrupt members: .*/data/ints.txt, '
+                                '.*/provenance/VERSION$'):
+                Archiver.verify(fp, workers=workers)
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_verify_corrupt_zstd_member(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp, compression=CompressionPolicy(method='zstd'))
+
+        # Breaking the frame's magic number makes the decompressor itself
+        # fail, rather than the CRC check.
+        with zipfile.ZipFile(fp) as zf:
+            info = zf.getinfo('%s/data/ints.txt' % self.archiver.uuid)
+            self.assertEqual(info.compress_type, ZIP_ZSTANDARD)
+        with open(fp, 'r+b') as fh:
+            fh.seek(info.header_offset + 28)
+            extra = int.from_bytes(fh.read(2), 'little')
+            fh.seek(info.header_offset + 30 + len(info.filename) + extra)
+            fh.write(b'X')
+
+        with self.assertRaises(zstandard.ZstdError):
+            Archiver.load(fp)
+        for workers in 1, 3:
+            with self.assertRaisesRegex(ValueError,
+                                        'corrupt members: .*/data/ints.txt$'):
+                Archiver.verify(fp, workers=workers)
+
+    def test_verify_futuristic_archive(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        with (self.archiver.path / str(self.archiver.uuid) /
+              'VERSION').open('w') as fh:
+            fh.write('QIIME 2\narchive: 9000\nframework: 9000.1\n')
+        self.archiver.save(fp)
+
+        with self.assertRaisesRegex(ValueError, "QIIME 9000.1.*'9000'"):
+            Archiver.verify(fp)
+
+    def test_verify_all(self):
+        good = os.path.join(self.temp_dir.name, 'good.zip')
+        bad = os.path.join(self.temp_dir.name, 'bad.zip')
+        missing = os.path.join(self.temp_dir.name, 'missing.zip')
+        self.archiver.save(good)
+        self.archiver.save(bad, compression=CompressionPolicy(level=0))
+        self.corrupt_member(bad, 'metadata.yaml')
+
+        results = Archiver.verify_all([good, bad, missing], workers=2)
+
+        self.assertEqual(list(results), [good, bad, missing])
+        self.assertIsNone(results[good])
+        self.assertIsInstance(results[bad], ValueError)
+        self.assertIsInstance(results[missing], ValueError)
+
     def test_load_archive(self):
         fp = os.path.join(self.temp_dir.name, 'archive.zip')
         self.archiver.save(fp)
@@ -125,6 +291,267 @@ class TestArchiver(unittest.TestCase, ArchiveTestingMixin):
                           for p in archiver.data_dir.iterdir()},
                          {'ints.txt'})
 
+    def make_v2_archiver(self):
+        def data_initializer(data_dir):
+            with open(os.path.join(str(data_dir), 'ints.txt'), 'w') as fh:
+                fh.write('1\n2\n3\n')
+
+        with artifact_version(2):
+            return Archiver.from_data(
+                IntSequence1, IntSequenceDirectoryFormat,
+                data_initializer=data_initializer,
+                provenance_capture=ImportProvenanceCapture())
+
+    def test_save_v1_without_header(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+
+        with zipfile.ZipFile(fp) as zf:
+            version = zf.read('%s/VERSION' % self.archiver.uuid)
+            self.assertEqual(zf.comment, b'')
+        self.assertIn(b'archive: 1\n', version)
+
+    def test_save_header_option(self):
+        archiver = self.make_v2_archiver()
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        archiver.save(fp, header=False)
+
+        with zipfile.ZipFile(fp) as zf:
+            self.assertEqual(zf.comment, b'')
+
+        with artifact_version(0):
+            v0 = Archiver.from_data(
+                IntSequence1, IntSequenceDirectoryFormat,
+                data_initializer=lambda data_dir: None,
+                provenance_capture=ImportProvenanceCapture())
+        with self.assertRaisesRegex(ValueError, "Version 0.*header"):
+            v0.save(fp, header=True)
+
+    def test_peek_reads_header(self):
+        archiver = self.make_v2_archiver()
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        archiver.save(fp)
+
+        # The archive is never opened as a ZIP file.
+        with mock.patch.object(_ZipArchive, '__init__',
+                               side_effect=AssertionError):
+            uuid, type, format = Archiver.peek(fp)
+
+        self.assertEqual(uuid, str(archiver.uuid))
+        self.assertEqual(type, 'IntSequence1')
+        self.assertEqual(format, 'IntSequenceDirectoryFormat')
+
+    def test_peek_header_of_another_archive(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        other_fp = os.path.join(self.temp_dir.name, 'other.zip')
+        self.make_v2_archiver().save(fp)
+        other = self.make_v2_archiver()
+        other.save(other_fp)
+        with zipfile.ZipFile(fp) as zf:
+            comment = zf.comment
+        with zipfile.ZipFile(other_fp, mode='a') as zf:
+            zf.comment = comment
+
+        self.assertEqual(Archiver.peek(other_fp),
+                         (str(other.uuid), 'IntSequence1',
+                          'IntSequenceDirectoryFormat'))
+
+    def test_peek_malformed_header(self):
+        archiver = self.make_v2_archiver()
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        archiver.save(fp)
+        with zipfile.ZipFile(fp, mode='a') as zf:
+            zf.comment = zf.comment.replace(
+                str(archiver.uuid).encode('utf-8'), b'not-a-uuid')
+
+        self.assertEqual(Archiver.peek(fp),
+                         (str(archiver.uuid), 'IntSequence1',
+                          'IntSequenceDirectoryFormat'))
+
+    def test_peek_without_header(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+        with zipfile.ZipFile(fp, mode='a') as zf:
+            zf.comment = b'something else entirely'
+
+        self.assertEqual(Archiver.peek(fp),
+                         (str(self.archiver.uuid), 'IntSequence1',
+                          'IntSequenceDirectoryFormat'))
+
+    def test_load_lazy(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+
+        archiver = Archiver.load(fp, lazy=True)
+        root = archiver.path / str(self.archiver.uuid)
+
+        self.assertEqual(archiver.uuid, self.archiver.uuid)
+        self.assertEqual(archiver.type, IntSequence1)
+        self.assertEqual(archiver.format, IntSequenceDirectoryFormat)
+        self.assertEqual({p.name for p in root.iterdir()},
+                         {'VERSION', 'metadata.yaml'})
+
+        self.assertEqual({str(p.relative_to(archiver.data_dir))
+                          for p in archiver.data_dir.iterdir()},
+                         {'ints.txt'})
+        self.assertFalse((root / 'provenance').exists())
+
+        self.assertTrue(archiver.provenance_dir.exists())
+        self.assertTrue((root / 'provenance' / 'action' /
+                         'action.yaml').exists())
+
+    def test_load_lazy_closes_archive(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+
+        with mock.patch.object(_ZipArchive, 'close', autospec=True,
+                               side_effect=_ZipArchive.close) as close:
+            archiver = Archiver.load(fp, lazy=True)
+            self.assertFalse(close.called)
+
+            del archiver
+            self.assertEqual(close.call_count, 1)
+
+    def test_load_lazy_caller_owns_archive(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+
+        with Archiver.get_archive(fp) as archive:
+            with mock.patch.object(_ZipArchive, 'close') as close:
+                archiver = Archiver.load(archive, lazy=True)
+                del archiver
+                self.assertFalse(close.called)
+
+    def test_lazy_mount_paths(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+
+        archiver = Archiver.load(fp, lazy=True)
+        data_dir = archiver.sparse_data_dir
+        ints = data_dir / 'ints.txt'
+
+        self.assertTrue(Archiver.is_dir(data_dir))
+        self.assertFalse(Archiver.is_file(data_dir))
+        self.assertTrue(Archiver.is_file(ints))
+        self.assertFalse(Archiver.is_file(data_dir / 'foo.txt'))
+        self.assertEqual(list(Archiver.iter_files(data_dir)), [ints])
+        with Archiver.open_path(ints) as fh:
+            self.assertEqual(fh.read(), b'1\n2\n3\n')
+        self.assertFalse(data_dir.exists())
+
+        # Streams which can't seek are extracted instead.
+        with Archiver.open_path(ints, seekable=True) as fh:
+            self.assertTrue(fh.seekable())
+            self.assertEqual(fh.read(), b'1\n2\n3\n')
+
+        Archiver.materialize_path(ints)
+        self.assertTrue(ints.exists())
+
+    def test_map_file_stored(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp, compression=CompressionPolicy(level=0))
+
+        archiver = Archiver.load(fp, lazy=True)
+        root = archiver.path / str(self.archiver.uuid)
+        view = Archiver.map_file(root / 'data' / 'ints.txt')
+
+        self.assertTrue(view.readonly)
+        self.assertEqual(bytes(view), b'1\n2\n3\n')
+        # Mapped from the archive, not extracted.
+        self.assertFalse((root / 'data').exists())
+
+    def test_map_file_compressed(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+
+        archiver = Archiver.load(fp, lazy=True)
+        root = archiver.path / str(self.archiver.uuid)
+        view = Archiver.map_file(root / 'data' / 'ints.txt')
+
+        self.assertEqual(bytes(view), b'1\n2\n3\n')
+        self.assertTrue((root / 'data' / 'ints.txt').exists())
+
+    def test_map_file_not_archived(self):
+        fp = os.path.join(self.temp_dir.name, 'ints.txt')
+        with open(fp, 'wb') as fh:
+            fh.write(b'42\n')
+
+        self.assertEqual(bytes(Archiver.map_file(fp)), b'42\n')
+
+    def test_archive_index(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        directory = os.path.join(self.temp_dir.name, 'archive')
+        self.archiver.save(fp)
+        self.archiver.save(directory, archive_type='directory')
+        root = str(self.archiver.uuid)
+
+        for path in fp, directory:
+            with Archiver.get_archive(path) as archive:
+                self.assertEqual(set(archive.relative_iterdir()), {root})
+                self.assertEqual(set(archive.relative_iterdir(root)),
+                                 {'VERSION', 'metadata.yaml', 'data',
+                                  'provenance'})
+                self.assertEqual(
+                    set(archive.relative_iterdir(root + '/provenance')),
+                    {'VERSION', 'metadata.yaml', 'action'})
+                self.assertEqual(
+                    list(archive.relative_iterdir(root + '/missing')), [])
+
+                self.assertTrue(archive.exists(root + '/data/ints.txt'))
+                self.assertTrue(archive.exists(root + '/data'))
+                self.assertFalse(archive.exists(root + '/data/foo.txt'))
+
+                self.assertEqual(archive.size(root + '/data/ints.txt'), 6)
+                self.assertEqual(archive.size(root + '/data'), 6)
+                self.assertGreater(archive.size(root),
+                                   archive.size(root + '/provenance'))
+                with self.assertRaises(FileNotFoundError):
+                    archive.size(root + '/data/foo.txt')
+
+    def test_archive_index_directory_members(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+        root = str(self.archiver.uuid)
+        with zipfile.ZipFile(fp, mode='a') as zf:
+            zf.writestr('%s/data/' % root, "")
+            zf.writestr('%s/data/empty/' % root, "")
+
+        with Archiver.get_archive(fp) as archive:
+            self.assertEqual(set(archive.relative_iterdir(root + '/data')),
+                             {'ints.txt', 'empty'})
+            self.assertEqual(archive.size(root + '/data'), 6)
+
+            # Empty directories are still extracted.
+            extracted = archive.extract(self.temp_dir.name)
+            self.assertTrue((extracted / 'data' / 'empty').is_dir())
+
+    def test_get_archive_reused(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+
+        with Archiver.get_archive(fp) as archive:
+            uuid, type, format = Archiver.peek(archive)
+            archiver = Archiver.load(archive)
+            # The caller's archive is not closed by the archiver.
+            self.assertEqual(Archiver.peek(archive), (uuid, type, format))
+
+        self.assertEqual(uuid, str(self.archiver.uuid))
+        self.assertEqual(archiver.uuid, self.archiver.uuid)
+        with self.assertRaises(ValueError):
+            archive.open('metadata.yaml')
+
+    def test_pickle_open_archive(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+
+        with _ZipArchive(pathlib.Path(fp)) as archive:
+            unpickled = pickle.loads(pickle.dumps(archive))
+
+        with unpickled:
+            self.assertEqual(unpickled.uuid, str(self.archiver.uuid))
+            with unpickled.open('VERSION') as fh:
+                self.assertTrue(fh.read().startswith('QIIME 2'))
+
     def test_load_ignores_root_dotfiles(self):
         fp = os.path.join(self.temp_dir.name, 'archive.zip')
         self.archiver.save(fp)
@@ -223,6 +650,344 @@ class TestArchiver(unittest.TestCase, ArchiveTestingMixin):
 
         self.assertArchiveMembers(fp, root_dir, expected)
 
+    def test_extract_workers(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+        root_dir = str(self.archiver.uuid)
+        expected = {
+            'VERSION',
+            'metadata.yaml',
+            'data/ints.txt',
+            'provenance/metadata.yaml',
+            'provenance/VERSION',
+            'provenance/action/action.yaml'
+        }
+
+        for workers in 1, 4:
+            output_dir = os.path.join(self.temp_dir.name, str(workers))
+            result = Archiver.extract(fp, output_dir, workers=workers)
+
+            self.assertEqual(result, os.path.join(output_dir, root_dir))
+            self.assertExtractedArchiveMembers(output_dir, root_dir,
+                                               expected)
+            with open(os.path.join(result, 'data', 'ints.txt')) as fh:
+                self.assertEqual(fh.read(), '1\n2\n3\n')
+
+    def test_extract_workers_read_central_directory_once(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+        read_contents = zipfile.ZipFile._RealGetContents
+
+        for min_size, threads in (0, 4), (_ZipArchive.PARALLEL_MIN_SIZE, 1):
+            output_dir = os.path.join(self.temp_dir.name, str(min_size))
+            with mock.patch.object(_ZipArchive, 'PARALLEL_MIN_SIZE',
+                                   min_size), \
+                    mock.patch.object(zipfile.ZipFile, '_RealGetContents',
+                                      autospec=True,
+                                      side_effect=read_contents) as parse, \
+                    mock.patch.object(_ZipArchive, '_run_handle_batch',
+                                      autospec=True,
+                                      side_effect=_ZipArchive.
+                                      _run_handle_batch) as handle:
+                result = Archiver.extract(fp, output_dir, workers=4)
+
+            self.assertEqual(parse.call_count, 1)
+            # Only extra threads open their own file object.
+            self.assertEqual(handle.call_count, 0 if threads == 1 else 4)
+            with open(os.path.join(result, 'data', 'ints.txt')) as fh:
+                self.assertEqual(fh.read(), '1\n2\n3\n')
+
+    def test_extract_stays_in_destination(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+        root_dir = str(self.archiver.uuid)
+        with zipfile.ZipFile(fp, mode='a') as zf:
+            zf.writestr('%s/../../escaped.txt' % root_dir, 'foo')
+
+        output_dir = os.path.join(self.temp_dir.name, 'output')
+        Archiver.extract(fp, output_dir)
+
+        self.assertFalse(
+            os.path.exists(os.path.join(self.temp_dir.name, 'escaped.txt')))
+        self.assertTrue(
+            os.path.exists(os.path.join(output_dir, root_dir, 'escaped.txt')))
+
+    def test_save_and_load_directory(self):
+        fp = os.path.join(self.temp_dir.name, 'archive')
+        self.archiver.save(fp, archive_type='directory')
+        root_dir = str(self.archiver.uuid)
+
+        self.assertExtractedArchiveMembers(fp, root_dir, {
+            'VERSION',
+            'metadata.yaml',
+            'data/ints.txt',
+            'provenance/metadata.yaml',
+            'provenance/VERSION',
+            'provenance/action/action.yaml'
+        })
+        # Files are linked rather than copied.
+        self.assertTrue(os.path.samefile(
+            os.path.join(fp, root_dir, 'data', 'ints.txt'),
+            str(self.archiver.data_dir / 'ints.txt')))
+
+        self.assertEqual(Archiver.peek(fp)[0], root_dir)
+        archiver = Archiver.load(fp)
+
+        # The directory is used in place and is not cleaned up.
+        self.assertEqual(archiver.path, pathlib.Path(fp))
+        self.assertEqual(archiver.uuid, self.archiver.uuid)
+        self.assertEqual(archiver.type, IntSequence1)
+        self.assertEqual(archiver.data_dir,
+                         pathlib.Path(fp) / root_dir / 'data')
+        archiver.orphan()
+        del archiver
+        self.assertTrue(os.path.exists(fp))
+
+        with self.assertRaisesRegex(FileExistsError, 'already exists'):
+            self.archiver.save(fp, archive_type='directory')
+
+    def test_save_invalid_archive_type(self):
+        fp = os.path.join(self.temp_dir.name, 'archive')
+        with self.assertRaisesRegex(ValueError, 'directory.*zip.*tar'):
+            self.archiver.save(fp, archive_type='tar')
+
+    def test_convert(self):
+        directory = os.path.join(self.temp_dir.name, 'archive')
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(directory, archive_type='directory')
+
+        Archiver.convert(directory, fp)
+
+        root_dir = str(self.archiver.uuid)
+        self.assertArchiveMembers(fp, root_dir, {
+            'VERSION',
+            'metadata.yaml',
+            'data/ints.txt',
+            'provenance/metadata.yaml',
+            'provenance/VERSION',
+            'provenance/action/action.yaml'
+        })
+
+        directory2 = os.path.join(self.temp_dir.name, 'archive2')
+        with mock.patch.object(_ZipArchive, 'close', autospec=True,
+                               side_effect=_ZipArchive.close) as close:
+            Archiver.convert(fp, directory2, archive_type='directory')
+            # The source ZIP file isn't left open.
+            self.assertEqual(close.call_count, 1)
+        self.assertEqual(Archiver.peek(directory2), Archiver.peek(fp))
+
+    def test_save_deterministic(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        fp2 = os.path.join(self.temp_dir.name, 'archive2.zip')
+        self.archiver.save(fp, deterministic=True)
+
+        # Loading extracts the members with new timestamps.
+        Archiver.load(fp).save(fp2, deterministic=True, workers=2)
+
+        with open(fp, 'rb') as fh, open(fp2, 'rb') as fh2:
+            self.assertEqual(fh.read(), fh2.read())
+
+    def test_save_async(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        future = self.archiver.save_async(fp,
+                                          compression=CompressionPolicy())
+        self.assertEqual(future.result(), fp)
+
+        self.assertEqual(Archiver.load(fp).uuid, self.archiver.uuid)
+
+    def test_save_async_keeps_archiver_alive(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        uuid = self.archiver.uuid
+        path = str(self.archiver.path)
+        started = threading.Event()
+        release = threading.Event()
+        save = Archiver.save
+
+        def blocking_save(archiver, *args, **kwargs):
+            started.set()
+            release.wait()
+            save(archiver, *args, **kwargs)
+
+        with mock.patch.object(Archiver, 'save', blocking_save):
+            future = self.archiver.save_async(fp)
+            started.wait()
+            del self.archiver
+            self.assertTrue(os.path.exists(path))
+            release.set()
+            future.result()
+
+        self.assertEqual(Archiver.load(fp).uuid, uuid)
+
+    def test_save_async_bounded(self):
+        release = threading.Event()
+
+        def blocking_save(archiver, filepath, **kwargs):
+            release.wait()
+            open(filepath, 'w').close()
+
+        fps = [os.path.join(self.temp_dir.name, str(i))
+               for i in range(Archiver.MAX_PENDING_SAVES + 1)]
+        with mock.patch.object(Archiver, 'save', blocking_save):
+            futures = [self.archiver.save_async(fp) for fp in fps[:-1]]
+            extra = []
+            thread = threading.Thread(
+                target=lambda: extra.append(self.archiver.save_async(fps[-1])))
+            thread.start()
+            thread.join(0.2)
+            # Every slot is taken, so the next save waits.
+            self.assertEqual(extra, [])
+
+            release.set()
+            thread.join()
+            self.assertEqual(extra[0].result(), fps[-1])
+            self.assertEqual([f.result() for f in futures], fps[:-1])
+
+    def test_save_async_reentrant(self):
+        save = Archiver.save
+
+        def nested_save(archiver, filepath, **kwargs):
+            outer = re.search(r'outer-(\d+)', filepath)
+            if outer is not None:
+                inner = archiver.save_async(fps[int(outer.group(1))])
+                # Already done, the slots are all held by the outer saves.
+                self.assertTrue(inner.done())
+                inner.result()
+            save(archiver, filepath, **kwargs)
+
+        fps = [os.path.join(self.temp_dir.name, '%d.zip' % i)
+               for i in range(Archiver.MAX_PENDING_SAVES)]
+        with mock.patch.object(Archiver, 'save', nested_save):
+            futures = [self.archiver.save_async(
+                os.path.join(self.temp_dir.name, 'outer-%d.zip' % i))
+                for i in range(len(fps))]
+            for future in futures:
+                future.result(timeout=10)
+
+        for fp in fps:
+            self.assertEqual(Archiver.load(fp).uuid, self.archiver.uuid)
+
+    def test_save_async_failure_leaves_nothing(self):
+        def failing_save(archiver, filepath, **kwargs):
+            with open(filepath, 'w') as fh:
+                fh.write('partial')
+            raise OSError('disk full')
+
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        with mock.patch.object(Archiver, 'save', failing_save):
+            future = self.archiver.save_async(fp)
+            with self.assertRaisesRegex(OSError, 'disk full'):
+                future.result()
+
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_save_async_completes_at_exit(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        # The save is slowed down so that the interpreter starts exiting (and
+        # removing temporary directories) while it is pending.
+        script = textwrap.dedent("""
+            import sys, time
+            import qiime2
+            from qiime2.core.archive.archiver import _ZipArchive
+            from qiime2.core.testing.type import IntSequence1
+
+            save = _ZipArchive.save.__func__
+
+            def slow_save(cls, *args, **kwargs):
+                time.sleep(0.5)
+                save(cls, *args, **kwargs)
+
+            _ZipArchive.save = classmethod(slow_save)
+            artifact = qiime2.Artifact.import_data(IntSequence1, [1, 2, 3])
+            artifact._archiver.save_async(sys.argv[1])
+            print(artifact.uuid)
+        """)
+        output = subprocess.check_output([sys.executable, '-c', script, fp])
+
+        archiver = Archiver.load(fp)
+        self.assertEqual(str(archiver.uuid), output.decode().strip())
+        with (archiver.data_dir / 'ints.txt').open() as fh:
+            self.assertEqual(fh.read(), '1\n2\n3\n')
+
+    def test_save_to_stream(self):
+        buffer = NonSeekableBuffer()
+        self.archiver.save(buffer)
+
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        with open(fp, 'wb') as fh:
+            fh.write(buffer.getvalue())
+        self.assertFalse(buffer.closed)
+
+        root_dir = str(self.archiver.uuid)
+        self.assertArchiveMembers(fp, root_dir, {
+            'VERSION',
+            'metadata.yaml',
+            'data/ints.txt',
+            'provenance/metadata.yaml',
+            'provenance/VERSION',
+            'provenance/action/action.yaml'
+        })
+
+        # A loaded archive is copied into the stream as-is.
+        buffer = NonSeekableBuffer()
+        Archiver.load(fp).save(buffer)
+        with open(fp, 'rb') as fh:
+            self.assertEqual(buffer.getvalue(), fh.read())
+
+    def test_save_directory_to_stream(self):
+        with self.assertRaisesRegex(TypeError, 'file object'):
+            self.archiver.save(io.BytesIO(), archive_type='directory')
+
+    def test_save_loaded_archive_copies_source(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        fp2 = os.path.join(self.temp_dir.name, 'archive2.zip')
+        self.archiver.save(fp, compression=CompressionPolicy(level=0))
+
+        archiver = Archiver.load(fp, lazy=True)
+        archiver.save(fp2)
+
+        # Members are stored just like the source, not recompressed.
+        with open(fp, 'rb') as fh, open(fp2, 'rb') as fh2:
+            self.assertEqual(fh.read(), fh2.read())
+        # Nothing had to be extracted.
+        root = archiver.path / str(self.archiver.uuid)
+        self.assertEqual({p.name for p in root.iterdir()},
+                         {'VERSION', 'metadata.yaml'})
+
+        # Saving over the source leaves it as it was.
+        archiver.save(fp)
+        with zipfile.ZipFile(fp) as zf:
+            self.assertIsNone(zf.testzip())
+
+    def test_save_loaded_archive_recompresses(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        fp2 = os.path.join(self.temp_dir.name, 'archive2.zip')
+        self.archiver.save(fp, compression=CompressionPolicy(level=0))
+
+        archiver = Archiver.load(fp)
+        archiver.save(fp2, compression=CompressionPolicy())
+
+        with zipfile.ZipFile(fp2) as zf:
+            info = zf.getinfo('%s/VERSION' % archiver.uuid)
+            self.assertEqual(info.compress_type, zipfile.ZIP_DEFLATED)
+
+    def test_save_loaded_archive_source_modified(self):
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        fp2 = os.path.join(self.temp_dir.name, 'archive2.zip')
+        self.archiver.save(fp)
+        archiver = Archiver.load(fp)
+
+        # Replaced by something else entirely since it was loaded.
+        other = Archiver.from_data(
+            IntSequence1, IntSequenceDirectoryFormat,
+            data_initializer=lambda dp: None,
+            provenance_capture=ImportProvenanceCapture())
+        os.remove(fp)
+        other.save(fp)
+
+        archiver.save(fp2)
+
+        self.assertEqual(Archiver.peek(fp2)[0], str(archiver.uuid))
+
     def test_load_empty_archive(self):
         fp = os.path.join(self.temp_dir.name, 'empty.zip')
 
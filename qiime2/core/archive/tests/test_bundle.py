@@ -0,0 +1,129 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from qiime2.core.archive import Archiver, ArtifactBundle
+from qiime2.core.archive.archiver import _ZipArchive
+from qiime2.core.testing.type import IntSequence1
+from qiime2.core.testing.util import get_dummy_plugin
+from qiime2.sdk import Artifact
+
+
+class TestArtifactBundle(unittest.TestCase):
+    def setUp(self):
+        prefix = "qiime2-test-temp-"
+        self.temp_dir = tempfile.TemporaryDirectory(prefix=prefix)
+        self.fp = os.path.join(self.temp_dir.name, 'bundle.zip')
+
+        split_ints = get_dummy_plugin().methods['split_ints']
+        self.artifact = Artifact.import_data(IntSequence1, [0, 42, 43, -1])
+        self.left, self.right = split_ints(self.artifact)
+        self.archivers = [self.left._archiver, self.right._archiver]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_root(self, archiver):
+        contents = {}
+        for root, _, files in os.walk(str(archiver.root_dir)):
+            for file in files:
+                if file.startswith('.'):
+                    # Not a member of the archive (e.g. `.reference`).
+                    continue
+                fp = os.path.join(root, file)
+                with open(fp, 'rb') as fh:
+                    contents[os.path.relpath(fp, str(archiver.root_dir))] = \
+                        fh.read()
+        return contents
+
+    def test_save_and_load(self):
+        ArtifactBundle.save(self.archivers, self.fp)
+
+        with ArtifactBundle(self.fp) as bundle:
+            self.assertEqual(len(bundle), 2)
+            self.assertEqual(list(bundle), sorted(str(a.uuid)
+                                                  for a in self.archivers))
+            for archiver in self.archivers:
+                self.assertIn(archiver.uuid, bundle)
+                loaded = bundle.load(archiver.uuid)
+                self.assertEqual(loaded.uuid, archiver.uuid)
+                self.assertEqual(self.read_root(loaded),
+                                 self.read_root(archiver))
+
+    def test_shared_provenance_stored_once(self):
+        ArtifactBundle.save(self.archivers, self.fp)
+
+        with zipfile.ZipFile(self.fp) as zf:
+            names = zf.namelist()
+        ancestor = 'provenance/%s/metadata.yaml' % self.artifact.uuid
+        self.assertEqual(names.count(ancestor), 1)
+        self.assertFalse(any('/artifacts/' in name for name in names
+                             if name.startswith('provenance/')))
+
+    def test_conflicting_provenance(self):
+        fp = (self.right._archiver.root_dir / 'provenance' / 'artifacts' /
+              str(self.artifact.uuid) / 'action' / 'action.yaml')
+        contents = fp.read_text()
+        # Replaced rather than edited, the file may be shared with `left`.
+        fp.unlink()
+        fp.write_text(contents.replace('import', 'imported'))
+
+        with self.assertRaisesRegex(ValueError, 'provenance of %s differs'
+                                    % self.artifact.uuid):
+            ArtifactBundle.save(self.archivers, self.fp)
+        self.assertFalse(os.path.exists(self.fp))
+
+    def test_load_reads_only_its_members(self):
+        ArtifactBundle.save(self.archivers, self.fp)
+
+        opened = []
+        read_member = _ZipArchive._read_member
+
+        def record(fh, info):
+            opened.append(info.filename)
+            return read_member(fh, info)
+
+        with ArtifactBundle(self.fp) as bundle, \
+                mock.patch.object(_ZipArchive, '_read_member', record):
+            bundle.load(self.left.uuid)
+
+        self.assertTrue(opened)
+        self.assertFalse(any(str(self.right.uuid) in name for name in opened))
+
+    def test_save_from_filepaths(self):
+        fps = []
+        for i, result in enumerate([self.left, self.right, self.left]):
+            fps.append(result.save(os.path.join(self.temp_dir.name, str(i))))
+        ArtifactBundle.save(fps, self.fp)
+
+        with ArtifactBundle(self.fp) as bundle:
+            self.assertEqual(len(bundle), 2)
+            self.assertEqual(Archiver.load(fps[1]).uuid,
+                             bundle.load(self.right.uuid).uuid)
+
+    def test_load_missing(self):
+        ArtifactBundle.save(self.archivers, self.fp)
+
+        with ArtifactBundle(self.fp) as bundle:
+            with self.assertRaisesRegex(ValueError, 'not in the bundle'):
+                bundle.load(self.artifact.uuid)
+
+    def test_not_a_bundle(self):
+        fp = self.artifact.save(os.path.join(self.temp_dir.name, 'artifact'))
+
+        with self.assertRaisesRegex(ValueError, 'not a correctly formatted'):
+            ArtifactBundle(fp)
+
+
+if __name__ == '__main__':
+    unittest.main()
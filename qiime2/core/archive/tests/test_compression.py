@@ -0,0 +1,88 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+
+from qiime2.core.archive.compression import (
+    CompressionPolicy, entropy, zstandard, ZIP_ZSTANDARD)
+
+
+class TestCompressionPolicy(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(
+            prefix='qiime2-test-temp-')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_file(self, name, content):
+        fp = os.path.join(self.temp_dir.name, name)
+        with open(fp, 'wb') as fh:
+            fh.write(content)
+        return fp
+
+    def test_default(self):
+        policy = CompressionPolicy()
+
+        self.assertTrue(policy.should_compress(
+            self.make_file('seqs.fastq', b'ACGT\n')))
+        self.assertFalse(policy.should_compress(
+            self.make_file('seqs.fastq.gz', b'ACGT\n')))
+        self.assertFalse(policy.should_compress(
+            self.make_file('plot.PNG', b'ACGT\n')))
+
+    def test_stored_extensions(self):
+        policy = CompressionPolicy(stored_extensions=['.fastq'])
+
+        self.assertFalse(policy.should_compress(
+            self.make_file('seqs.fastq', b'ACGT\n')))
+        self.assertTrue(policy.should_compress(
+            self.make_file('seqs.fastq.gz', b'ACGT\n')))
+
+    def test_level_zero(self):
+        policy = CompressionPolicy(level=0)
+
+        self.assertFalse(policy.should_compress(
+            self.make_file('seqs.fastq', b'ACGT\n')))
+
+    def test_invalid_level(self):
+        with self.assertRaisesRegex(ValueError, 'between 0 and 9'):
+            CompressionPolicy(level=10)
+
+    def test_invalid_method(self):
+        with self.assertRaisesRegex(ValueError, 'method.*brotli'):
+            CompressionPolicy(method='brotli')
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_zstd(self):
+        policy = CompressionPolicy(method='zstd')
+
+        self.assertEqual(policy.compress_type, ZIP_ZSTANDARD)
+        self.assertEqual(policy.level, 3)
+        with self.assertRaisesRegex(ValueError, 'between 0 and 22'):
+            CompressionPolicy(method='zstd', level=23)
+
+    def test_sample_entropy(self):
+        policy = CompressionPolicy(sample_entropy=True)
+
+        self.assertTrue(policy.should_compress(
+            self.make_file('seqs', b'ACGT\n' * 1000)))
+        self.assertFalse(policy.should_compress(
+            self.make_file('random', os.urandom(64 * 1024))))
+
+    def test_entropy(self):
+        self.assertEqual(entropy(b''), 0.0)
+        self.assertEqual(entropy(b'aaaa'), 0.0)
+        self.assertEqual(entropy(b'ab' * 10), 1.0)
+        self.assertEqual(entropy(bytes(range(256))), 8.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import qiime2
+from qiime2.core.archive import LineageIndex, ProvenancePolicy
+from qiime2.core.testing.type import IntSequence1
+from qiime2.core.testing.util import get_dummy_plugin
+from qiime2.plugins import dummy_plugin
+
+
+class TestLineageIndex(unittest.TestCase):
+    def setUp(self):
+        prefix = "qiime2-test-temp-"
+        self.temp_dir = tempfile.TemporaryDirectory(prefix=prefix)
+        self.index = LineageIndex(os.path.join(self.temp_dir.name, 'lineage'))
+
+        self.a = qiime2.Artifact.import_data(IntSequence1, [0, 42, 43, -1])
+        self.b, self.c = dummy_plugin.actions.split_ints(self.a)
+        md = qiime2.Metadata.from_artifact(
+            qiime2.Artifact.import_data('Mapping', {'a': 'foo'}))
+        self.md = md.artifacts[0]
+        self.d = dummy_plugin.actions.identity_with_metadata(self.b, md).out
+        self.e = dummy_plugin.actions.identity_with_metadata(
+            self.c, qiime2.Metadata(pd.DataFrame({'x': ['1']},
+                                                 index=['0']))).out
+
+        self.fps = []
+        for name in 'de':
+            fp = os.path.join(self.temp_dir.name, '%s.qza' % name)
+            getattr(self, name).save(fp)
+            self.fps.append(fp)
+
+    def tearDown(self):
+        self.index.close()
+        self.temp_dir.cleanup()
+
+    def uuids(self, *artifacts):
+        return {str(artifact.uuid) for artifact in artifacts}
+
+    def test_add(self):
+        self.assertEqual(self.index.add(self.fps[0]), str(self.d.uuid))
+
+        self.assertEqual(len(self.index), 4)
+        for artifact in self.a, self.b, self.md, self.d:
+            self.assertIn(artifact.uuid, self.index)
+        self.assertNotIn(self.e.uuid, self.index)
+        self.assertEqual(self.index.filepaths(self.d.uuid),
+                         [os.path.realpath(self.fps[0])])
+
+    def test_add_all_stores_shared_nodes_once(self):
+        self.assertEqual(self.index.add_all(self.fps, workers=2), 2)
+
+        self.assertEqual(len(self.index), 6)
+
+    def test_add_all_skips_unchanged(self):
+        self.index.add_all(self.fps)
+
+        with mock.patch.object(LineageIndex, '_read_archive') as read:
+            self.assertEqual(self.index.add_all(self.fps), 0)
+            self.assertFalse(read.called)
+
+        # Replaced with a different archive.
+        os.remove(self.fps[0])
+        self.a.save(self.fps[0])
+        self.assertEqual(self.index.add_all(self.fps), 1)
+        self.assertEqual(self.index.filepaths(self.a.uuid),
+                         [os.path.realpath(self.fps[0])])
+
+    def test_get(self):
+        self.index.add_all(self.fps)
+
+        node = self.index.get(self.b.uuid)
+        self.assertEqual(node.uuid, str(self.b.uuid))
+        self.assertEqual(node.type, 'IntSequence1')
+        self.assertEqual(node.action_type, 'method')
+        self.assertEqual(node.plugin, 'dummy-plugin')
+        self.assertEqual(node.action, 'split_ints')
+
+        self.assertEqual(self.index.get(self.a.uuid).action_type, 'import')
+        self.assertIsNone(self.index.get('not-a-uuid'))
+
+    def test_parents(self):
+        self.index.add_all(self.fps)
+
+        self.assertEqual(self.index.parents(self.d.uuid),
+                         {'ints': str(self.b.uuid),
+                          'metadata': str(self.md.uuid)})
+        self.assertEqual(self.index.parents(self.e.uuid),
+                         {'ints': str(self.c.uuid)})
+        self.assertEqual(self.index.parents(self.a.uuid), {})
+
+    def test_ancestors(self):
+        self.index.add_all(self.fps)
+
+        self.assertEqual(self.index.ancestors(self.d.uuid),
+                         self.uuids(self.a, self.b, self.md))
+        self.assertEqual(self.index.ancestors(self.a.uuid), set())
+
+    def test_descendants(self):
+        self.index.add_all(self.fps)
+
+        self.assertEqual(self.index.descendants(self.a.uuid),
+                         self.uuids(self.b, self.c, self.d, self.e))
+        self.assertEqual(self.index.descendants(self.md.uuid),
+                         self.uuids(self.d))
+        self.assertEqual(self.index.descendants(self.d.uuid), set())
+
+    def test_find(self):
+        self.index.add_all(self.fps)
+
+        self.assertEqual(self.index.find(action='split_ints'),
+                         self.uuids(self.b, self.c))
+        self.assertEqual(self.index.find(action='identity_with_metadata'),
+                         self.uuids(self.d, self.e))
+        self.assertEqual(
+            self.index.find(metadata='%s:metadata.tsv' % self.md.uuid),
+            self.uuids(self.d))
+        self.assertEqual(self.index.find(metadata='metadata.tsv'),
+                         self.uuids(self.e))
+        self.assertEqual(self.index.find(action='split_ints',
+                                         metadata='metadata.tsv'), set())
+
+    def test_find_by_plugin_version(self):
+        self.index.add_all(self.fps)
+        version = get_dummy_plugin().version
+
+        self.assertEqual(self.index.find(plugin='dummy-plugin',
+                                         plugin_version=version),
+                         self.uuids(self.b, self.c, self.d, self.e))
+        self.assertEqual(self.index.find(plugin_version='not-a-version'),
+                         set())
+
+    def test_persistent(self):
+        self.index.add_all(self.fps)
+        self.index.close()
+
+        self.index = LineageIndex(self.index.path)
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(self.index.add_all(self.fps), 0)
+
+    def test_directory_archive(self):
+        fp = os.path.join(self.temp_dir.name, 'dir-archive')
+        self.d._archiver.save(fp, archive_type='directory')
+
+        self.index.add(fp)
+
+        self.assertEqual(self.index.ancestors(self.d.uuid),
+                         self.uuids(self.a, self.b, self.md))
+
+    def test_summarized_ancestors(self):
+        with ProvenancePolicy('summary', depth=1):
+            f = dummy_plugin.actions.identity_with_metadata(
+                self.d, qiime2.Metadata(pd.DataFrame({'x': ['1']},
+                                                     index=['0']))).out
+        fp = os.path.join(self.temp_dir.name, 'f.qza')
+        f.save(fp)
+
+        self.index.add(fp)
+
+        # Only d is written in full, b and md (its inputs) are summarized, so
+        # their own lineage is unknown.
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.ancestors(f.uuid),
+                         self.uuids(self.b, self.md, self.d))
+        self.assertEqual(self.index.ancestors(self.b.uuid), set())
+        summarized = self.index.get(self.b.uuid)
+        self.assertIsNone(summarized.type)
+        self.assertIsNone(summarized.execution)
+        self.assertIsNotNone(summarized.digest)
+        self.assertNotIn(self.a.uuid, self.index)
+
+        # The full provenance replaces the summary, which had its digest.
+        self.index.add(self.fps[0])
+        node = self.index.get(self.b.uuid)
+        self.assertEqual(node.type, 'IntSequence1')
+        self.assertEqual(node.action, 'split_ints')
+        self.assertEqual(node.digest, summarized.digest)
+
+        # And is never replaced by a summary.
+        self.index.add_all([fp])
+        os.remove(fp)
+        f.save(fp)
+        self.assertEqual(self.index.add_all([fp]), 1)
+        self.assertEqual(self.index.get(self.b.uuid), node)
+
+
+if __name__ == '__main__':
+    unittest.main()
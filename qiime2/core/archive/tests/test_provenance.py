@@ -6,14 +6,30 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import hashlib
+import io
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
 import unittest
+import uuid
+import zipfile
+from unittest import mock
 
 import pandas as pd
 import pandas.util.testing as pdt
+import pkg_resources
+import yaml
 
 import qiime2
 from qiime2.plugins import dummy_plugin
+from qiime2.core.archive import (ActionProvenanceCapture,
+                                 ImportProvenanceCapture, ProvenancePolicy)
+from qiime2.core.archive.provenance import ProvenanceCapture
 from qiime2.core.testing.type import IntSequence1
+from qiime2.core.testing.util import get_dummy_plugin
 
 
 class TestProvenanceIntegration(unittest.TestCase):
@@ -143,6 +159,374 @@ class TestProvenanceIntegration(unittest.TestCase):
         self.assertTrue((p_dir / 'artifacts' / str(ints2.uuid) /
                          'action' / 'action.yaml').exists())
 
+    def test_chain_ancestors(self):
+        a = qiime2.Artifact.import_data(IntSequence1, [0, 42, 43, -1])
+        b, _ = dummy_plugin.actions.split_ints(a)
+        c, _ = dummy_plugin.actions.split_ints(b)
+
+        p_dir = c._archiver.provenance_dir
+        self.assertEqual(sorted(os.listdir(str(p_dir / 'artifacts'))),
+                         sorted([str(a.uuid), str(b.uuid)]))
+
+        # The root of an ancestor doesn't include its own ancestors.
+        b_dir = p_dir / 'artifacts' / str(b.uuid)
+        self.assertTrue((b_dir / 'action' / 'action.yaml').exists())
+        self.assertFalse((b_dir / 'artifacts').exists())
+
+    def test_ancestors_are_referenced(self):
+        a = qiime2.Artifact.import_data(IntSequence1, [0, 42, 43, -1])
+        b, _ = dummy_plugin.actions.split_ints(a)
+
+        # Nothing is written for the ancestors until they are needed.
+        sparse_dir = b._archiver.sparse_provenance_dir
+        self.assertFalse((sparse_dir / 'artifacts').exists())
+        self.assertTrue((sparse_dir / '.reference').exists())
+
+        p_dir = b._archiver.provenance_dir
+        a_fp = p_dir / 'artifacts' / str(a.uuid) / 'metadata.yaml'
+        with a_fp.open() as fh, \
+                (a._archiver.provenance_dir / 'metadata.yaml').open() as fh2:
+            self.assertEqual(fh.read(), fh2.read())
+        # Copied rather than shared with the input.
+        self.assertFalse(os.path.samefile(
+            str(a._archiver.provenance_dir / 'metadata.yaml'), str(a_fp)))
+
+    def test_ancestors_written_on_finalize(self):
+        a = qiime2.Artifact.import_data(IntSequence1, [0, 42, 43, -1])
+        split_ints = dummy_plugin.actions.split_ints
+        capture = ActionProvenanceCapture('method', split_ints.package,
+                                          split_ints.id)
+
+        capture.add_input('ints', a)
+        capture.add_input('ints', a)
+        forked = capture.fork()
+        self.assertEqual(list(forked.parents), [str(a.uuid)])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = pathlib.Path(temp_dir)
+            result = uuid.uuid4()
+            with (root / 'metadata.yaml').open(mode='w') as fh:
+                fh.write('uuid: %s\ntype: IntSequence1\nformat: null\n'
+                         % result)
+            with (root / 'VERSION').open(mode='w') as fh:
+                fh.write('QIIME 2\narchive: 1\nframework: 0\n')
+            p_dir = root / 'provenance'
+            p_dir.mkdir()
+
+            forked.finalize(p_dir, [root / 'metadata.yaml', root / 'VERSION'])
+
+            # Only the result's own provenance, and its key in the store.
+            self.assertEqual(self.tree(p_dir), {
+                '.reference', 'VERSION', 'metadata.yaml',
+                'action/action.yaml'})
+            store = ProvenanceCapture.ancestor_store
+            key = store.read_reference(p_dir / '.reference')
+            self.assertEqual(key[0], str(result))
+            self.assertIn(key, store)
+
+            store.write(p_dir)
+            ancestor = 'artifacts/%s/' % a.uuid
+            self.assertEqual(self.tree(p_dir), {
+                '.reference', 'VERSION', 'metadata.yaml',
+                'action/action.yaml', ancestor + 'VERSION',
+                ancestor + 'metadata.yaml', ancestor + 'action/action.yaml'})
+            # The ancestor's files are copies, not hardlinks to the input's
+            # (or the store's).
+            for relpath in self.tree(p_dir / 'artifacts'):
+                self.assertEqual(
+                    os.stat(str(p_dir / 'artifacts' / relpath)).st_nlink, 1)
+
+    def tree(self, path):
+        return {os.path.relpath(os.path.join(root, name), str(path))
+                for root, _, files in os.walk(str(path)) for name in files}
+
+
+class TestAncestorStore(unittest.TestCase):
+    def setUp(self):
+        df = pd.DataFrame({'a': ['1']}, index=['0'])
+        self.md = qiime2.Metadata(df)
+        self.store = ProvenanceCapture.ancestor_store
+        self.temp_dir = tempfile.TemporaryDirectory(
+            prefix='qiime2-test-temp-')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def ancestors(self, filepath):
+        with zipfile.ZipFile(filepath) as zf:
+            return {name.split('/')[3] for name in zf.namelist()
+                    if name.split('/')[1:3] == ['provenance', 'artifacts']}
+
+    def test_per_action_cost_is_flat(self):
+        chain = [qiime2.Artifact.import_data(IntSequence1, [1, 2, 3])]
+
+        costs = []
+        for _ in range(8):
+            before = len(self.store)
+            with mock.patch.object(shutil, 'copytree',
+                                   wraps=shutil.copytree) as copytree:
+                chain.append(dummy_plugin.actions.identity_with_metadata(
+                    chain[-1], self.md).out)
+            p_dir = chain[-1]._archiver.sparse_provenance_dir
+            files = sum(len(files) for _, _, files in os.walk(str(p_dir)))
+            costs.append((copytree.call_count, len(self.store) - before,
+                          files))
+
+        # The same amount of provenance is copied and written by every
+        # action, no matter how long the chain is.
+        self.assertEqual(costs, [costs[0]] * len(costs))
+        self.assertEqual(costs[0][1], 1)
+
+        # All of it is there when saved.
+        fp = os.path.join(self.temp_dir.name, 'last.qza')
+        chain[-1].save(fp)
+        self.assertEqual(self.ancestors(fp),
+                         {str(artifact.uuid) for artifact in chain[:-1]})
+
+    def test_loaded_ancestors_stored_once(self):
+        a = qiime2.Artifact.import_data(IntSequence1, [1, 2, 3])
+        b = dummy_plugin.actions.identity_with_metadata(a, self.md).out
+        fp = os.path.join(self.temp_dir.name, 'b')
+        b._archiver.save(fp, archive_type='directory')
+        loaded = qiime2.Artifact.load(fp)
+
+        before = len(self.store)
+        c = dummy_plugin.actions.identity_with_metadata(loaded, self.md).out
+        # b and a are already stored, only c is new.
+        self.assertEqual(len(self.store), before + 1)
+
+        # Nothing is shared with the exploded directory, which is the user's
+        # to modify.
+        user_fp = os.path.join(fp, str(b.uuid), 'provenance', 'artifacts',
+                               str(a.uuid), 'metadata.yaml')
+        with open(user_fp, 'a') as fh:
+            fh.write('modified: true\n')
+        saved = os.path.join(self.temp_dir.name, 'c.qza')
+        c.save(saved)
+        with zipfile.ZipFile(saved) as zf:
+            metadata = zf.read('%s/provenance/artifacts/%s/metadata.yaml'
+                               % (c.uuid, a.uuid))
+        self.assertNotIn(b'modified', metadata)
+        self.assertEqual(self.ancestors(saved), {str(a.uuid), str(b.uuid)})
+
+    def test_loaded_with_summary(self):
+        chain = [qiime2.Artifact.import_data(IntSequence1, [1, 2, 3])]
+        with ProvenancePolicy('summary', depth=1):
+            for _ in range(3):
+                chain.append(dummy_plugin.actions.identity_with_metadata(
+                    chain[-1], self.md).out)
+        fp = os.path.join(self.temp_dir.name, 'last.qza')
+        chain[-1].save(fp)
+
+        last = dummy_plugin.actions.identity_with_metadata(
+            qiime2.Artifact.load(fp), self.md).out
+
+        # The loaded archive's summary is kept, as is the rest of its
+        # (truncated) provenance.
+        saved = os.path.join(self.temp_dir.name, 'saved.qza')
+        last.save(saved)
+        self.assertEqual(self.ancestors(saved),
+                         {str(chain[-1].uuid), str(chain[-2].uuid)})
+        with zipfile.ZipFile(saved) as zf:
+            summary = yaml.safe_load(zf.read(
+                '%s/provenance/summary.yaml' % last.uuid))
+        self.assertEqual(list(summary), [str(chain[-3].uuid)])
+
+
+class TestEnvironmentSection(unittest.TestCase):
+    def setUp(self):
+        self.capture = ImportProvenanceCapture()
+        self.capture.reference_plugin(get_dummy_plugin())
+
+    def test_write_env_section(self):
+        fh = io.StringIO()
+        self.capture.write_env_section(fh)
+
+        self.assertEqual(fh.getvalue(), yaml.dump(
+            {'environment': self.capture.make_env_section()},
+            **ProvenanceCapture.YAML_SETTINGS))
+
+    def test_cached(self):
+        self.capture.make_env_section()
+
+        with mock.patch.object(ProvenanceCapture, 'capture_env') as capture:
+            ImportProvenanceCapture().write_env_section(io.StringIO())
+            self.assertFalse(capture.called)
+
+    def test_invalidated_by_working_set(self):
+        fh = io.StringIO()
+        self.capture.write_env_section(fh)
+
+        key = ProvenanceCapture._working_set_key() + ('new',)
+        with mock.patch.object(ProvenanceCapture, '_working_set_key',
+                               return_value=key), \
+                mock.patch.object(ProvenanceCapture, 'capture_env',
+                                  return_value={'foo': '1.0'}):
+            env = self.capture.make_env_section()
+            self.assertEqual(env['python-packages'], {'foo': '1.0'})
+
+        # Back to the original working set.
+        fh2 = io.StringIO()
+        self.capture.write_env_section(fh2)
+        self.assertEqual(fh.getvalue(), fh2.getvalue())
+
+    def test_working_set_key_changes_with_versions(self):
+        working_set = pkg_resources.WorkingSet([])
+        working_set.add(pkg_resources.Distribution(
+            project_name='foo', version='1.0'), entry='site-packages')
+
+        with mock.patch.object(pkg_resources, 'working_set', working_set):
+            key = ProvenanceCapture._working_set_key()
+            self.assertEqual(ProvenanceCapture._working_set_key(), key)
+
+            # Same number of distributions, on the same path.
+            working_set.add(pkg_resources.Distribution(
+                project_name='foo', version='2.0'), entry='site-packages',
+                replace=True)
+            self.assertNotEqual(ProvenanceCapture._working_set_key(), key)
+
+
+class TestProvenancePolicy(unittest.TestCase):
+    def setUp(self):
+        df = pd.DataFrame({'a': ['1']}, index=['0'])
+        self.md = qiime2.Metadata(df)
+        self.chain = [qiime2.Artifact.import_data(IntSequence1, [1, 2, 3])]
+
+    def extend_chain(self, length):
+        for _ in range(length):
+            self.chain.append(dummy_plugin.actions.identity_with_metadata(
+                self.chain[-1], self.md).out)
+        return self.chain[-1]
+
+    def ancestors(self, artifact):
+        return sorted(os.listdir(str(artifact._archiver.provenance_dir /
+                                     'artifacts')))
+
+    def summary(self, artifact):
+        fp = artifact._archiver.provenance_dir / 'summary.yaml'
+        if not fp.exists():
+            return None
+        with fp.open() as fh:
+            return yaml.safe_load(fh)
+
+    def uuids(self, artifacts):
+        return sorted(str(artifact.uuid) for artifact in artifacts)
+
+    def digest(self, artifact):
+        p_dir = artifact._archiver.provenance_dir
+        sha256 = hashlib.sha256()
+        for fp in p_dir / 'metadata.yaml', p_dir / 'action' / 'action.yaml':
+            with fp.open(mode='rb') as fh:
+                sha256.update(fh.read())
+        return sha256.hexdigest()
+
+    def test_full(self):
+        last = self.extend_chain(4)
+
+        self.assertEqual(self.ancestors(last), self.uuids(self.chain[:-1]))
+        self.assertIsNone(self.summary(last))
+
+    def test_depth(self):
+        with ProvenancePolicy('depth', depth=2):
+            last = self.extend_chain(4)
+
+        self.assertEqual(self.ancestors(last), self.uuids(self.chain[-3:-1]))
+        self.assertIsNone(self.summary(last))
+
+    def test_summary(self):
+        with ProvenancePolicy('summary', depth=2):
+            last = self.extend_chain(4)
+
+        self.assertEqual(self.ancestors(last), self.uuids(self.chain[-3:-1]))
+        beyond = self.chain[-4]
+        self.assertEqual(self.summary(last),
+                         {str(beyond.uuid): self.digest(beyond)})
+
+    def test_constant_per_action(self):
+        with ProvenancePolicy('summary', depth=1):
+            self.extend_chain(6)
+
+        for artifact in self.chain[2:]:
+            self.assertEqual(len(self.ancestors(artifact)), 1)
+            self.assertEqual(len(self.summary(artifact)), 1)
+
+    def test_metadata_artifacts_are_parents(self):
+        md_artifact = qiime2.Artifact.import_data('Mapping', {'a': 'foo'})
+        self.md = qiime2.Metadata.from_artifact(md_artifact)
+        with ProvenancePolicy('summary', depth=1):
+            last = self.extend_chain(2)
+
+        self.assertEqual(self.ancestors(last),
+                         self.uuids([md_artifact, self.chain[1]]))
+        self.assertEqual(list(self.summary(last)), [str(self.chain[0].uuid)])
+
+    def test_full_keeps_inherited_summary(self):
+        with ProvenancePolicy('summary', depth=1):
+            self.extend_chain(2)
+        last = self.extend_chain(1)
+
+        self.assertEqual(self.ancestors(last), self.uuids(self.chain[1:3]))
+        self.assertEqual(self.summary(last),
+                         {str(self.chain[0].uuid): self.digest(self.chain[0])})
+
+    def test_current(self):
+        self.assertEqual(ProvenancePolicy.current().mode, 'full')
+
+        default = ProvenancePolicy('depth', depth=3)
+        ProvenancePolicy.set_default(default)
+        try:
+            self.assertIs(ProvenancePolicy.current(), default)
+            with ProvenancePolicy('summary', depth=1) as policy:
+                self.assertIs(ProvenancePolicy.current(), policy)
+            self.assertIs(ProvenancePolicy.current(), default)
+        finally:
+            ProvenancePolicy.set_default(None)
+
+    def test_current_is_per_thread(self):
+        seen = []
+        entered = threading.Event()
+        release = threading.Event()
+
+        def other_thread():
+            seen.append(ProvenancePolicy.current())
+            with ProvenancePolicy('depth', depth=2) as policy:
+                seen.append(policy)
+                entered.set()
+                release.wait()
+
+        with ProvenancePolicy('summary', depth=1) as policy:
+            thread = threading.Thread(target=other_thread)
+            thread.start()
+            entered.wait()
+            # Neither thread sees the other's policy.
+            self.assertIs(ProvenancePolicy.current(), policy)
+            release.set()
+            thread.join()
+            self.assertIs(ProvenancePolicy.current(), policy)
+
+        self.assertEqual(seen[0].mode, 'full')
+        self.assertEqual(seen[1].mode, 'depth')
+        self.assertEqual(ProvenancePolicy.current().mode, 'full')
+
+    def test_set_default(self):
+        ProvenancePolicy.set_default(ProvenancePolicy('depth', depth=1))
+        try:
+            last = self.extend_chain(3)
+        finally:
+            ProvenancePolicy.set_default(None)
+
+        self.assertEqual(self.ancestors(last), self.uuids(self.chain[-2:-1]))
+
+    def test_invalid(self):
+        with self.assertRaisesRegex(ValueError, 'one of'):
+            ProvenancePolicy('shallow')
+        with self.assertRaisesRegex(ValueError, 'positive integer'):
+            ProvenancePolicy('depth')
+        with self.assertRaisesRegex(ValueError, 'positive integer'):
+            ProvenancePolicy('summary', depth=0)
+        with self.assertRaisesRegex(ValueError, 'depth'):
+            ProvenancePolicy('full', depth=2)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,255 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import http.server
+import io
+import os
+import re
+import socketserver
+import tempfile
+import threading
+import unittest
+import zipfile
+
+from qiime2.core.archive import (Archiver, ByteSource, FileByteSource,
+                                 HTTPByteSource, ImportProvenanceCapture)
+from qiime2.core.archive.archiver import _ZipArchive
+from qiime2.core.archive.format.util import artifact_version
+from qiime2.core.archive.source import as_byte_source
+from qiime2.core.testing.format import IntSequenceDirectoryFormat
+from qiime2.core.testing.type import IntSequence1
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    # Serves `server.files` (URL path -> bytes) and honours Range headers, as
+    # an object store would.
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+
+        match = re.match(r'bytes=(\d*)-(\d*)\Z', self.headers.get('Range', ''))
+        start, end, status = 0, len(data), 200
+        if match is not None and self.server.ranges:
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                if last:
+                    end = min(int(last) + 1, len(data))
+            else:
+                start = max(len(data) - int(last), 0)
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(end - start))
+        if status == 206:
+            self.send_header('Content-Range', 'bytes %d-%d/%d'
+                             % (start, end - 1, len(data)))
+        self.end_headers()
+        if body:
+            self.server.fetched.append(end - start)
+            self.server.requested.append((start, end))
+            self.wfile.write(data[start:end])
+
+    def log_message(self, *args):
+        pass
+
+
+class RangeServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, ranges=True):
+        super().__init__(('127.0.0.1', 0), RangeRequestHandler)
+        self.ranges = ranges
+        self.files = {}
+        # The size and the (start, end) of every response body.
+        self.fetched = []
+        self.requested = []
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.server_address[1], path)
+
+
+class TestByteSource(unittest.TestCase):
+    def setUp(self):
+        prefix = "qiime2-test-temp-"
+        self.temp_dir = tempfile.TemporaryDirectory(prefix=prefix)
+        self.data = bytes(range(256)) * 100
+
+        self.server = RangeServer()
+        self.server.files['/data.bin'] = self.data
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.temp_dir.cleanup()
+
+    def check_source(self, source):
+        self.assertEqual(source.size, len(self.data))
+        self.assertEqual(source.read_range(1000, 10), self.data[1000:1010])
+        self.assertEqual(source.read_range(len(self.data) - 5, 10),
+                         self.data[-5:])
+        self.assertEqual(source.read_tail(300), self.data[-300:])
+
+        with source.open() as fh:
+            fh.seek(-100, os.SEEK_END)
+            self.assertEqual(fh.read(), self.data[-100:])
+            fh.seek(5)
+            self.assertEqual(fh.read(5), self.data[5:10])
+
+    def test_file(self):
+        fp = os.path.join(self.temp_dir.name, 'data.bin')
+        with open(fp, 'wb') as fh:
+            fh.write(self.data)
+
+        self.check_source(FileByteSource(fp))
+
+    def test_http(self):
+        self.check_source(HTTPByteSource(self.server.url('/data.bin')))
+
+    def test_http_reads_only_ranges(self):
+        source = HTTPByteSource(self.server.url('/data.bin'))
+
+        self.assertEqual(source.read_tail(10), self.data[-10:])
+
+        # The size is known from that response, nothing else was requested.
+        self.assertEqual(source.size, len(self.data))
+        self.assertEqual(self.server.fetched, [10])
+
+    def test_http_without_range_support(self):
+        self.server.ranges = False
+        source = HTTPByteSource(self.server.url('/data.bin'))
+
+        with self.assertRaisesRegex(OSError, 'range requests'):
+            source.read_range(0, 10)
+
+    def test_http_missing(self):
+        source = HTTPByteSource(self.server.url('/missing.bin'))
+
+        self.assertFalse(source.exists())
+
+    def test_as_byte_source(self):
+        url = self.server.url('/data.bin')
+        source = FileByteSource('foo')
+
+        self.assertIs(as_byte_source(source), source)
+        self.assertIsInstance(as_byte_source(url), HTTPByteSource)
+        self.assertIsInstance(as_byte_source('foo'), FileByteSource)
+        self.assertIsInstance(as_byte_source('foo'), ByteSource)
+
+
+class TestRemoteArchive(unittest.TestCase):
+    def setUp(self):
+        prefix = "qiime2-test-temp-"
+        self.temp_dir = tempfile.TemporaryDirectory(prefix=prefix)
+
+        # Large enough that reading all of it would be obvious.
+        self.payload = os.urandom(2 * 1024 * 1024)
+
+        def data_initializer(data_dir):
+            with open(os.path.join(str(data_dir), 'ints.txt'), 'w') as fh:
+                fh.write('1\n2\n3\n')
+            with open(os.path.join(str(data_dir), 'payload.bin'), 'wb') as fh:
+                fh.write(self.payload)
+
+        # Version 2 has a header, so that peeking only reads the end.
+        with artifact_version(2):
+            self.archiver = Archiver.from_data(
+                IntSequence1, IntSequenceDirectoryFormat,
+                data_initializer=data_initializer,
+                provenance_capture=ImportProvenanceCapture())
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        self.archiver.save(fp)
+        with open(fp, 'rb') as fh:
+            self.data = fh.read()
+
+        self.server = RangeServer()
+        self.server.files['/archive.qza'] = self.data
+        self.url = self.server.url('/archive.qza')
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.temp_dir.cleanup()
+
+    def test_peek(self):
+        uuid, type_, fmt = Archiver.peek(self.url)
+
+        self.assertEqual(uuid, str(self.archiver.uuid))
+        self.assertEqual(type_, 'IntSequence1')
+        self.assertEqual(self.server.fetched, [_ZipArchive.HEADER_TAIL_SIZE])
+
+    def fetched_from(self, name):
+        # How many bytes of a member's data were requested from the server.
+        with zipfile.ZipFile(io.BytesIO(self.data)) as zf:
+            info = zf.getinfo('%s/%s' % (self.archiver.uuid, name))
+        start = info.header_offset
+        end = start + 30 + len(info.filename) + len(info.extra) + \
+            info.compress_size
+        return sum(max(min(end, last) - max(start, first), 0)
+                   for first, last in self.server.requested)
+
+    def test_load_lazy(self):
+        archiver = Archiver.load(self.url, lazy=True)
+
+        self.assertEqual(archiver.uuid, self.archiver.uuid)
+        self.assertLess(self.fetched_from('data/payload.bin'),
+                        len(self.payload) / 4)
+
+        data_dir = archiver.sparse_data_dir
+        with Archiver.open_path(data_dir / 'ints.txt') as fh:
+            self.assertEqual(fh.read(), b'1\n2\n3\n')
+        # Reading another member doesn't fetch the payload.
+        self.assertLess(self.fetched_from('data/payload.bin'),
+                        len(self.payload) / 4)
+        self.assertFalse(data_dir.exists())
+
+        with Archiver.open_path(data_dir / 'payload.bin') as fh:
+            self.assertEqual(fh.read(), self.payload)
+        self.assertGreaterEqual(self.fetched_from('data/payload.bin'),
+                                len(self.payload))
+
+    def test_load(self):
+        archiver = Archiver.load(self.url, workers=2)
+
+        self.assertEqual(archiver.uuid, self.archiver.uuid)
+        with open(str(archiver.data_dir / 'ints.txt')) as fh:
+            self.assertEqual(fh.read(), '1\n2\n3\n')
+
+    def test_verify(self):
+        Archiver.verify(self.url)
+
+        # The middle of the file is the payload.
+        middle = len(self.data) // 2
+        self.server.files['/archive.qza'] = (
+            self.data[:middle] + bytes([self.data[middle] ^ 0xff]) +
+            self.data[middle + 1:])
+        with self.assertRaisesRegex(ValueError, 'payload.bin'):
+            Archiver.verify(self.url)
+
+    def test_load_missing(self):
+        with self.assertRaisesRegex(ValueError, 'does not exist'):
+            Archiver.load(self.server.url('/missing.qza'))
+
+
+if __name__ == '__main__':
+    unittest.main()
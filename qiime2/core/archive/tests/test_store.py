@@ -0,0 +1,128 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+
+from qiime2.core.archive import Archiver, ArtifactStore
+from qiime2.core.archive import ImportProvenanceCapture
+from qiime2.core.testing.format import IntSequenceDirectoryFormat
+from qiime2.core.testing.type import IntSequence1
+from qiime2.core.testing.util import ArchiveTestingMixin
+
+
+class TestArtifactStore(unittest.TestCase, ArchiveTestingMixin):
+    def setUp(self):
+        prefix = "qiime2-test-temp-"
+        self.temp_dir = tempfile.TemporaryDirectory(prefix=prefix)
+        self.store = ArtifactStore(os.path.join(self.temp_dir.name, 'store'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_archiver(self, contents):
+        def data_initializer(data_dir):
+            with open(os.path.join(str(data_dir), 'ints.txt'), 'w') as fh:
+                fh.write(contents)
+
+        return Archiver.from_data(
+            IntSequence1, IntSequenceDirectoryFormat,
+            data_initializer=data_initializer,
+            provenance_capture=ImportProvenanceCapture())
+
+    def count_objects(self):
+        return sum(len(files) for _, _, files in
+                   os.walk(os.path.join(self.temp_dir.name, 'store',
+                                        'objects')))
+
+    def test_add_and_load(self):
+        archiver = self.make_archiver('1\n2\n3\n')
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        archiver.save(fp)
+
+        uuid = self.store.add(fp)
+
+        self.assertEqual(uuid, archiver.uuid)
+        self.assertIn(uuid, self.store)
+        self.assertIn(str(uuid), self.store)
+        self.assertEqual(list(self.store), [str(uuid)])
+
+        loaded = self.store.load(uuid)
+        self.assertEqual(loaded.uuid, archiver.uuid)
+        self.assertEqual(loaded.type, IntSequence1)
+        self.assertEqual(loaded.format, IntSequenceDirectoryFormat)
+        with (loaded.data_dir / 'ints.txt').open() as fh:
+            self.assertEqual(fh.read(), '1\n2\n3\n')
+
+        # The temporary directory belongs to the archiver.
+        path = str(loaded.path)
+        del loaded
+        self.assertFalse(os.path.exists(path))
+
+    def test_deduplicates(self):
+        first = self.make_archiver('1\n2\n3\n')
+        self.store.add(first)
+        count = self.count_objects()
+
+        # Same data, different uuid (and therefore different metadata and
+        # provenance).
+        second = self.make_archiver('1\n2\n3\n')
+        self.store.add(second)
+        self.assertLess(self.count_objects(), count * 2)
+
+        # Adding again stores nothing new.
+        after = self.count_objects()
+        self.store.add(second)
+        self.assertEqual(self.count_objects(), after)
+
+    def test_save(self):
+        archiver = self.make_archiver('1\n2\n3\n')
+        self.store.add(archiver)
+        fp = os.path.join(self.temp_dir.name, 'archive.zip')
+        directory = os.path.join(self.temp_dir.name, 'archive')
+
+        self.store.save(archiver.uuid, fp)
+        self.store.save(archiver.uuid, directory, archive_type='directory')
+
+        expected = {
+            'VERSION',
+            'metadata.yaml',
+            'data/ints.txt',
+            'provenance/metadata.yaml',
+            'provenance/VERSION',
+            'provenance/action/action.yaml'
+        }
+        self.assertArchiveMembers(fp, str(archiver.uuid), expected)
+        self.assertExtractedArchiveMembers(directory, str(archiver.uuid),
+                                           expected)
+        self.assertEqual(Archiver.peek(fp), Archiver.peek(directory))
+
+    def test_remove(self):
+        first = self.make_archiver('1\n2\n3\n')
+        second = self.make_archiver('1\n2\n3\n')
+        self.store.add(first)
+        only_first = self.count_objects()
+        self.store.add(second)
+
+        self.store.remove(second.uuid)
+
+        self.assertNotIn(second.uuid, self.store)
+        self.assertEqual(self.count_objects(), only_first)
+        # Shared objects are still there.
+        loaded = self.store.load(first.uuid)
+        with (loaded.data_dir / 'ints.txt').open() as fh:
+            self.assertEqual(fh.read(), '1\n2\n3\n')
+
+    def test_missing(self):
+        with self.assertRaisesRegex(ValueError, 'not in the artifact store'):
+            self.store.load('foo')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import io
+import os
+import random
+import tempfile
+import unittest
+import zipfile
+
+from qiime2.core.archive.compression import CompressionPolicy
+from qiime2.core.archive.zipwriter import ZipWriter
+
+
+class TestZipWriter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(
+            prefix='qiime2-test-temp-')
+
+        rand = random.Random(42)
+        self.contents = {
+            'empty.txt': b'',
+            'small.txt': b'ACGT\n' * 10,
+            # Larger than several chunks, and only somewhat compressible.
+            'large.bin': bytes(rand.choice(b'ACGT') for _ in range(300000)),
+            'nested/dir/file.txt': 'ünïcödé\n'.encode('utf-8'),
+            'nested/ünïcödé.txt': b'foo\n'
+        }
+        self.members = []
+        for i, (arcname, content) in enumerate(sorted(self.contents.items())):
+            # Member names don't need to match the source filepath, which
+            # keeps the filesystem's encoding out of the picture.
+            fp = os.path.join(self.temp_dir.name, str(i))
+            with open(fp, 'wb') as fh:
+                fh.write(content)
+            self.members.append((fp, arcname))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, **kwargs):
+        buffer = io.BytesIO()
+        with ZipWriter(buffer, chunk_size=64 * 1024, **kwargs) as writer:
+            writer.write_files(self.members)
+        return buffer.getvalue()
+
+    def test_readable_by_zipfile(self):
+        data = self.write(workers=4)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), [m[1] for m in self.members])
+            for arcname, content in self.contents.items():
+                self.assertEqual(zf.read(arcname), content)
+                self.assertEqual(zf.getinfo(arcname).compress_type,
+                                 zipfile.ZIP_DEFLATED)
+
+    def test_independent_of_workers(self):
+        self.assertEqual(self.write(workers=1), self.write(workers=3))
+
+    def test_compresses(self):
+        data = self.write(workers=2)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            info = zf.getinfo('large.bin')
+            self.assertLess(info.compress_size, info.file_size / 2)
+
+    def test_stored(self):
+        buffer = io.BytesIO()
+        with ZipWriter(buffer, workers=2) as writer:
+            writer.write_files(self.members,
+                               compression=CompressionPolicy(level=0))
+
+        with zipfile.ZipFile(buffer) as zf:
+            self.assertIsNone(zf.testzip())
+            info = zf.getinfo('large.bin')
+            self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(info.compress_size, info.file_size)
+            self.assertEqual(zf.read('large.bin'), self.contents['large.bin'])
+
+    def test_deterministic(self):
+        first = self.write(workers=1, deterministic=True)
+
+        # Neither timestamps nor permissions matter.
+        for fp, _ in self.members:
+            os.utime(fp, (0, 1234567890))
+            os.chmod(fp, 0o600)
+        second = self.write(workers=3, deterministic=True)
+
+        self.assertEqual(first, second)
+        with zipfile.ZipFile(io.BytesIO(first)) as zf:
+            self.assertIsNone(zf.testzip())
+            for info in zf.infolist():
+                self.assertEqual(info.date_time, (1980, 1, 1, 0, 0, 0))
+                self.assertEqual(info.external_attr >> 16, 0o100644)
+
+    def test_empty_archive(self):
+        buffer = io.BytesIO()
+        with ZipWriter(buffer):
+            pass
+
+        with zipfile.ZipFile(buffer) as zf:
+            self.assertEqual(zf.namelist(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
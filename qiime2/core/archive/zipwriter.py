@@ -0,0 +1,341 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import collections
+import concurrent.futures
+import os
+import struct
+import time
+import zipfile
+import zlib
+
+from .compression import CompressionPolicy, ZIP_ZSTANDARD, zstandard
+
+# The ZIP format requires raw DEFLATE streams (no zlib header or trailer).
+_WBITS = -zlib.MAX_WBITS
+# DEFLATE can only refer back 32KiB, so this is all of the previous chunk that
+# is useful as a dictionary for the next one.
+_DICT_SIZE = 32 * 1024
+
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_LOCAL_HEADER_SIG = 0x04034b50
+_DATA_DESCRIPTOR = struct.Struct('<IIII')
+_DATA_DESCRIPTOR64 = struct.Struct('<IIQQ')
+_DATA_DESCRIPTOR_SIG = 0x08074b50
+_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_CENTRAL_HEADER_SIG = 0x02014b50
+_END_RECORD = struct.Struct('<IHHHHIIH')
+_END_RECORD_SIG = 0x06054b50
+_END_RECORD64 = struct.Struct('<IQHHIIQQQQ')
+_END_RECORD64_SIG = 0x06064b50
+_END_LOCATOR64 = struct.Struct('<IIQI')
+_END_LOCATOR64_SIG = 0x07064b50
+_ZIP64_EXTRA_ID = 0x0001
+
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+_VERSION_DEFAULT = 20
+_VERSION_ZIP64 = 45
+_VERSION_ZSTANDARD = 63
+# Upper byte is the host system (3 is UNIX), same as the `zipfile` module.
+_VERSION_MADE_BY = (3 << 8) | _VERSION_ZSTANDARD
+_MAX_UINT16 = 0xFFFF
+_MAX_UINT32 = 0xFFFFFFFF
+
+ZipEntry = collections.namedtuple(
+    'ZipEntry', ['arcname', 'version', 'flags', 'compress_type', 'dos_time',
+                 'dos_date', 'crc', 'compress_size', 'file_size',
+                 'external_attr', 'header_offset'])
+
+
+def _dos_datetime(timestamp):
+    year, month, day, hour, minute, second = time.localtime(timestamp)[:6]
+    # The DOS epoch is 1980, anything older can't be represented.
+    if year < 1980:
+        year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+    dos_time = (hour << 11) | (minute << 5) | (second // 2)
+    dos_date = ((year - 1980) << 9) | (month << 5) | day
+    return dos_time, dos_date
+
+
+def _deflate(data, level, zdict, last):
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS,
+                                      zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS)
+    # A sync flush ends on a byte boundary without marking the final block, so
+    # the output can be concatenated with the next chunk's output.
+    mode = zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    return compressor.compress(data) + compressor.flush(mode)
+
+
+def _read_chunks(fh, chunk_size):
+    """Yield (chunk, is_last) pairs, always yielding at least one chunk."""
+    chunk = fh.read(chunk_size)
+    while True:
+        following = fh.read(chunk_size)
+        yield chunk, not following
+        if not following:
+            return
+        chunk = following
+
+
+class ZipWriter:
+    """Write a ZIP64 archive to a binary file object, compressing in parallel.
+
+    Every member is split into chunks which are deflated independently on a
+    pool of `workers` threads (zlib releases the GIL while compressing). Each
+    chunk is primed with the tail of the previous chunk and the results are
+    written in order, so the member is a single ordinary DEFLATE stream which
+    any ZIP reader can decompress. The output does not depend on `workers`.
+    Zstandard members are instead compressed by zstd's own worker threads.
+
+    Local headers are followed by data descriptors instead of being rewritten
+    once a member's size is known, so the file object is only ever written to
+    sequentially.
+
+    `comment` (bytes) is written at the very end of the archive.
+
+    When `deterministic` is True, every member has the same timestamp (the
+    DOS epoch) and permissions (0644), and Zstandard always runs in its
+    multi-threaded mode (whose output is the same for any number of threads),
+    so the archive only depends on the members' names and contents.
+
+    """
+    CHUNK_SIZE = 1024 * 1024
+    # 1980-01-01 00:00:00 as a (time, date) pair.
+    DETERMINISTIC_DOS_DATETIME = (0, (1 << 5) | 1)
+    DETERMINISTIC_MODE = 0o100644
+
+    def __init__(self, fh, workers=None, chunk_size=None, comment=b'',
+                 deterministic=False):
+        if len(comment) > _MAX_UINT16:
+            raise ValueError("ZIP comments are limited to %d bytes, not %d."
+                             % (_MAX_UINT16, len(comment)))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if chunk_size is None:
+            chunk_size = self.CHUNK_SIZE
+
+        self._fh = fh
+        self._workers = workers
+        self._chunk_size = chunk_size
+        self._comment = comment
+        self._deterministic = deterministic
+        self._offset = 0
+        self._entries = []
+        self._pool = None
+        if workers > 1:
+            self._pool = concurrent.futures.ThreadPoolExecutor(workers)
+        # Bounds the memory used by chunks which are read but not written.
+        self._window = max(workers, 1) * 2
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        elif self._pool is not None:
+            self._pool.shutdown()
+
+    def write_files(self, members, compression=None):
+        """Write an iterable of (filepath, arcname) pairs to the archive.
+
+        `compression` is a CompressionPolicy which decides whether each member
+        is deflated or stored. Chunks of later members are compressed while
+        earlier members are still being written, so many small files are as
+        parallel as one large one.
+
+        """
+        if compression is None:
+            compression = CompressionPolicy()
+
+        pending = collections.deque()
+        for event in self._iter_events(members, compression):
+            pending.append(event)
+            if len(pending) >= self._window:
+                self._emit(*pending.popleft())
+        while pending:
+            self._emit(*pending.popleft())
+
+    def _iter_events(self, members, compression):
+        level = compression.level
+        if compression.compress_type == ZIP_ZSTANDARD:
+            threads = self._workers if self._workers > 1 else 0
+            if self._deterministic:
+                # Single-threaded mode produces different frames.
+                threads = max(self._workers, 1)
+            zstd = zstandard.ZstdCompressor(level=level, threads=threads)
+
+        for filepath, arcname in members:
+            filepath = str(filepath)
+            st = os.stat(filepath)
+            if compression.should_compress(filepath):
+                compress_type = compression.compress_type
+            else:
+                compress_type = zipfile.ZIP_STORED
+            yield 'start', (arcname, st, compress_type)
+
+            zdict = None
+            if compress_type == ZIP_ZSTANDARD:
+                zstd_member = zstd.compressobj(size=st.st_size)
+            with open(filepath, mode='rb') as fh:
+                for chunk, last in _read_chunks(fh, self._chunk_size):
+                    if compress_type == zipfile.ZIP_STORED:
+                        compressed = chunk
+                    elif compress_type == ZIP_ZSTANDARD:
+                        compressed = zstd_member.compress(chunk)
+                        if last:
+                            compressed += zstd_member.flush()
+                    elif self._pool is None:
+                        compressed = _deflate(chunk, level, zdict, last)
+                    else:
+                        compressed = self._pool.submit(_deflate, chunk, level,
+                                                       zdict, last)
+                    yield 'chunk', (chunk, compressed)
+                    zdict = chunk[-_DICT_SIZE:]
+
+            yield 'end', None
+
+    def _emit(self, kind, value):
+        if kind == 'start':
+            self._start_member(*value)
+        elif kind == 'chunk':
+            chunk, compressed = value
+            if isinstance(compressed, concurrent.futures.Future):
+                compressed = compressed.result()
+            self._crc = zlib.crc32(chunk, self._crc)
+            self._file_size += len(chunk)
+            self._compress_size += len(compressed)
+            self._write(compressed)
+        else:
+            self._end_member()
+
+    def _write(self, data):
+        self._fh.write(data)
+        self._offset += len(data)
+
+    def _start_member(self, arcname, st, compress_type):
+        name = arcname.encode('utf-8')
+        flags = _FLAG_DATA_DESCRIPTOR
+        try:
+            arcname.encode('ascii')
+        except UnicodeEncodeError:
+            flags |= _FLAG_UTF8
+
+        # Same heuristic as `zipfile`, compressed data can be slightly larger
+        # than the original when it is incompressible.
+        self._zip64 = st.st_size * 1.05 > _MAX_UINT32
+        extra = b''
+        version = _VERSION_DEFAULT
+        size_field = 0
+        if self._zip64:
+            # Sizes are in the data descriptor, but the extra field must exist
+            # so that readers know the descriptor uses 8 byte sizes.
+            extra = struct.pack('<HHQQ', _ZIP64_EXTRA_ID, 16, 0, 0)
+            version = _VERSION_ZIP64
+            size_field = _MAX_UINT32
+        if compress_type == ZIP_ZSTANDARD:
+            version = _VERSION_ZSTANDARD
+
+        if self._deterministic:
+            dos_time, dos_date = self.DETERMINISTIC_DOS_DATETIME
+            mode = self.DETERMINISTIC_MODE
+        else:
+            dos_time, dos_date = _dos_datetime(st.st_mtime)
+            mode = st.st_mode
+        self._member = (arcname, version, flags, compress_type, dos_time,
+                        dos_date, (mode & 0xFFFF) << 16, self._offset)
+        self._crc = 0
+        self._file_size = 0
+        self._compress_size = 0
+
+        self._write(_LOCAL_HEADER.pack(
+            _LOCAL_HEADER_SIG, version, flags, compress_type, dos_time,
+            dos_date, 0, size_field, size_field, len(name), len(extra)))
+        self._write(name)
+        self._write(extra)
+
+    def _end_member(self):
+        if self._zip64:
+            descriptor = _DATA_DESCRIPTOR64
+        else:
+            descriptor = _DATA_DESCRIPTOR
+        self._write(descriptor.pack(_DATA_DESCRIPTOR_SIG, self._crc,
+                                    self._compress_size, self._file_size))
+
+        (arcname, version, flags, compress_type, dos_time, dos_date,
+         external_attr, header_offset) = self._member
+        self._entries.append(ZipEntry(
+            arcname, version, flags, compress_type, dos_time, dos_date,
+            self._crc, self._compress_size, self._file_size, external_attr,
+            header_offset))
+
+    def close(self):
+        """Write the central directory. The file object is not closed."""
+        if self._pool is not None:
+            self._pool.shutdown()
+
+        start = self._offset
+        for entry in self._entries:
+            self._write_central_header(entry)
+        self._write_end_record(start, self._offset - start)
+
+    def _write_central_header(self, entry):
+        name = entry.arcname.encode('utf-8')
+
+        # Only the fields which overflow are stored in the extra field, in
+        # this order.
+        zip64_fields = []
+        file_size = entry.file_size
+        compress_size = entry.compress_size
+        header_offset = entry.header_offset
+        if file_size >= _MAX_UINT32:
+            zip64_fields.append(file_size)
+            file_size = _MAX_UINT32
+        if compress_size >= _MAX_UINT32:
+            zip64_fields.append(compress_size)
+            compress_size = _MAX_UINT32
+        if header_offset >= _MAX_UINT32:
+            zip64_fields.append(header_offset)
+            header_offset = _MAX_UINT32
+
+        extra = b''
+        version = entry.version
+        if zip64_fields:
+            extra = struct.pack('<HH%dQ' % len(zip64_fields), _ZIP64_EXTRA_ID,
+                                8 * len(zip64_fields), *zip64_fields)
+            version = max(version, _VERSION_ZIP64)
+
+        self._write(_CENTRAL_HEADER.pack(
+            _CENTRAL_HEADER_SIG, _VERSION_MADE_BY, version, entry.flags,
+            entry.compress_type, entry.dos_time, entry.dos_date, entry.crc,
+            compress_size, file_size, len(name), len(extra), 0, 0, 0,
+            entry.external_attr, header_offset))
+        self._write(name)
+        self._write(extra)
+
+    def _write_end_record(self, start, size):
+        count = len(self._entries)
+        if (count >= _MAX_UINT16 or start >= _MAX_UINT32 or
+                size >= _MAX_UINT32):
+            end64_offset = self._offset
+            self._write(_END_RECORD64.pack(
+                _END_RECORD64_SIG, _END_RECORD64.size - 12, _VERSION_MADE_BY,
+                _VERSION_ZIP64, 0, 0, count, count, size, start))
+            self._write(_END_LOCATOR64.pack(_END_LOCATOR64_SIG, 0,
+                                            end64_offset, 1))
+            count = min(count, _MAX_UINT16)
+            start = min(start, _MAX_UINT32)
+            size = min(size, _MAX_UINT32)
+
+        self._write(_END_RECORD.pack(_END_RECORD_SIG, 0, 0, count, count, size,
+                                     start, len(self._comment)))
+        self._write(self._comment)
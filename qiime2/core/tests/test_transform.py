@@ -0,0 +1,126 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import qiime2.sdk
+from qiime2.core.transform import ModelType
+from qiime2.plugin import BinaryFileFormat, Plugin, TextFileFormat
+
+
+class BytesFormat(BinaryFileFormat):
+    def sniff(self):
+        return True
+
+
+class TextFormat(TextFileFormat):
+    def sniff(self):
+        return True
+
+
+class TestMemoryviewTransformer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory(
+            prefix='qiime2-test-temp-')
+        self.fp = os.path.join(self.temp_dir.name, 'file')
+        with open(self.fp, 'wb') as fh:
+            fh.write(b'\x00\x01\x02\x03')
+
+        self.plugin = self.make_plugin('memoryview-plugin')
+        self.plugin.register_formats(BytesFormat, TextFormat)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def integrate(self, *plugins):
+        # Stand in for the plugins being installed.
+        plugins = plugins or (self.plugin,)
+        entry_points = [mock.Mock(**{'load.return_value': plugin})
+                        for plugin in plugins]
+        pm = object.__new__(qiime2.sdk.PluginManager)
+        with mock.patch.object(qiime2.sdk.PluginManager, 'iter_entry_points',
+                               return_value=entry_points):
+            pm._init()
+        return mock.patch.object(qiime2.sdk, 'PluginManager',
+                                 return_value=pm)
+
+    def make_plugin(self, name):
+        return Plugin(name=name, version='0.0.0', website='example.com',
+                      package='example')
+
+    def test_binary_format_to_memoryview(self):
+        with self.integrate():
+            from_type = ModelType.from_view_type(BytesFormat)
+            to_type = ModelType.from_view_type(memoryview)
+
+            self.assertTrue(from_type.has_transformation(to_type))
+            view = from_type.make_transformation(to_type)(self.fp)
+
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(view.tolist(), [0, 1, 2, 3])
+
+    def test_unregistered_format_has_no_memoryview(self):
+        from_type = ModelType.from_view_type(BytesFormat)
+        to_type = ModelType.from_view_type(memoryview)
+
+        self.assertFalse(from_type.has_transformation(to_type))
+
+    def test_text_format_has_no_memoryview(self):
+        with self.integrate():
+            from_type = ModelType.from_view_type(TextFormat)
+            to_type = ModelType.from_view_type(memoryview)
+
+            self.assertFalse(from_type.has_transformation(to_type))
+
+    def test_plugin_overrides_memoryview(self):
+        @self.plugin.register_transformer
+        def _(ff: BytesFormat) -> memoryview:
+            return memoryview(b'override')
+
+        with self.integrate():
+            from_type = ModelType.from_view_type(BytesFormat)
+            to_type = ModelType.from_view_type(memoryview)
+            view = from_type.make_transformation(to_type)(self.fp)
+
+        self.assertEqual(view.tobytes(), b'override')
+
+    def test_other_plugin_overrides_memoryview(self):
+        other = self.make_plugin('other-plugin')
+
+        @other.register_transformer
+        def _(ff: BytesFormat) -> memoryview:
+            return memoryview(b'override')
+
+        # Whichever plugin is loaded first.
+        for plugins in (self.plugin, other), (other, self.plugin):
+            with self.integrate(*plugins) as PluginManager:
+                record = PluginManager().transformers[BytesFormat][memoryview]
+                self.assertIs(record.plugin, other)
+
+                from_type = ModelType.from_view_type(BytesFormat)
+                to_type = ModelType.from_view_type(memoryview)
+                view = from_type.make_transformation(to_type)(self.fp)
+
+            self.assertEqual(view.tobytes(), b'override')
+
+    def test_duplicate_memoryview_transformers(self):
+        plugins = self.make_plugin('a-plugin'), self.make_plugin('b-plugin')
+        for plugin in plugins:
+            @plugin.register_transformer
+            def _(ff: BytesFormat) -> memoryview:
+                return memoryview(b'')
+
+        with self.assertRaisesRegex(ValueError, 'BytesFormat.*memoryview'):
+            self.integrate(self.plugin, *plugins)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import collections
+import datetime
+import unittest
+import uuid
+
+import yaml
+
+import qiime2.core.yaml_util as yaml_util
+from qiime2.core.archive.provenance import (
+    ColorPrimitive, ForwardRef, LiteralString, MetadataPath, NoProvenance,
+    OrderedKeyValue, ProvenanceCapture)
+
+
+class PureLoader(yaml.SafeLoader):
+    # The pure-Python equivalent of `yaml_util.Loader`.
+    yaml_constructors = yaml_util.Loader.yaml_constructors
+
+
+def make_action(i):
+    timezone = datetime.timezone(datetime.timedelta(hours=-7))
+    action = collections.OrderedDict()
+    action['execution'] = execution = collections.OrderedDict()
+    execution['uuid'] = str(uuid.UUID(int=i))
+    execution['runtime'] = collections.OrderedDict([
+        ('start', datetime.datetime(2017, 5, 1, 12, 30, 0, i, timezone)),
+        ('end', datetime.datetime(2017, 5, 1, 12, 31, 0, i, timezone))])
+    action['action'] = collections.OrderedDict([
+        ('type', 'method'),
+        ('plugin', ForwardRef('environment:plugins:dummy-plugin')),
+        ('inputs', OrderedKeyValue([
+            ('ints', str(uuid.UUID(int=i + 1))),
+            ('missing', NoProvenance(uuid.UUID(int=i + 2))),
+            ('optional', None)])),
+        ('parameters', OrderedKeyValue([
+            ('metadata', MetadataPath('%s:metadata.tsv' % i)),
+            ('color', ColorPrimitive('#00ff00')),
+            ('number', i / 7),
+            ('flag', True),
+            ('name', 'ünïcödé: "quoted" and \'single\' # not a comment'),
+            ('long', ' '.join(['word'] * 40)),
+            ('values', [1, 2.5, 'three', None])]))])
+    action['environment'] = collections.OrderedDict([
+        ('python', LiteralString('3.5.2 |Continuum Analytics, Inc.|\n'
+                                 '[GCC 4.4.7 20120313]')),
+        ('python-packages', collections.OrderedDict(
+            ('package-%d' % j, '%d.0.%d' % (j, i)) for j in range(20)))])
+    return action
+
+
+class TestYAMLUtil(unittest.TestCase):
+    def test_same_output_as_pure_python(self):
+        for i in range(20):
+            action = make_action(i)
+            self.assertEqual(
+                yaml_util.dump(action, **ProvenanceCapture.YAML_SETTINGS),
+                yaml.dump(action, Dumper=yaml.Dumper,
+                          **ProvenanceCapture.YAML_SETTINGS))
+            self.assertEqual(yaml_util.dump(action), yaml.dump(action))
+
+    def test_round_trip_tags(self):
+        data = collections.OrderedDict([
+            ('ref', ForwardRef('environment:plugins:dummy-plugin')),
+            ('no-provenance', NoProvenance('some-uuid')),
+            ('metadata', MetadataPath('some-uuid:metadata.tsv')),
+            ('color', ColorPrimitive('#ff0000'))])
+
+        obs = yaml_util.load(yaml_util.dump(data))
+
+        self.assertEqual(obs, dict(data))
+        self.assertEqual(obs, yaml.load(yaml.dump(data), Loader=PureLoader))
+
+    def test_load_is_safe(self):
+        with self.assertRaises(yaml.YAMLError):
+            yaml_util.load('!!python/object/apply:os.system ["true"]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,10 @@ def identity_transformer(view):
     return view
 
 
+def memoryview_transformer(view):
+    return view.map()
+
+
 class ModelType:
     @staticmethod
     def from_view_type(view_type):
@@ -119,7 +123,7 @@ class FormatType(ModelType):
         if isinstance(view, self._view_type):
             # wrap original path (inheriting the lifetime) and return a
             # read-only instance
-            return self._view_type(view.path, mode='r')
+            return self._view_type(view._path, mode='r')
 
         return view
 
@@ -131,7 +135,7 @@ class FormatType(ModelType):
         view.validate()
 
     def set_user_owned(self, view, value):
-        view.path._user_owned = value
+        view._path._user_owned = value
 
 
 class SingleFileDirectoryFormatType(FormatType):
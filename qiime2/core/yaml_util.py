@@ -0,0 +1,52 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import yaml
+
+# libyaml is much faster at reading and writing YAML, but it is optional in
+# PyYAML.
+try:
+    from yaml import CDumper as _BaseDumper, CSafeLoader as _BaseLoader
+except ImportError:
+    from yaml import Dumper as _BaseDumper, SafeLoader as _BaseLoader
+
+
+class Dumper(_BaseDumper):
+    """The dumper used for everything the framework writes.
+
+    Its output is the same as `yaml.dump`'s, libyaml is only faster.
+
+    """
+
+
+class Loader(_BaseLoader):
+    """The (safe) loader used for everything the framework reads."""
+
+
+def add_representer(data_type, representer):
+    """Register `representer` for `data_type` with `Dumper`.
+
+    It is also registered with PyYAML's default dumper, so that `yaml.dump`
+    represents the type the same way.
+
+    """
+    yaml.add_representer(data_type, representer)
+    yaml.add_representer(data_type, representer, Dumper=Dumper)
+
+
+def add_constructor(tag, constructor):
+    """Register `constructor` for `tag` with `Loader`."""
+    yaml.add_constructor(tag, constructor, Loader=Loader)
+
+
+def dump(data, stream=None, **kwargs):
+    return yaml.dump(data, stream, Dumper=Dumper, **kwargs)
+
+
+def load(stream):
+    return yaml.load(stream, Loader=Loader)
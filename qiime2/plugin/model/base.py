@@ -20,14 +20,36 @@ class FormatBase:
                 raise ValueError("A path must be omitted when writing.")
 
         if mode == 'w':
-            self.path = qpath.OutPath(
+            self._path = qpath.OutPath(
                 # TODO: parents shouldn't know about their children
                 dir=isinstance(self, model.DirectoryFormat),
                 prefix='q2-%s-' % self.__class__.__name__)
         else:
-            self.path = qpath.InPath(path)
+            self._path = qpath.InPath(path)
 
         self._mode = mode
+        self._materialized = False
+
+    @property
+    def path(self):
+        """The file or directory of this format.
+
+        When reading from a lazily loaded archive nothing is extracted until
+        this is first used, which extracts the file (or every file of the
+        directory). Later uses don't check again. The framework uses `_path`
+        to read only the members it needs.
+
+        """
+        if self._mode == 'r' and not self._materialized:
+            from qiime2.core.archive import Archiver
+            Archiver.materialize_path(self._path)
+            self._materialized = True
+        return self._path
+
+    @path.setter
+    def path(self, value):
+        self._path = value
+        self._materialized = False
 
     def __str__(self):
         return str(self.path)
@@ -10,6 +10,7 @@ import re
 import pathlib
 
 from qiime2.core import transform
+from qiime2.core.archive import Archiver
 from .base import FormatBase
 
 
@@ -88,7 +89,7 @@ class BoundFile:
 
     def _validate_members(self, collected_paths):
         found_members = False
-        root = pathlib.Path(self._directory_format.path)
+        root = pathlib.Path(self._directory_format._path)
         for path in collected_paths:
             if re.match(self.pathspec, str(path.relative_to(root))):
                 if collected_paths[path]:
@@ -108,7 +109,7 @@ class BoundFile:
         def bound_path_maker(**kwargs):
             # Must wrap in a naive Path, otherwise an OutPath would be summoned
             # into this world, and would destroy everything in its path.
-            path = (pathlib.Path(self._directory_format.path) /
+            path = (pathlib.Path(self._directory_format._path) /
                     self._path_maker(self._directory_format, **kwargs))
             # NOTE: path makers are bound to the directory format, so must be
             # provided as the first argument which will look like `self` to
@@ -128,8 +129,8 @@ class BoundFileCollection(BoundFile):
 
     def iter_views(self, view_type):
         # Don't want an OutPath, just a Path
-        root = pathlib.Path(self._directory_format.path)
-        paths = [fp for fp in sorted(root.glob('**/*'))
+        root = pathlib.Path(self._directory_format._path)
+        paths = [fp for fp in sorted(Archiver.iter_files(root))
                  if re.match(self.pathspec, str(fp.relative_to(root)))]
         from_type = transform.ModelType.from_view_type(self.format)
         to_type = transform.ModelType.from_view_type(view_type)
@@ -159,11 +160,12 @@ class _DirectoryMeta(type):
 
 class DirectoryFormat(FormatBase, metaclass=_DirectoryMeta):
     def validate(self):
-        if not self.path.is_dir():
-            raise ValueError("%r is not a directory." % self.path)
-        collected_paths = {p: None for p in self.path.glob('**/*')
-                           if not p.name.startswith('.') and
-                           p.is_file()}
+        # Only the index of a lazily loaded archive is needed to find the
+        # files, and sniffing them reads them straight out of the archive.
+        if not Archiver.is_dir(self._path):
+            raise ValueError("%r is not a directory." % self._path)
+        collected_paths = {p: None for p in Archiver.iter_files(self._path)
+                           if not p.name.startswith('.')}
         for field in self._fields:
             getattr(self, field)._validate_members(collected_paths)
 
@@ -7,6 +7,7 @@
 # ----------------------------------------------------------------------------
 
 import abc
+import io
 
 from .base import FormatBase
 
@@ -17,27 +18,47 @@ class _FileFormat(FormatBase, metaclass=abc.ABCMeta):
         pass
 
     def validate(self):
-        if not self.path.is_file():
-            raise ValueError("%r is not a file." % self.path)
+        from qiime2.core.archive import Archiver
+        if not Archiver.is_file(self._path):
+            raise ValueError("%r is not a file." % self._path)
         try:
             is_member = self.sniff()
         except Exception:
             raise ValueError("Failed to sniff %r as %s. There may be a"
                              " problem with the sniffer."
-                             % (self.path, self.__class__.__name__))
+                             % (self._path, self.__class__.__name__))
 
         if not is_member:
             raise ValueError("%r is not formatted as a %s file."
-                             % (self.path, self.__class__.__name__))
+                             % (self._path, self.__class__.__name__))
 
 
+# When reading, files are opened through the archiver, so files in a lazily
+# loaded archive are read straight out of it instead of being extracted.
 class TextFileFormat(_FileFormat):
     def open(self):
-        mode = 'r' if self._mode == 'r' else 'r+'
-        return self.path.open(mode=mode, encoding='utf8')
+        if self._mode == 'r':
+            from qiime2.core.archive import Archiver
+            return io.TextIOWrapper(Archiver.open_path(self._path),
+                                    encoding='utf8')
+        return self._path.open(mode='r+', encoding='utf8')
 
 
 class BinaryFileFormat(_FileFormat):
     def open(self):
-        mode = 'rb' if self._mode == 'r' else 'r+b'
-        return self.path.open(mode=mode)
+        if self._mode == 'r':
+            from qiime2.core.archive import Archiver
+            return Archiver.open_path(self._path, seekable=True)
+        return self._path.open(mode='r+b')
+
+    def map(self):
+        """Memory map the file, returning a read-only memoryview.
+
+        Files in lazily loaded archives which are stored without compression
+        are mapped directly from the archive. This is also the `memoryview`
+        transformer of every registered binary format (e.g. for
+        `numpy.frombuffer`), unless a plugin registers its own.
+
+        """
+        from qiime2.core.archive import Archiver
+        return Archiver.map_file(self._path)
@@ -9,9 +9,8 @@
 import collections
 import types
 
-import yaml
-
 import qiime2.sdk
+import qiime2.core.yaml_util as yaml_util
 import qiime2.core.type.grammar as grammar
 from qiime2.plugin.model import DirectoryFormat
 from qiime2.plugin.model.base import FormatBase
@@ -180,7 +179,7 @@ class Plugin:
             format=artifact_format, plugin=self))
 
 
-yaml.add_representer(Plugin, Plugin.yaml_representer)
+yaml_util.add_representer(Plugin, Plugin.yaml_representer)
 
 
 class PluginActions(dict):
@@ -10,8 +10,9 @@ from .action import Action, Method, Visualizer
 from .plugin_manager import PluginManager
 from .result import Result, Artifact, Visualization
 from .results import Results
+from .cache import ResultCache
 from .util import parse_type, parse_format, UnknownTypeError
 
 __all__ = ['Result', 'Results', 'Artifact', 'Visualization', 'Action',
-           'Method', 'Visualizer', 'PluginManager', 'parse_type',
-           'parse_format', 'UnknownTypeError']
+           'Method', 'Visualizer', 'PluginManager', 'ResultCache',
+           'parse_type', 'parse_format', 'UnknownTypeError']
@@ -0,0 +1,172 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import os
+import pathlib
+import threading
+import uuid as _uuid
+import warnings
+
+import qiime2.sdk
+import qiime2.core.archive as archive
+
+
+class ResultCache:
+    """An on-disk cache of the results of actions.
+
+    While a cache is active (it is used as a context manager), calling an
+    action in the same thread with the same inputs (by UUID) and parameters
+    as an earlier call returns the results of that call instead of running
+    the action again.
+    Calls are identified by `ActionProvenanceCapture.fingerprint`, so a new
+    version of the plugin (or of the framework) is a different call.
+
+    Results are kept in an `ArtifactStore`. When `max_size` (in bytes) is
+    provided, the least recently used entries are evicted until the store is
+    no larger than that.
+
+    `policy` is called with the action and a dict of its parameters, and
+    decides whether that call may be cached. Actions which are
+    non-deterministic should be excluded by it (or only cached when e.g. a
+    random seed is provided), by default every call is cached.
+
+    """
+    STORE_DIR = 'store'
+    ENTRIES_DIR = 'entries'
+
+    _local = threading.local()
+
+    @classmethod
+    def current(cls):
+        """Return the cache active in this thread, or None."""
+        active = cls._active()
+        return active[-1] if active else None
+
+    def __init__(self, path, max_size=None, policy=None):
+        self.path = pathlib.Path(path)
+        self.max_size = max_size
+        self.policy = policy
+        self._store = archive.ArtifactStore(self.path / self.STORE_DIR)
+        self._entries = self.path / self.ENTRIES_DIR
+        self._entries.mkdir(exist_ok=True)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, str(self.path))
+
+    def __enter__(self):
+        self._active().append(self)
+        return self
+
+    def __exit__(self, *args):
+        self._active().pop()
+
+    @classmethod
+    def _active(cls):
+        # Every thread has its own stack of active caches.
+        try:
+            return cls._local.active
+        except AttributeError:
+            cls._local.active = []
+            return cls._local.active
+
+    def __contains__(self, key):
+        return (self._entries / key).is_file()
+
+    def __len__(self):
+        return len(self._list_entries())
+
+    def is_cacheable(self, action, parameters):
+        return self.policy is None or bool(self.policy(action, parameters))
+
+    def get(self, key):
+        """Return the cached results (a tuple) of `key`, or None."""
+        entry = self._entries / key
+        try:
+            uuids = self._read_entry(entry)
+            results = tuple(qiime2.sdk.Result.load(uuid, store=self._store)
+                            for uuid in uuids)
+        except (FileNotFoundError, ValueError):
+            # Missing, or evicted meanwhile by another process.
+            return None
+
+        try:
+            # The modification time of an entry is when it was last used.
+            os.utime(str(entry))
+        except FileNotFoundError:
+            pass
+        return results
+
+    def put(self, key, results):
+        """Cache `results` (a sequence of results) as `key`.
+
+        The results were computed either way, so a failure to store them
+        (e.g. a full disk) is a warning instead of an error.
+
+        """
+        try:
+            self._put(key, results)
+        except Exception as e:
+            warnings.warn("Results could not be cached in %s: %s"
+                          % (self.path, e), RuntimeWarning)
+
+    def _put(self, key, results):
+        for result in results:
+            result.add_to_store(self._store)
+
+        entry = self._entries / key
+        temp = entry.parent / ('.%s-%s' % (entry.name, _uuid.uuid4().hex))
+        with temp.open(mode='w') as fh:
+            fh.write(''.join('%s\n' % result.uuid for result in results))
+        os.replace(str(temp), str(entry))
+
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    def evict(self, max_size=0):
+        """Evict least recently used entries down to `max_size` bytes.
+
+        By default every entry is evicted.
+
+        """
+        entries = self._list_entries()
+        size = self._store.size()
+        while entries and size > max_size:
+            _, oldest = entries.pop(0)
+            try:
+                uuids = set(self._read_entry(oldest))
+                os.remove(str(oldest))
+            except FileNotFoundError:
+                continue
+
+            # Results may be shared with another entry, which keeps them.
+            for _, entry in entries:
+                try:
+                    uuids.difference_update(self._read_entry(entry))
+                except FileNotFoundError:
+                    pass
+            for uuid in uuids:
+                if uuid in self._store:
+                    self._store.remove(uuid)
+            size = self._store.size()
+
+    def _list_entries(self):
+        # Least recently used first.
+        entries = []
+        for name in os.listdir(str(self._entries)):
+            if not name.startswith('.'):
+                path = self._entries / name
+                try:
+                    entries.append((path.stat().st_mtime, path))
+                except FileNotFoundError:
+                    pass
+        return sorted(entries)
+
+    @classmethod
+    def _read_entry(cls, path):
+        with path.open() as fh:
+            return fh.read().split()
@@ -61,6 +61,8 @@ class PluginManager:
         for plugin in self.plugins.values():
             self._integrate_plugin(plugin)
 
+        self._add_default_transformers()
+
     def _integrate_plugin(self, plugin):
         for type_name, type_record in plugin.types.items():
             if type_name in self.semantic_types:
@@ -75,7 +77,7 @@ class PluginManager:
         for (input, output), transformer_record in plugin.transformers.items():
             if output in self.transformers[input]:
                 raise ValueError("Transformer from %r to %r already exists."
-                                 % transformer_record)
+                                 % (input, output))
             self.transformers[input][output] = transformer_record
 
         for name, record in plugin.formats.items():
@@ -88,6 +90,20 @@ class PluginManager:
             self.formats[name] = record
         self.type_formats.extend(plugin.type_formats)
 
+    def _add_default_transformers(self):
+        from qiime2.plugin.model import BinaryFileFormat
+        from qiime2.plugin.plugin import TransformerRecord
+
+        # Every binary format can be viewed as a memoryview, unless any
+        # plugin registers its own transformer for it.
+        for record in self.formats.values():
+            if (issubclass(record.format, BinaryFileFormat) and
+                    memoryview not in self.transformers[record.format]):
+                self.transformers[record.format][memoryview] = \
+                    TransformerRecord(
+                        transformer=transform.memoryview_transformer,
+                        restrict=None, plugin=record.plugin)
+
     # TODO: Should plugin loading be transactional? i.e. if there's
     # something wrong, the entire plugin fails to load any piece, like a
     # databases rollback/commit
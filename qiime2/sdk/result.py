@@ -52,13 +52,63 @@ class Result:
         return ResultMetadata(*archive.Archiver.peek(filepath))
 
     @classmethod
-    def extract(cls, filepath, output_dir):
-        return archive.Archiver.extract(filepath, output_dir)
+    def extract(cls, filepath, output_dir, workers=None):
+        return archive.Archiver.extract(filepath, output_dir, workers=workers)
 
     @classmethod
-    def load(cls, filepath):
-        """Factory for loading Artifacts and Visualizations."""
-        archiver = archive.Archiver.load(filepath)
+    def verify(cls, filepath, workers=None):
+        """Check that `filepath` is intact without loading it.
+
+        Raises ValueError describing the problem when it isn't. See
+        `verify_directory` to check many results at once.
+
+        """
+        archive.Archiver.verify(filepath, workers=workers)
+
+    @classmethod
+    def verify_directory(cls, directory, workers=None):
+        """Verify every .qza and .qzv file below `directory` in parallel.
+
+        Returns an OrderedDict mapping each filepath to None when it is
+        intact, otherwise to the exception describing the problem.
+
+        """
+        extensions = (Artifact.extension, Visualization.extension)
+        filepaths = sorted(
+            str(path) for path in pathlib.Path(directory).glob('**/*')
+            if path.suffix in extensions and path.is_file())
+        return archive.Archiver.verify_all(filepaths, workers=workers)
+
+    @classmethod
+    def convert(cls, filepath, destination, archive_type='zip'):
+        """Save an archive as another type of archive.
+
+        For example, convert an exploded directory archive (see `save`) into
+        a .qza/.qzv file.
+
+        """
+        archive.Archiver.convert(filepath, destination,
+                                 archive_type=archive_type)
+
+    @classmethod
+    def load(cls, filepath, lazy=False, workers=None, store=None):
+        """Factory for loading Artifacts and Visualizations.
+
+        When `lazy` is True, members of the archive are only extracted once
+        they are needed (e.g. the data directory is extracted on the first
+        call to `view`). Otherwise the archive is extracted immediately using
+        `workers` threads (defaults to the number of CPUs).
+
+        When `store` (a `qiime2.core.archive.ArtifactStore` or
+        `ArtifactBundle`) is provided, `filepath` is instead the UUID of a
+        result in that store or bundle.
+
+        """
+        if store is not None:
+            archiver = store.load(filepath)
+        else:
+            archiver = archive.Archiver.load(filepath, lazy=lazy,
+                                             workers=workers)
 
         if Artifact._is_valid_type(archiver.type):
             result = Artifact.__new__(Artifact)
@@ -79,6 +129,22 @@ class Result:
         result._archiver = archiver
         return result
 
+    @classmethod
+    def save_bundle(cls, results, filepath, workers=None, compression=None,
+                    deterministic=False):
+        """Save many results to a single bundle file at `filepath`.
+
+        The provenance shared by `results` is only stored once. Any one of
+        them can be loaded from the bundle with `load`, the other arguments
+        are the same as `save`.
+
+        """
+        archive.ArtifactBundle.save(
+            [result._archiver for result in results], filepath,
+            workers=workers, compression=compression,
+            deterministic=deterministic)
+        return filepath
+
     @property
     def type(self):
         return self._archiver.type
@@ -127,13 +193,67 @@ class Result:
         # format tranformations may return the invoked transformers
         return None
 
+    def add_to_store(self, store):
+        """Add to a `qiime2.core.archive.ArtifactStore`, see `load`."""
+        return store.add(self._archiver)
+
     def _orphan(self):
         self._archiver.orphan()
 
-    def save(self, filepath):
-        if not filepath.endswith(self.extension):
+    def save(self, filepath, workers=None, compression=None,
+             archive_type='zip', deterministic=False, header=None):
+        """Save to `filepath`, compressing with `workers` threads.
+
+        `compression` is a `qiime2.core.archive.CompressionPolicy`, by default
+        members which are already compressed (e.g. .gz or .png files) are
+        stored as-is and everything else is deflated.
+
+        When `archive_type` is 'directory', `filepath` is instead created as an
+        uncompressed directory (hardlinked where possible), which can be loaded
+        without extraction and converted into a regular archive with
+        `convert`.
+
+        `filepath` may also be a writable binary file object (e.g.
+        `sys.stdout.buffer` or `io.BytesIO`), the archive is streamed into it
+        and it is returned as-is.
+
+        When `deterministic` is True, saving the same result always produces
+        the same bytes, so that the file's hash can identify its contents.
+
+        When `header` is True, the archive gets a summary at the end of the
+        file, so that `peek` only reads those few bytes (which matters most
+        for archives which aren't local). Older versions of the framework
+        ignore it.
+
+        """
+        filepath = self._add_extension(filepath)
+        self._archiver.save(filepath, workers=workers,
+                            compression=compression,
+                            archive_type=archive_type,
+                            deterministic=deterministic, header=header)
+        return filepath
+
+    def save_async(self, filepath, workers=None, compression=None,
+                   archive_type='zip', deterministic=False, header=None):
+        """Save in the background, returning a `concurrent.futures.Future`.
+
+        The arguments are the same as `save`, and the future's result is the
+        filepath which was saved. The result may be used (or discarded) while
+        it is being saved, but `filepath` should not be read until the future
+        is done. Only a few saves run at once, beyond that this waits for an
+        earlier save to finish.
+
+        """
+        return self._archiver.save_async(self._add_extension(filepath),
+                                         workers=workers,
+                                         compression=compression,
+                                         archive_type=archive_type,
+                                         deterministic=deterministic,
+                                         header=header)
+
+    def _add_extension(self, filepath):
+        if isinstance(filepath, str) and not filepath.endswith(self.extension):
             filepath += self.extension
-        self._archiver.save(filepath)
         return filepath
 
 
@@ -232,7 +352,9 @@ class Artifact(Result):
 
         transformation = from_type.make_transformation(to_type,
                                                        recorder=recorder)
-        result = transformation(self._archiver.data_dir)
+        # Members of a lazily loaded archive are only extracted once they are
+        # used by the transformation.
+        result = transformation(self._archiver.sparse_data_dir)
 
         to_type.set_user_owned(result, True)
         return result
@@ -7,11 +7,13 @@
 # ----------------------------------------------------------------------------
 
 import collections
+import io
 import os
 import tempfile
 import unittest
 import uuid
 import pathlib
+from unittest import mock
 
 import qiime2.core.type
 from qiime2.sdk import Artifact
@@ -19,6 +21,8 @@ from qiime2.sdk.result import ResultMetadata
 import qiime2.core.archive as archive
 
 from qiime2.core.testing.type import IntSequence1, FourInts, Mapping
+from qiime2.core.testing.format import (FourIntsDirectoryFormat,
+                                        SingleIntFormat)
 from qiime2.core.testing.util import get_dummy_plugin, ArchiveTestingMixin
 
 
@@ -116,6 +120,139 @@ class TestArtifact(unittest.TestCase, ArchiveTestingMixin):
         self.assertEqual(artifact.view(list), [-1, 42, 0, 43])
         self.assertEqual(artifact.view(list), [-1, 42, 0, 43])
 
+    def test_load_lazy(self):
+        saved_artifact = Artifact.import_data(FourInts, [-1, 42, 0, 43])
+        fp = os.path.join(self.test_dir.name, 'artifact.qza')
+        saved_artifact.save(fp)
+
+        artifact = Artifact.load(fp, lazy=True)
+
+        self.assertEqual(artifact.type, FourInts)
+        self.assertEqual(artifact.uuid, saved_artifact.uuid)
+        self.assertFalse(artifact.has_metadata())
+        self.assertEqual(artifact.view(list), [-1, 42, 0, 43])
+
+        output_dir = os.path.join(self.test_dir.name, 'exported')
+        artifact.export_data(output_dir)
+        self.assertEqual(set(os.listdir(output_dir)),
+                         {'file1.txt', 'file2.txt', 'nested'})
+
+        fp2 = os.path.join(self.test_dir.name, 'artifact2.qza')
+        artifact.save(fp2)
+        self.assertEqual(Artifact.load(fp2).view(list), [-1, 42, 0, 43])
+
+    def test_save_to_file_object(self):
+        saved_artifact = Artifact.import_data(FourInts, [-1, 42, 0, 43])
+        buffer = io.BytesIO()
+
+        self.assertIs(saved_artifact.save(buffer), buffer)
+
+        fp = os.path.join(self.test_dir.name, 'artifact.qza')
+        with open(fp, 'wb') as fh:
+            fh.write(buffer.getvalue())
+        artifact = Artifact.load(fp)
+        self.assertEqual(artifact.uuid, saved_artifact.uuid)
+        self.assertEqual(artifact.view(list), [-1, 42, 0, 43])
+
+    def test_save_async(self):
+        saved_artifact = Artifact.import_data(FourInts, [-1, 42, 0, 43])
+        fp = os.path.join(self.test_dir.name, 'artifact')
+
+        future = saved_artifact.save_async(fp)
+        del saved_artifact
+
+        self.assertEqual(future.result(), fp + '.qza')
+        self.assertEqual(Artifact.load(future.result()).view(list),
+                         [-1, 42, 0, 43])
+
+    def test_save_bundle_and_load(self):
+        fp = os.path.join(self.test_dir.name, 'bundle.zip')
+        first = Artifact.import_data(FourInts, [-1, 42, 0, 43])
+        second = Artifact.import_data(IntSequence1, [1, 2, 3])
+
+        self.assertEqual(Artifact.save_bundle([first, second], fp), fp)
+
+        with archive.ArtifactBundle(fp) as bundle:
+            artifact = Artifact.load(str(second.uuid), store=bundle)
+        self.assertEqual(artifact, second)
+        self.assertEqual(artifact.view(list), [1, 2, 3])
+
+    def test_add_to_store_and_load(self):
+        store = archive.ArtifactStore(os.path.join(self.test_dir.name,
+                                                   'store'))
+        saved_artifact = Artifact.import_data(FourInts, [-1, 42, 0, 43])
+
+        uuid = saved_artifact.add_to_store(store)
+        artifact = Artifact.load(str(uuid), store=store)
+
+        self.assertEqual(artifact, saved_artifact)
+        self.assertEqual(artifact.view(list), [-1, 42, 0, 43])
+
+    def test_load_lazy_view_is_sparse(self):
+        saved_artifact = Artifact.import_data(FourInts, [-1, 42, 0, 43])
+        fp = os.path.join(self.test_dir.name, 'artifact.qza')
+        saved_artifact.save(fp)
+
+        artifact = Artifact.load(fp, lazy=True)
+        data_dir = artifact._archiver.sparse_data_dir
+
+        def extracted():
+            return {str(p.relative_to(data_dir))
+                    for p in data_dir.glob('**/*') if p.is_file()}
+
+        # Validating and reading every file through the format's fields
+        # doesn't need anything on disk.
+        self.assertEqual(artifact.view(list), [-1, 42, 0, 43])
+        self.assertEqual(extracted(), set())
+
+        fmt = artifact.view(FourIntsDirectoryFormat)
+        self.assertEqual(extracted(), set())
+        # Using the path of a single file only extracts that file.
+        _, ff = next(fmt.single_ints.iter_views(SingleIntFormat))
+        self.assertEqual(extracted(), set())
+        with open(str(ff.path)) as fh:
+            self.assertEqual(fh.read(), '-1\n')
+        self.assertEqual(extracted(), {'file1.txt'})
+
+        # Using the directory's path extracts everything.
+        self.assertTrue((fmt.path / 'nested' / 'file4.txt').exists())
+        self.assertEqual(extracted(), {'file1.txt', 'file2.txt',
+                                       'nested/file3.txt',
+                                       'nested/file4.txt'})
+
+    def test_load_lazy_format_path(self):
+        saved_artifact = Artifact.import_data(FourInts, [-1, 42, 0, 43])
+        fp = os.path.join(self.test_dir.name, 'artifact.qza')
+        saved_artifact.save(fp)
+        artifact = Artifact.load(fp, lazy=True)
+        fmt = artifact.view(FourIntsDirectoryFormat)
+
+        with mock.patch.object(archive.Archiver, 'materialize_path') as m:
+            path = fmt.path
+            self.assertEqual(str(fmt), str(path))
+        # Only the first use extracts.
+        m.assert_called_once_with(path)
+
+        # The path is still assignable.
+        other = pathlib.Path(self.test_dir.name)
+        fmt.path = other
+        self.assertEqual(fmt.path, other)
+        self.assertEqual(fmt._path, other)
+
+    def test_save_and_load_directory(self):
+        saved_artifact = Artifact.import_data(FourInts, [-1, 42, 0, 43])
+        fp = os.path.join(self.test_dir.name, 'artifact')
+        fp = saved_artifact.save(fp, archive_type='directory')
+
+        self.assertTrue(os.path.isdir(fp))
+        artifact = Artifact.load(fp)
+        self.assertEqual(artifact.uuid, saved_artifact.uuid)
+        self.assertEqual(artifact.view(list), [-1, 42, 0, 43])
+
+        fp2 = os.path.join(self.test_dir.name, 'converted.qza')
+        Artifact.convert(fp, fp2)
+        self.assertEqual(Artifact.load(fp2).view(list), [-1, 42, 0, 43])
+
     def test_load_different_type_with_multiple_view_types(self):
         saved_artifact = Artifact.import_data(IntSequence1,
                                               [42, 42, 43, -999, 42])
@@ -251,6 +388,29 @@ class TestArtifact(unittest.TestCase, ArchiveTestingMixin):
 
         self.assertExtractedArchiveMembers(output_dir, root_dir, expected)
 
+    def test_verify_directory(self):
+        artifact = Artifact.import_data(FourInts, [0, 0, 42, 1000])
+        nested = os.path.join(self.test_dir.name, 'nested')
+        os.mkdir(nested)
+        fp1 = artifact.save(os.path.join(self.test_dir.name, 'artifact.qza'))
+        fp2 = artifact.save(os.path.join(nested, 'artifact.qza'))
+        fp3 = os.path.join(self.test_dir.name, 'truncated.qza')
+        with open(fp1, 'rb') as fh, open(fp3, 'wb') as truncated:
+            truncated.write(fh.read(100))
+        with open(os.path.join(self.test_dir.name, 'other.txt'), 'w') as fh:
+            fh.write('not an artifact')
+
+        Artifact.verify(fp1)
+        with self.assertRaisesRegex(ValueError, 'not a QIIME archive'):
+            Artifact.verify(fp3)
+
+        results = Artifact.verify_directory(self.test_dir.name)
+
+        self.assertEqual(set(results), {fp1, fp2, fp3})
+        self.assertIsNone(results[fp1])
+        self.assertIsNone(results[fp2])
+        self.assertIsInstance(results[fp3], ValueError)
+
     def test_peek(self):
         artifact = Artifact.import_data(FourInts, [0, 0, 42, 1000])
         fp = os.path.join(self.test_dir.name, 'artifact.qza')
@@ -0,0 +1,184 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2016-2017, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import qiime2
+import qiime2.core.archive as archive
+from qiime2.sdk import Artifact, Method, ResultCache
+from qiime2.core.testing.type import IntSequence1
+from qiime2.core.testing.util import get_dummy_plugin
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        prefix = "qiime2-test-temp-"
+        self.temp_dir = tempfile.TemporaryDirectory(prefix=prefix)
+        self.path = os.path.join(self.temp_dir.name, 'cache')
+        self.cache = ResultCache(self.path)
+
+        self.plugin = get_dummy_plugin()
+        self.split_ints = self.plugin.methods['split_ints']
+        self.params_only = self.plugin.methods['params_only_method']
+        self.ints = Artifact.import_data(IntSequence1, [0, 42, 43, -1])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def not_executed(self):
+        return mock.patch.object(Method, '_callable_executor_',
+                                 side_effect=AssertionError('executed'))
+
+    def test_hit(self):
+        with self.cache:
+            left, right = self.split_ints(self.ints)
+            with self.not_executed():
+                cached_left, cached_right = self.split_ints(self.ints)
+
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(cached_left.uuid, left.uuid)
+        self.assertEqual(cached_right.uuid, right.uuid)
+        self.assertEqual(cached_left.view(list), [0, 42])
+        self.assertEqual(cached_right.view(list), [43, -1])
+
+    def test_inactive(self):
+        self.split_ints(self.ints)
+
+        self.assertEqual(len(self.cache), 0)
+        self.assertIsNone(ResultCache.current())
+
+    def test_current(self):
+        other = ResultCache(os.path.join(self.temp_dir.name, 'other'))
+        with self.cache:
+            self.assertIs(ResultCache.current(), self.cache)
+            with other:
+                self.assertIs(ResultCache.current(), other)
+            self.assertIs(ResultCache.current(), self.cache)
+
+    def test_current_is_per_thread(self):
+        seen = []
+        with self.cache:
+            thread = threading.Thread(
+                target=lambda: seen.append(ResultCache.current()))
+            thread.start()
+            thread.join()
+
+            self.assertIs(ResultCache.current(), self.cache)
+        self.assertEqual(seen, [None])
+
+    def test_other_thread_not_cached(self):
+        with self.cache:
+            thread = threading.Thread(target=self.split_ints,
+                                      args=(self.ints,))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(len(self.cache), 0)
+
+    def test_put_failure_warns(self):
+        with self.cache, mock.patch.object(
+                archive.ArtifactStore, 'add',
+                side_effect=OSError('No space left on device')):
+            with self.assertWarnsRegex(RuntimeWarning,
+                                       'could not be cached.*No space'):
+                left, right = self.split_ints(self.ints)
+
+        self.assertEqual(left.view(list), [0, 42])
+        self.assertEqual(right.view(list), [43, -1])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_miss_on_parameters(self):
+        with self.cache:
+            a = self.params_only('Jim', 42).out
+            b = self.params_only('Jim', 43).out
+            c = self.params_only('Jim', 42).out
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertNotEqual(a.uuid, b.uuid)
+        self.assertEqual(a.uuid, c.uuid)
+
+    def test_miss_on_inputs(self):
+        other = Artifact.import_data(IntSequence1, [0, 42, 43, -1])
+        with self.cache:
+            left, _ = self.split_ints(self.ints)
+            other_left, _ = self.split_ints(other)
+
+        self.assertNotEqual(left.uuid, other_left.uuid)
+
+    def test_miss_on_metadata(self):
+        identity = self.plugin.methods['identity_with_metadata']
+
+        def metadata(value):
+            return qiime2.Metadata(pd.DataFrame({'a': [value]}, index=['0']))
+
+        with self.cache:
+            a = identity(self.ints, metadata('1')).out
+            b = identity(self.ints, metadata('2')).out
+            c = identity(self.ints, metadata('1')).out
+
+        self.assertNotEqual(a.uuid, b.uuid)
+        self.assertEqual(a.uuid, c.uuid)
+
+    def test_policy(self):
+        def policy(action, parameters):
+            return parameters.get('age') != 42
+
+        self.cache.policy = policy
+        with self.cache:
+            a = self.params_only('Jim', 42).out
+            b = self.params_only('Jim', 42).out
+            self.params_only('Jim', 43)
+
+        self.assertNotEqual(a.uuid, b.uuid)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_persistent(self):
+        with self.cache:
+            left, _ = self.split_ints(self.ints)
+
+        with ResultCache(self.path), self.not_executed():
+            cached_left, _ = self.split_ints(self.ints)
+
+        self.assertEqual(cached_left.uuid, left.uuid)
+
+    def test_evict_least_recently_used(self):
+        with self.cache:
+            a = self.params_only('Jim', 42).out
+            b = self.params_only('Jim', 43).out
+            # A hit makes `a` the most recently used.
+            entries = os.path.join(self.path, ResultCache.ENTRIES_DIR)
+            for i, name in enumerate(sorted(os.listdir(entries))):
+                os.utime(os.path.join(entries, name), (i, i))
+            self.params_only('Jim', 42)
+
+        self.cache.evict(self.cache._store.size() - 1)
+
+        self.assertEqual(len(self.cache), 1)
+        with self.cache, self.not_executed():
+            self.assertEqual(self.params_only('Jim', 42).out.uuid, a.uuid)
+        with self.cache:
+            self.assertNotEqual(self.params_only('Jim', 43).out.uuid, b.uuid)
+
+    def test_max_size(self):
+        self.cache.max_size = 0
+        with self.cache:
+            self.split_ints(self.ints)
+
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache._store.size(), 0)
+        self.assertEqual(list(self.cache._store), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
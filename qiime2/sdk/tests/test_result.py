@@ -10,6 +10,8 @@ import os
 import tempfile
 import unittest
 import pathlib
+import zipfile
+from unittest import mock
 
 import qiime2.core.type
 from qiime2.sdk import Result, Artifact, Visualization
@@ -149,6 +151,36 @@ class TestResult(unittest.TestCase, ArchiveTestingMixin):
         self.assertEqual(metadata.uuid, str(visualization.uuid))
         self.assertIsNone(metadata.format)
 
+    def test_save_with_header(self):
+        artifact = Artifact.import_data(FourInts, [0, 0, 42, 1000])
+        visualization = Visualization._from_data_dir(
+             self.data_dir, self.make_provenance_capture())
+
+        for result in artifact, visualization:
+            fp = result.save(os.path.join(self.test_dir.name, 'header'),
+                             header=True)
+            with zipfile.ZipFile(fp) as zf:
+                comment = zf.comment.decode('utf-8')
+                version = zf.read('%s/VERSION' % result.uuid)
+            # Still a version 1 archive, only the comment is added.
+            self.assertTrue(comment.startswith('QIIME 2\narchive: 1\n'))
+            self.assertIn(b'archive: 1\n', version)
+
+            with mock.patch.object(archive.Archiver, '_open_archive',
+                                   side_effect=AssertionError('opened')):
+                metadata = Result.peek(fp)
+            self.assertEqual(metadata.uuid, str(result.uuid))
+            self.assertEqual(metadata.type, str(result.type))
+            self.assertEqual(Result.load(fp).uuid, result.uuid)
+
+    def test_save_without_header(self):
+        artifact = Artifact.import_data(FourInts, [0, 0, 42, 1000])
+
+        fp = artifact.save(os.path.join(self.test_dir.name, 'artifact'))
+
+        with zipfile.ZipFile(fp) as zf:
+            self.assertEqual(zf.comment, b'')
+
     def test_save_artifact_auto_extension(self):
         artifact = Artifact.import_data(FourInts, [0, 0, 42, 1000])
 